@@ -0,0 +1,96 @@
+from task import from_epoch_us
+
+# NumPy is optional, it is only needed for the detailed report
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+PERCENTILES = (50, 90, 99)
+
+_DAY = 86_400_000_000
+# task.EPOCH is a Thursday, weeks are shifted by three days so they start on Mondays
+_PERIODS = {"day": (_DAY, 0), "week": (7 * _DAY, 3 * _DAY)}
+
+
+def detailed_report(storage, period: str = "day", bins: int = 10) -> dict:
+    """
+    Computes completion time percentiles, a completion time histogram and the number of
+    tasks completed per day or week. Everything is computed with vectorized NumPy
+    operations over the columns returned by storage.get_time_columns(), a TaskTable
+    hands its columns over without copying them.
+
+    Parameters:
+        - storage: Storage | TaskTable | SqliteStorage
+            the storage to report on
+        - period: str
+            "day" or "week", the period the throughput is counted by
+        - bins: int
+            the number of equal width buckets of the histogram
+
+    Returns:
+        - dict
+            the detailed report
+
+    Raises:
+        - ValueError
+            if NumPy is not installed or the period is unknown
+    """
+    if np is None:
+        raise ValueError(
+            "*** The detailed report needs NumPy. *** \n -   Install it with `pip "
+            "install numpy`."
+        )
+    if period not in _PERIODS:
+        raise ValueError(
+            f"*** Unknown period '{period}', use one of {', '.join(_PERIODS)}. ***"
+        )
+
+    created_at, completion, completed_bits = storage.get_time_columns()
+    count = len(created_at)
+    created_at = np.frombuffer(created_at, dtype=np.int64, count=count)
+    completion = np.frombuffer(completion, dtype=np.int64, count=count)
+    completed = np.unpackbits(
+        np.frombuffer(completed_bits, dtype=np.uint8), count=count, bitorder="little"
+    ).view(bool)
+
+    completion = completion[completed]
+    report = {
+        "total": count,
+        "completed": int(completion.size),
+        "pending": count - int(completion.size),
+    }
+    if completion.size == 0:
+        return report
+
+    # Throughput goes first, the percentiles below reorder completion in place to save a
+    # copy
+    length, shift = _PERIODS[period]
+    buckets = created_at[completed]
+    buckets += completion + shift
+    buckets //= length
+    # Periods are counted with bincount over the offset from the first period, which is
+    # linear unlike np.unique
+    first = int(buckets.min())
+    per_period = np.bincount(buckets - first)
+    throughput = {
+        from_epoch_us((first + int(i)) * length - shift)
+        .date()
+        .isoformat(): int(per_period[i])
+        for i in np.flatnonzero(per_period)
+    }
+
+    counts, edges = np.histogram(completion, bins=bins)
+    edges = edges / 1e6
+    percentiles = np.percentile(completion, PERCENTILES, overwrite_input=True) / 1e6
+
+    report["completion time percentiles (seconds)"] = {
+        f"p{p}": round(float(value), 3)
+        for p, value in zip(PERCENTILES, percentiles, strict=True)
+    }
+    report["completion time histogram (seconds)"] = [
+        {"from": round(float(low), 3), "to": round(float(high), 3), "count": int(n)}
+        for low, high, n in zip(edges[:-1], edges[1:], counts, strict=True)
+    ]
+    report[f"completed per {period}"] = throughput
+    return report
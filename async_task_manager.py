@@ -0,0 +1,165 @@
+import asyncio
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime
+
+from storage import Storage
+from task import Task
+from task_manager import TaskManager
+from utils import DEFAULT_FSYNC, create_data_file, update_data_file
+
+
+class AsyncTaskManager:
+    """
+    A TaskManager for asyncio applications. Every call that touches the storage or the
+    data file, loading, commands and writes, runs in an executor, so the event loop
+    keeps serving other coroutines meanwhile.
+
+    Calls are applied one at a time under a lock, in the order they were made, so a
+    command or a write never sees another command half applied. The default executor has
+    a single thread, which also keeps storages bound to one thread (SqliteStorage)
+    working.
+
+    With autoflush, every command that changed a task writes the data file before it
+    returns. A write that is waiting for the lock is shared: commands finishing while it
+    waits are written by it too, so concurrent commands coalesce into a single write
+    instead of one each.
+
+    Use it as an async context manager, which loads the data file on entry and writes
+    and shuts down on exit:
+
+        async with AsyncTaskManager("tasks.json", Storage()) as manager:
+            await manager.add_task("Title", "Description")
+
+    Attributes:
+        - data_file: str
+            file path
+        - manager: TaskManager
+            the manager the calls are applied to
+        - writes: int
+            the number of times the data file was written
+    """
+
+    def __init__(
+        self,
+        data_file: str,
+        storage: Storage,
+        executor: Executor | None = None,
+        autoflush: bool = True,
+        fsync: str = DEFAULT_FSYNC,
+        compact: bool = False,
+    ):
+        """
+        Parameters:
+            - data_file: str
+                file path
+            - storage: Storage
+                the storage matching the data file
+            - executor: Executor | None
+                where the blocking work runs, a single thread owned by the manager when
+                None
+            - autoflush: bool
+                whether commands changing a task write the data file before they return,
+                otherwise only flush and leaving the context manager do
+            - fsync: str
+                the fsync policy of the writes, see utils.update_data_file
+            - compact: bool
+                whether a JSON data file is written without indentation, see
+                utils.update_data_file
+        """
+        self.data_file = data_file
+        self.manager = TaskManager(storage, index_time_ranges=True)
+        self.autoflush = autoflush
+        self.fsync = fsync
+        self.compact = compact
+        self.writes = 0
+
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="tasks"
+        )
+        self._lock = asyncio.Lock()
+        # The write waiting for the lock or running, that a flush can still join
+        self._next_write: asyncio.Future | None = None
+
+    async def __aenter__(self) -> "AsyncTaskManager":
+        await self.load()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        try:
+            await self.flush()
+        finally:
+            self.close()
+
+    async def load(self) -> None:
+        """Loads the data file into the storage, creating it if it does not exist."""
+        await self._run(create_data_file, self.data_file, self.manager.storage)
+
+    async def add_task(self, title: str, description: str) -> bool:
+        """See TaskManager.add_task."""
+        added = await self._run(self.manager.add_task, title, description)
+        if added and self.autoflush:
+            await self.flush()
+        return added
+
+    async def complete_task(self, title: str) -> (bool, int):
+        """See TaskManager.complete_task."""
+        response = await self._run(self.manager.complete_task, title)
+        if response[0] and self.autoflush:
+            await self.flush()
+        return response
+
+    async def list_tasks(self, include_completed: bool = False) -> list[Task]:
+        """See TaskManager.list_tasks."""
+        return await self._run(self.manager.list_tasks, include_completed)
+
+    async def generate_report(
+        self,
+        self_check: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> dict[str, (int | str)]:
+        """See TaskManager.generate_report."""
+        return await self._run(self.manager.generate_report, self_check, since, until)
+
+    async def flush(self) -> None:
+        """
+        Writes the data file if the storage changed. Concurrent calls share a write: a
+        call joins the write that is waiting for the lock, or still running, since the
+        lock makes sure it covers every command that returned before the call.
+        """
+        if self._next_write is None:
+            self._next_write = asyncio.ensure_future(self._write())
+        await asyncio.shield(self._next_write)
+
+    def close(self) -> None:
+        """
+        Shuts down the executor owned by the manager, without writing the data file.
+        """
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+
+    async def _write(self) -> None:
+        try:
+            await self._run(self._update_data_file)
+        finally:
+            self._next_write = None
+
+    def _update_data_file(self) -> None:
+        """Runs in the executor, under the lock."""
+        if getattr(self.manager.storage, "changed", True):
+            self.writes += 1
+        update_data_file(
+            self.data_file, self.manager.storage, fsync=self.fsync, compact=self.compact
+        )
+
+    async def _run(self, function, *args):
+        """
+        Runs a blocking call in the executor once the calls made before it are done.
+        """
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            return await loop.run_in_executor(
+                self._executor, functools.partial(function, *args)
+            )
@@ -0,0 +1,324 @@
+import atexit
+import threading
+import time
+from collections import deque
+
+from json_stream import RawJSON
+from storage import Storage, format_record, record_writer, write_records
+from task import Task
+from utils import DEFAULT_FSYNC, SNAPSHOT_EXTENSION, update_data_file, write_atomically
+
+# The number of recent commits whose batch sizes are kept for the metrics
+RECENT_COMMITS = 1000
+
+
+class BackgroundFlusher:
+    """
+    Group commit for a Storage used in process: a background thread writes the data file
+    once flush_every changes have piled up, or flush_interval seconds after the first
+    unwritten change, whichever comes first, so a change is on disk at most
+    flush_interval seconds later (plus the write itself) and a write absorbs every
+    change made meanwhile. It is the flush policy of the daemon, without the daemon.
+
+    Writing is slower per task than changing a task, so commands could outrun the writes
+    and the changes not on disk would pile up without bound. Once max_unwritten changes
+    are waiting, the next change waits for a write to take its snapshot, which bounds
+    how much a crash can lose.
+
+    The flusher attaches itself to the storage, which notifies it of every change. The
+    TaskManager holds lock while it applies a command, and the flusher holds it while it
+    takes a snapshot of the tasks, so a snapshot never has a command half applied. A
+    plain Storage is snapshotted as tuples and written outside the lock, so commands
+    keep running during the write. The text of every task is kept between writes and
+    only tasks whose fields changed are serialized again, which makes a write mostly a
+    copy of the previous one. The file keeps the schema version of the storage. Other
+    storages are written by update_data_file under the lock.
+
+    flush writes right away, close stops the thread after a last flush, and so does the
+    exit of the interpreter.
+
+    Attributes:
+        - lock: threading.RLock
+            held while a command changes tasks and while a snapshot is taken
+        - commits: int
+            the number of writes
+        - mutations: int
+            the number of changes written
+        - max_batch: int
+            the most changes a single write absorbed
+        - commit_seconds: float
+            the time spent writing, snapshots included
+        - recent_batches: deque[int]
+            the number of changes each of the last RECENT_COMMITS writes absorbed
+        - stalls: int
+            the number of changes that waited for a write because max_unwritten changes
+            were waiting
+        - errors: int
+            the number of failed writes, their changes are written by the next one
+        - last_error: Exception | None
+            the error of the last failed write
+    """
+
+    def __init__(
+        self,
+        data_file: str,
+        storage: Storage,
+        flush_interval: float = 0.05,
+        flush_every: int = 10_000,
+        max_unwritten: int = 100_000,
+        fsync: str = DEFAULT_FSYNC,
+        compact: bool = False,
+    ):
+        """
+        Attaches the flusher to a loaded storage and starts its thread.
+
+        Parameters:
+            - data_file: str
+                file path
+            - storage: Storage
+                the storage loaded from the data file
+            - flush_interval: float
+                the most seconds a change waits for its write
+            - flush_every: int
+                the number of unwritten changes that triggers a write right away
+            - max_unwritten: int
+                the number of unwritten changes past which changes wait for a write, at
+                least flush_every
+            - fsync: str
+                the fsync policy of the writes, see utils.update_data_file
+            - compact: bool
+                whether a JSON data file is written without indentation, see
+                utils.update_data_file
+
+        Raises:
+            - ValueError
+                if the storage is not a Storage or the policy is out of range
+        """
+        if not isinstance(storage, Storage):
+            raise ValueError(
+                "*** A background flusher can only be attached to a Storage. ***"
+            )
+        if flush_interval <= 0 or not 1 <= flush_every <= max_unwritten:
+            raise ValueError(
+                "*** The flush interval has to be positive, and flush_every between 1 "
+                "and max_unwritten. ***"
+            )
+        self.data_file = data_file
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.max_unwritten = max_unwritten
+        self.fsync = fsync
+        self.compact = compact
+
+        self.lock = threading.RLock()
+        self.commits = 0
+        self.mutations = 0
+        self.max_batch = 0
+        self.commit_seconds = 0.0
+        self.recent_batches: deque[int] = deque(maxlen=RECENT_COMMITS)
+        self.stalls = 0
+        self.errors = 0
+        self.last_error: Exception | None = None
+
+        # Unwritten changes and when the first of them was made, guarded by lock
+        self._unwritten = 0
+        self._first_change = 0.0
+        self._wake = threading.Condition(self.lock)
+        # Writes one at a time, so an older snapshot never replaces a newer one
+        self._write_lock = threading.Lock()
+        self._stopping = False
+        # Title -> the fields of the task when it was last written and their JSON text,
+        # only used by the writes
+        self._written: dict[str, tuple[tuple, RawJSON]] = {}
+        # The schema version and indentation of the kept texts
+        self._written_format: tuple[int, int | None] | None = None
+
+        storage.attach_flusher(self)
+        self._thread = threading.Thread(
+            target=self._run, name="tasks-flusher", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __enter__(self) -> "BackgroundFlusher":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def notify(self) -> None:
+        """
+        Counts a change, the storage calls it after every save and update. When
+        max_unwritten changes are waiting already, it waits until a write has taken its
+        snapshot, with the lock released meanwhile.
+        """
+        with self.lock:
+            self._unwritten += 1
+            if self._unwritten == 1:
+                self._first_change = time.monotonic()
+                self._wake.notify_all()
+            elif self._unwritten >= self.flush_every:
+                self._wake.notify_all()
+
+            if self._unwritten > self.max_unwritten and not self._stopping:
+                self.stalls += 1
+                while self._unwritten > self.max_unwritten and not self._stopping:
+                    self._wake.wait()
+
+    def flush(self) -> None:
+        """Writes the unwritten changes now, in the calling thread."""
+        self._commit()
+
+    def close(self) -> None:
+        """Stops the thread and writes what is left. Closing again does nothing."""
+        with self.lock:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._wake.notify_all()
+        self._thread.join()
+        self._commit()
+        atexit.unregister(self.close)
+        if self.storage.flusher is self:
+            self.storage.flusher = None
+
+    def stats(self) -> dict:
+        """The metrics of the writes, along with the changes per write."""
+        return {
+            "commits": self.commits,
+            "mutations": self.mutations,
+            "mutations_per_commit": (
+                self.mutations / self.commits if self.commits else 0.0
+            ),
+            "max_batch": self.max_batch,
+            "seconds_per_commit": (
+                self.commit_seconds / self.commits if self.commits else 0.0
+            ),
+            "unwritten": self._unwritten,
+            "stalls": self.stalls,
+            "errors": self.errors,
+        }
+
+    def _run(self) -> None:
+        """
+        Waits for a change, then for the first of flush_every changes and
+        flush_interval, and writes.
+        """
+        while True:
+            with self.lock:
+                while not self._unwritten and not self._stopping:
+                    self._wake.wait()
+                if self._stopping:
+                    return
+                deadline = self._first_change + self.flush_interval
+                while not self._stopping and self._unwritten < self.flush_every:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wake.wait(remaining)
+                if self._stopping:
+                    return
+            self._commit()
+
+    def _commit(self) -> None:
+        """
+        Writes a snapshot of the storage if anything changed, and records how many
+        changes it absorbed.
+        """
+        with self._write_lock:
+            start = time.perf_counter()
+            with self.lock:
+                batch = self._unwritten
+                if not batch:
+                    return
+                self._unwritten = 0
+                # Changes waiting for a snapshot can go on
+                self._wake.notify_all()
+                rows = self._snapshot()
+                if rows is None:
+                    try:
+                        update_data_file(
+                            self.data_file,
+                            self.storage,
+                            fsync=self.fsync,
+                            compact=self.compact,
+                        )
+                    except Exception as e:
+                        self._failed(batch, e)
+                        return
+                else:
+                    self.storage.changed = False
+
+            if rows is not None:
+                version = self.storage.schema_version
+                # Version 2 files hold one compact record per line
+                indent = None if self.compact or version != 1 else 4
+                try:
+                    write_atomically(
+                        self.data_file,
+                        lambda f: write_records(
+                            self._texts(rows, version, indent), f, version, indent
+                        ),
+                        self.fsync,
+                    )
+                except Exception as e:
+                    with self.lock:
+                        self.storage.changed = True
+                        self._failed(batch, e)
+                    return
+
+            self.commits += 1
+            self.mutations += batch
+            self.max_batch = max(self.max_batch, batch)
+            self.commit_seconds += time.perf_counter() - start
+            self.recent_batches.append(batch)
+
+    def _snapshot(self) -> list[tuple] | None:
+        """
+        The fields of every task of a plain Storage written to JSON, None when
+        update_data_file has to write.
+        """
+        if (
+            type(self.storage) is not Storage
+            or self.data_file.split(".")[-1] == SNAPSHOT_EXTENSION
+        ):
+            return None
+        return [
+            (
+                task.title,
+                task.description,
+                task.completed,
+                task.created_at,
+                task.completion_time,
+            )
+            for task in self.storage.tasks.values()
+        ]
+
+    def _texts(self, rows: list[tuple], version: int, indent: int | None):
+        """
+        The JSON text of every task of a snapshot, serializing only the tasks that
+        changed since the last write.
+        """
+        written = self._written if self._written_format == (version, indent) else {}
+        self._written_format = (version, indent)
+        to_record = record_writer(version)
+        kept = {}
+        for row in rows:
+            entry = written.get(row[0])
+            if entry is None or entry[0] != row:
+                entry = (row, format_record(to_record(Task(*row)), version, indent))
+            kept[row[0]] = entry
+            yield entry[1]
+        self._written = kept
+
+    def _failed(self, batch: int, error: Exception) -> None:
+        """
+        Puts the changes of a failed write back, under the lock, so the next write
+        covers them.
+        """
+        self._unwritten += batch
+        # The next write is tried flush_interval seconds later, not right away
+        self._first_change = time.monotonic()
+        self.errors += 1
+        self.last_error = error
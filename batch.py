@@ -0,0 +1,350 @@
+import json
+import time
+from typing import Iterable, Iterator
+
+from storage import task_to_record
+from task import parse_timestamp
+from task_manager import TaskManager
+
+# Operations a batch can contain, with the fields each of them needs
+OPERATIONS = {
+    "add": ("title", "description"),
+    "complete": ("title",),
+    "list": (),
+    "report": (),
+    "search": ("query",),
+    "reshard": (),
+}
+# The operations that can change tasks, the others never need the data file to be
+# written back
+MUTATIONS = ("add", "complete", "reshard")
+
+
+def apply_operation(manager: TaskManager, op: dict) -> dict:
+    """
+    Applies a single operation to the manager and describes the outcome. It is what the
+    batch command runs for every line, the same way main.py runs a single command.
+
+    Operations look like:
+        - {"op": "add", "title": "...", "description": "..."}
+        - {"op": "complete", "title": "..."}
+        - {"op": "list", "all": false, "limit": null, "offset": 0, "after": null,
+          "records": false,
+           "created_after": null, "created_before": null}
+        - {"op": "report", "check": false, "detailed": false, "period": "day", "bins":
+          10, "since": null,
+           "until": null}
+        - {"op": "search", "query": "...", "limit": 10}
+        - {"op": "reshard", "shards": 32}, only for a sharded storage
+
+    Parameters:
+        - manager: TaskManager
+            the manager the operation is applied to
+        - op: dict
+            the operation
+
+    Returns:
+        - dict
+            {"ok": bool, "status": str} along with the title for add and complete, the
+            tasks for list and search, the report for report and the number of shards
+            for reshard
+
+    Dates and times (created_after, created_before, since and until) are ISO 8601
+    strings, see task.parse_timestamp.
+
+    Raises:
+        - ValueError
+            if the operation is unknown, misses a field or has a field of the wrong
+            type, or a date or a time is malformed
+        - AssertionError
+            if a report with "check" finds the aggregates out of sync
+    """
+    if not isinstance(op, dict) or op.get("op") not in OPERATIONS:
+        raise ValueError(
+            f"*** Unknown operation, use one of {', '.join(OPERATIONS)}. ***"
+        )
+
+    name = op["op"]
+    for field in OPERATIONS[name]:
+        if not isinstance(op.get(field), str):
+            raise ValueError(
+                f"*** The '{name}' operation needs a '{field}' string. ***"
+            )
+
+    if name == "add":
+        if manager.add_task(op["title"], op["description"]):
+            return {"ok": True, "status": "added", "title": op["title"]}
+        return {"ok": False, "status": "exists", "title": op["title"]}
+
+    if name == "complete":
+        response = manager.complete_task(op["title"])
+        if response == (True, 1):
+            status = "completed"
+        elif response == (False, -1):
+            status = "not_found"
+        else:
+            status = "already_completed"
+        return {"ok": response[0], "status": status, "title": op["title"]}
+
+    if name == "list":
+        return {
+            "ok": True,
+            "status": "listed",
+            "tasks": list(iter_list_records(manager, op)),
+        }
+
+    if name == "search":
+        results = manager.search_tasks(op["query"], _int_field(op, "limit", 10))
+        return {
+            "ok": True,
+            "status": "found",
+            "tasks": [
+                {
+                    "title": task.title,
+                    "completed": task.completed,
+                    "score": round(score, 3),
+                }
+                for task, score in results
+            ],
+        }
+
+    if name == "reshard":
+        reshard = getattr(manager.storage, "reshard", None)
+        if reshard is None:
+            raise ValueError(
+                "*** Only a sharded data file (.shards) can be resharded. ***"
+            )
+        shards = op.get("shards")
+        reshard(shards)
+        return {"ok": True, "status": "resharded", "shards": shards}
+
+    since, until = parse_timestamp(op.get("since")), parse_timestamp(op.get("until"))
+    detailed = _bool_field(op, "detailed")
+    if detailed and (since is not None or until is not None):
+        raise ValueError(
+            "*** The detailed report covers every task, it does not take since or "
+            "until. ***"
+        )
+    report = manager.generate_report(
+        self_check=_bool_field(op, "check"), since=since, until=until
+    )
+    if detailed:
+        report = manager.generate_detailed_report(
+            _str_field(op, "period", "day"), _int_field(op, "bins", 10, minimum=1)
+        )
+    return {"ok": True, "status": "reported", "report": report}
+
+
+def iter_list_records(manager: TaskManager, op: dict) -> Iterator[dict]:
+    """
+    Lazily yields the records a list operation lists, see apply_operation. The daemon
+    writes them page by page instead of collecting them.
+
+    Parameters:
+        - manager: TaskManager
+            the manager the operation is applied to
+        - op: dict
+            the list operation
+
+    Returns:
+        - Iterator[dict]
+            the full records when "records" is set, the title and the status otherwise
+
+    Raises:
+        - ValueError
+            if a field has the wrong type or a date is malformed, or (when the iterator
+            is first advanced) if there is no task titled "after"
+    """
+    tasks = manager.iter_tasks(
+        include_completed=_bool_field(op, "all"),
+        limit=_int_field(op, "limit", None),
+        offset=_int_field(op, "offset", 0),
+        after=_str_field(op, "after", None),
+        created_after=parse_timestamp(op.get("created_after")),
+        created_before=parse_timestamp(op.get("created_before")),
+    )
+    if _bool_field(op, "records"):
+        return map(task_to_record, tasks)
+    return ({"title": task.title, "completed": task.completed} for task in tasks)
+
+
+def _int_field(
+    op: dict, field: str, default: int | None, minimum: int = 0
+) -> int | None:
+    """
+    Reads an optional integer field of an operation, the default when it is missing or
+    null.
+
+    Raises:
+        - ValueError
+            if the field is not an integer (booleans included) or is below the minimum
+    """
+    value = op.get(field)
+    if value is None:
+        return default
+    if not isinstance(value, int) or isinstance(value, bool) or value < minimum:
+        raise ValueError(
+            f"*** The '{field}' field of '{op['op']}' should be an integer of at least "
+            f"{minimum}. ***"
+        )
+    return value
+
+
+def _bool_field(op: dict, field: str) -> bool:
+    """
+    Reads an optional boolean field of an operation, False when it is missing or null.
+
+    Raises:
+        - ValueError
+            if the field is not a boolean, "no" or 0 would otherwise count as set
+    """
+    value = op.get(field)
+    if value is None:
+        return False
+    if not isinstance(value, bool):
+        raise ValueError(
+            f"*** The '{field}' field of '{op['op']}' should be true or false. ***"
+        )
+    return value
+
+
+def _str_field(op: dict, field: str, default: str | None) -> str | None:
+    """
+    Reads an optional string field of an operation, the default when it is missing or
+    null.
+
+    Raises:
+        - ValueError
+            if the field is not a string
+    """
+    value = op.get(field)
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise ValueError(
+            f"*** The '{field}' field of '{op['op']}' should be a string. ***"
+        )
+    return value
+
+
+def run_batch(manager: TaskManager, lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Applies JSONL operations one line at a time and yields one result per operation. A
+    line that can not be applied yields an error result instead of stopping the batch.
+    Blank lines are skipped. Any other error stops the batch, the operations applied
+    before it are still in the manager's storage for the caller to write (see
+    main.run_batch_command).
+
+    Parameters:
+        - manager: TaskManager
+            the manager the operations are applied to
+        - lines: Iterable[str]
+            one JSON operation per line, see apply_operation
+
+    Returns:
+        - Iterator[dict]
+            the result of every operation, with the line number it came from
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            result = apply_operation(manager, json.loads(line))
+        except (ValueError, AssertionError) as e:
+            result = {"ok": False, "status": "error", "error": str(e)}
+        yield {"line": line_number, **result}
+
+
+def write_results(results: Iterable[dict], out) -> tuple[int, float]:
+    """
+    Writes batch results as JSON lines and times them.
+
+    Parameters:
+        - results: Iterable[dict]
+            the results, usually straight from run_batch so the operations run as they
+            are written
+        - out: file object
+            where the results are written
+
+    Returns:
+        - tuple[int, float]
+            the number of operations and the seconds they took
+    """
+    count = 0
+    start = time.perf_counter()
+    for result in results:
+        out.write(json.dumps(result) + "\n")
+        count += 1
+    return count, time.perf_counter() - start
+
+
+# The formats tasks can be listed in, and the columns of the TSV one
+LIST_FORMATS = ("text", "ndjson", "tsv")
+TSV_COLUMNS = ("title", "description", "completed", "created_at", "completion_time")
+_TSV_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def format_task(record: dict, fmt: str) -> str:
+    """
+    Formats a task record (see storage.task_to_record) as one line of a listing, without
+    the newline.
+    """
+    if fmt == "ndjson":
+        return json.dumps(record)
+    if fmt == "tsv":
+        fields = []
+        for column in TSV_COLUMNS:
+            value = record.get(column)
+            if value is None:
+                fields.append("")
+            elif isinstance(value, bool):
+                fields.append("true" if value else "false")
+            else:
+                fields.append(str(value).translate(_TSV_ESCAPES))
+        return "\t".join(fields)
+    status = "Completed" if record["completed"] else "Pending"
+    return f"{record['title']} - {status}"
+
+
+def write_tasks(records: Iterable[dict], fmt: str, out, chunk_size: int = 1024) -> int:
+    """
+    Writes a listing of tasks, consuming the records as it goes so they never have to be
+    in memory all at once. Lines are joined into chunks, one write per chunk instead of
+    one per task.
+
+    Parameters:
+        - records: Iterable[dict]
+            the task records, the text format only needs their title and completed
+            fields
+        - fmt: str
+            one of LIST_FORMATS, the TSV listing starts with a header line
+        - out: file object
+            where the listing is written
+        - chunk_size: int
+            the number of lines per write
+
+    Returns:
+        - int
+            the number of tasks written
+
+    Raises:
+        - ValueError
+            if the format is unknown
+    """
+    if fmt not in LIST_FORMATS:
+        raise ValueError(
+            f"*** Unknown list format '{fmt}', it should be one of "
+            f"{', '.join(LIST_FORMATS)}. ***"
+        )
+
+    count = 0
+    lines = ["\t".join(TSV_COLUMNS)] if fmt == "tsv" else []
+    for record in records:
+        lines.append(format_task(record, fmt))
+        count += 1
+        if len(lines) >= chunk_size:
+            out.write("\n".join(lines) + "\n")
+            lines.clear()
+    if lines:
+        out.write("\n".join(lines) + "\n")
+    return count
@@ -0,0 +1,5 @@
+"""
+Benchmarks of the task manager. The bench_* modules compare one optimization against
+what it replaced, the suite (python -m benchmarks) times the core operations on
+synthetic datasets and compares runs with each other.
+"""
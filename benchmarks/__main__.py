@@ -0,0 +1,145 @@
+"""
+The benchmark suite. Run from the project root:
+
+    python -m benchmarks run --sizes 1k,10k,100k --completed-ratio 0.5 --output
+    results.json python -m benchmarks compare baseline.json results.json --threshold 0.1
+    python -m benchmarks generate 1M tasks.json
+
+compare exits with status 1 when a benchmark regressed, so it can gate a CI job.
+"""
+
+import argparse
+import sys
+
+from benchmarks.compare import (
+    DEFAULT_THRESHOLD,
+    compare,
+    format_comparison,
+    load_results,
+    save_results,
+)
+from benchmarks.datasets import parse_size, write_dataset
+from benchmarks.suite import run_suite
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="Task manager benchmark suite"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser(
+        "run", help="Time every benchmark on synthetic datasets"
+    )
+    run_parser.add_argument(
+        "--sizes",
+        default="1k,10k,100k",
+        help="Comma separated dataset sizes, e.g. 1k,10k,1M,10M",
+    )
+    run_parser.add_argument(
+        "--completed-ratio",
+        type=float,
+        default=0.5,
+        help="The share of completed tasks",
+    )
+    run_parser.add_argument(
+        "--seed", type=int, default=0, help="The seed of the datasets"
+    )
+    run_parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Timed runs per benchmark, the fastest is kept",
+    )
+    run_parser.add_argument(
+        "--operations",
+        type=int,
+        default=1000,
+        help="Tasks added and completed per add_task/complete_task run",
+    )
+    run_parser.add_argument(
+        "--only", help="Comma separated names of the benchmarks to run"
+    )
+    run_parser.add_argument(
+        "--no-memory", action="store_true", help="Skips the traced run of peak memory"
+    )
+    run_parser.add_argument(
+        "--output", help="Where the JSON results are written, stdout otherwise"
+    )
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Flag regressions between two result files"
+    )
+    compare_parser.add_argument("baseline", help="The results of the reference run")
+    compare_parser.add_argument("current", help="The results of the run being checked")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="The relative slowdown or memory growth flagged as a regression",
+    )
+
+    generate_parser = subparsers.add_parser(
+        "generate", help="Write a synthetic JSON data file"
+    )
+    generate_parser.add_argument("size", help="The number of tasks, e.g. 10k or 1M")
+    generate_parser.add_argument("data_file", help="The JSON file to write")
+    generate_parser.add_argument(
+        "--completed-ratio",
+        type=float,
+        default=0.5,
+        help="The share of completed tasks",
+    )
+    generate_parser.add_argument(
+        "--seed", type=int, default=0, help="The seed of the dataset"
+    )
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        if args.command == "run":
+            results = run_suite(
+                sizes=[parse_size(size) for size in args.sizes.split(",")],
+                completed_ratio=args.completed_ratio,
+                seed=args.seed,
+                repeat=args.repeat,
+                operations=args.operations,
+                memory=not args.no_memory,
+                only=tuple(args.only.split(",")) if args.only else None,
+                log=sys.stderr,
+            )
+            if args.output:
+                save_results(results, args.output)
+            else:
+                import json
+
+                print(json.dumps(results, indent=4))
+            return 0
+
+        if args.command == "compare":
+            rows = compare(
+                load_results(args.baseline), load_results(args.current), args.threshold
+            )
+            print(format_comparison(rows))
+            regressions = sum(row["regression"] for row in rows)
+            if regressions:
+                print(
+                    f"{regressions} regression(s) above {args.threshold:.0%}.",
+                    file=sys.stderr,
+                )
+                return 1
+            return 0
+
+        write_dataset(
+            args.data_file, parse_size(args.size), args.completed_ratio, args.seed
+        )
+        return 0
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
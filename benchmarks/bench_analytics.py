@@ -0,0 +1,54 @@
+"""
+Times the detailed report over synthetic columns. The columns are generated with NumPy
+and handed over the same way a TaskTable hands over its own, so only the vectorized
+report itself is measured. Run from the project root:
+
+    python -m benchmarks.bench_analytics [number of tasks]
+"""
+
+import sys
+import time
+
+from analytics import detailed_report
+
+# NumPy is optional, like for the detailed report itself
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+class SyntheticColumns:
+    """Quacks like a storage as far as analytics.detailed_report is concerned."""
+
+    def __init__(self, count: int, completed_ratio: float = 0.7, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        start = 1_700_000_000 * 1_000_000
+        self.created_at = np.sort(
+            rng.integers(start, start + 3 * 365 * 86_400_000_000, count)
+        )
+        self.completion = rng.exponential(3600e6, count).astype(np.int64)
+        completed = rng.random(count) < completed_ratio
+        self.completion[~completed] = 0
+        self.completed = np.packbits(completed, bitorder="little").tobytes()
+
+    def get_time_columns(self):
+        return self.created_at, self.completion, self.completed
+
+
+if __name__ == "__main__":
+    if np is None:
+        sys.exit("The detailed report needs NumPy: poetry install -E analytics")
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    columns = SyntheticColumns(count)
+
+    # The first run includes the page faults of NumPy's first large allocations
+    for run, period in enumerate(("day", "day", "week")):
+        start = time.perf_counter()
+        report = detailed_report(columns, period)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{count:,} tasks, per {period}{' (cold)' if run == 0 else ''}: "
+            f"{elapsed:.3f} s"
+        )
+    print(report["completion time percentiles (seconds)"])
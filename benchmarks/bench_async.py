@@ -0,0 +1,106 @@
+"""
+Load test of a TaskManager embedded in an asyncio service. Concurrent clients add and
+complete tasks, each change written to the data file, while a heartbeat coroutine
+measures how late the event loop wakes it up. Compares calling TaskManager and utils
+directly on the event loop with AsyncTaskManager. Run from the project root:
+
+    python -m benchmarks.bench_async [number of tasks] [number of clients]
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from async_task_manager import AsyncTaskManager
+from benchmarks.datasets import write_dataset
+from storage import Storage
+from task_manager import TaskManager
+from utils import create_data_file, update_data_file
+
+HEARTBEAT_SECONDS = 0.001
+
+
+async def heartbeat(stalls: list[float], stopped: asyncio.Event) -> None:
+    """Records by how much every wake up of a short sleep was late."""
+    while not stopped.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        stalls.append(max(0.0, time.perf_counter() - start - HEARTBEAT_SECONDS))
+
+
+async def blocking_clients(data_file: str, clients: int) -> int:
+    """Every client calls TaskManager and update_data_file on the event loop."""
+    storage = Storage()
+    create_data_file(data_file, storage)
+    manager = TaskManager(storage)
+
+    async def client(number: int) -> None:
+        title = f"Client {number}"
+        manager.add_task(title, "Added by the load test")
+        update_data_file(data_file, storage, fsync="none")
+        await asyncio.sleep(0)
+        manager.complete_task(title)
+        update_data_file(data_file, storage, fsync="none")
+
+    await asyncio.gather(*(client(number) for number in range(clients)))
+    return 2 * clients
+
+
+async def async_clients(data_file: str, clients: int) -> int:
+    """Every client awaits an AsyncTaskManager, which writes after every change."""
+    async with AsyncTaskManager(data_file, Storage(), fsync="none") as manager:
+
+        async def client(number: int) -> None:
+            title = f"Client {number}"
+            await manager.add_task(title, "Added by the load test")
+            await manager.complete_task(title)
+
+        await asyncio.gather(*(client(number) for number in range(clients)))
+    return manager.writes
+
+
+async def measure(
+    scenario, data_file: str, clients: int
+) -> tuple[float, list[float], int]:
+    """
+    Runs a scenario next to the heartbeat, returns the seconds it took, the stalls and
+    the number of writes.
+    """
+    stalls: list[float] = []
+    stopped = asyncio.Event()
+    beating = asyncio.create_task(heartbeat(stalls, stopped))
+    await asyncio.sleep(HEARTBEAT_SECONDS)
+    start = time.perf_counter()
+    writes = await scenario(data_file, clients)
+    seconds = time.perf_counter() - start
+    stopped.set()
+    await beating
+    return seconds, stalls, writes
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.json")
+        write_dataset(source, count)
+        print(f"{count} tasks, {clients} clients adding and completing a task each")
+
+        for name, scenario in (
+            ("blocking", blocking_clients),
+            ("async", async_clients),
+        ):
+            data_file = os.path.join(directory, f"{name}.json")
+            shutil.copy(source, data_file)
+            seconds, stalls, writes = asyncio.run(measure(scenario, data_file, clients))
+            stalls.sort()
+            p99 = stalls[int(len(stalls) * 0.99)] if stalls else 0.0
+            print(
+                f"{name:<9} {seconds:7.2f} s   {writes:4} writes   max stall "
+                f"{max(stalls, default=0) * 1e3:8.1f} ms"
+                f"   p99 stall {p99 * 1e3:8.1f} ms"
+            )
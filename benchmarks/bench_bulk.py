@@ -0,0 +1,68 @@
+"""
+Times TaskManager.add_tasks and complete_tasks against looping over add_task and
+complete_task, in memory and with the data file written after every call (a loop
+persisting every task against a bulk call persisting once), for the default and the
+columnar storage. Run from the project root:
+
+    python -m benchmarks.bench_bulk [number of tasks] [number of tasks persisted]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from storage import Storage
+from task_manager import TaskManager
+from task_table import TaskTable
+from utils import update_data_file
+
+
+def time_loop(storage_class, tasks: list[tuple[str, str]], persist) -> float:
+    manager = TaskManager(storage_class())
+    start = time.perf_counter()
+    for title, description in tasks:
+        manager.add_task(title, description)
+        persist(manager.storage)
+    for title, _ in tasks:
+        manager.complete_task(title)
+        persist(manager.storage)
+    return time.perf_counter() - start
+
+
+def time_bulk(storage_class, tasks: list[tuple[str, str]], persist) -> float:
+    manager = TaskManager(storage_class())
+    start = time.perf_counter()
+    manager.add_tasks(tasks, lambda: persist(manager.storage))
+    manager.complete_tasks(
+        (title for title, _ in tasks), lambda: persist(manager.storage)
+    )
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    persisted = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, "tasks.json")
+
+        def in_memory(_storage) -> None:
+            pass
+
+        def to_disk(storage) -> None:
+            update_data_file(data_file, storage, fsync="none")
+
+        for label, size, persist in (
+            ("in memory", count, in_memory),
+            ("persisted", persisted, to_disk),
+        ):
+            tasks = [(f"Task {i}", f"Description {i}") for i in range(size)]
+            for storage_class in (Storage, TaskTable):
+                loop = time_loop(storage_class, tasks, persist)
+                bulk = time_bulk(storage_class, tasks, persist)
+                print(
+                    f"{label:<10} {storage_class.__name__:<10} {size:>8} tasks   loop "
+                    f"{loop:8.3f} s   "
+                    f"bulk {bulk:8.3f} s   speedup {loop / bulk:6.2f}x"
+                )
@@ -0,0 +1,57 @@
+"""
+Compares the size of a data file with the time to load it into a Storage and dump it
+back, for plain and compressed JSON (see data_codecs), indented and compact. Run from
+the project root:
+
+    python -m benchmarks.bench_codecs [number of tasks]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.datasets import write_dataset
+from storage import Storage
+from utils import create_data_file, update_data_file
+
+FORMATS = ("json", "json.gz", "json.xz", "json.bz2")
+
+
+def time_dump(data_file: str, storage: Storage, compact: bool) -> float:
+    storage.changed = True
+    start = time.perf_counter()
+    update_data_file(data_file, storage, fsync="none", compact=compact)
+    return time.perf_counter() - start
+
+
+def time_load(data_file: str) -> tuple[float, Storage]:
+    storage = Storage()
+    start = time.perf_counter()
+    create_data_file(data_file, storage)
+    return time.perf_counter() - start, storage
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.json")
+        write_dataset(source, count)
+        _, expected = time_load(source)
+        titles = list(expected.tasks)
+
+        print(f"{count} tasks")
+        print(f"{'format':<10} {'layout':<9} {'size':>10} {'dump':>9} {'load':>9}")
+        for fmt in FORMATS:
+            for compact in (False, True):
+                data_file = os.path.join(directory, f"tasks.{fmt}")
+                dump = time_dump(data_file, expected, compact)
+                size = os.path.getsize(data_file)
+                load, storage = time_load(data_file)
+                assert list(storage.tasks) == titles
+                layout = "compact" if compact else "indented"
+                print(
+                    f"{fmt:<10} {layout:<9} {size / 2**20:7.2f} MiB {dump:7.2f} s "
+                    f"{load:7.2f} s"
+                )
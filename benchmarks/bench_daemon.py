@@ -0,0 +1,109 @@
+"""
+Compares the latency of main.py commands run directly against the data file and through
+a running daemon. Both paths start a new interpreter for every command, the daemon saves
+the load and the write of the data file.
+Run from the project root:
+
+    python -m benchmarks.bench_daemon [number of tasks] [number of commands]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def write_dataset(data_file: str, count: int) -> None:
+    start = datetime(2024, 1, 1)
+    with open(data_file, "w") as f:
+        json.dump(
+            [
+                {
+                    "title": f"Task {i}",
+                    "description": f"Description of the work for project {i % 100}",
+                    "completed": False,
+                    "created_at": (start + timedelta(seconds=i)).isoformat(),
+                    "completion_time": None,
+                }
+                for i in range(count)
+            ],
+            f,
+            indent=4,
+        )
+
+
+def time_commands(env: dict, commands: list[list[str]]) -> list[float]:
+    """
+    Runs every command in a new process and returns how long each one took, in seconds.
+    """
+    latencies = []
+    for command in commands:
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "main.py", *command],
+            env=env,
+            check=True,
+            capture_output=True,
+        )
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(name: str, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    p90 = (
+        latencies[int(len(latencies) * 0.9) - 1]
+        if len(latencies) >= 10
+        else latencies[-1]
+    )
+    print(
+        f"{name:<8} median {statistics.median(latencies) * 1e3:8.1f} ms   p90 "
+        f"{p90 * 1e3:8.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, "tasks.json")
+        write_dataset(data_file, count)
+        env = dict(
+            os.environ,
+            TASKS_DATA_FILE=data_file,
+            TASKS_SOCKET=os.path.join(directory, "tasks.sock"),
+        )
+
+        def commands(prefix: str) -> list[list[str]]:
+            return [
+                (
+                    ["complete", f"Task {i}"]
+                    if i % 2
+                    else ["add", f"{prefix} {i}", "Description"]
+                )
+                for i in range(runs)
+            ]
+
+        direct = time_commands(env, commands("Direct"))
+
+        daemon = subprocess.Popen([sys.executable, "daemon.py"], env=env)
+        try:
+            while not os.path.exists(env["TASKS_SOCKET"]):
+                time.sleep(0.05)
+            served = time_commands(env, commands("Daemon"))
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+        print(f"{count} tasks, {runs} add/complete commands")
+        summarize("direct", direct)
+        summarize("daemon", served)
+        print(
+            "The daemon is "
+            f"{statistics.median(direct) / statistics.median(served):.1f}x faster"
+        )
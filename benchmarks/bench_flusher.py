@@ -0,0 +1,77 @@
+"""
+Measures sustained add_task throughput against a large store, writing the data file with
+update_data_file after every add, and with a BackgroundFlusher grouping adds into
+commits. Run from the project root:
+
+    python -m benchmarks.bench_flusher [number of tasks] [seconds]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from background_flusher import BackgroundFlusher
+from benchmarks.datasets import write_dataset
+from storage import Storage
+from task_manager import TaskManager
+from utils import create_data_file, update_data_file
+
+PERSISTED_ADDS = 5
+
+
+def load(data_file: str) -> Storage:
+    storage = Storage()
+    create_data_file(data_file, storage)
+    return storage
+
+
+def add_for(manager: TaskManager, seconds: float) -> int:
+    """Adds tasks until the time is up, returns how many were added."""
+    added = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        # The clock is only read once per 100 adds, so it does not weigh on the
+        # throughput
+        for _ in range(100):
+            manager.add_task(f"Added {added}", "Added by the benchmark")
+            added += 1
+    return added
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, "tasks.json")
+        write_dataset(data_file, count)
+        print(f"{count} tasks, adding for {seconds:.0f} s")
+
+        storage = load(data_file)
+        manager = TaskManager(storage)
+        # A write after every add barely gets anywhere, so only a few adds are timed
+        start = time.perf_counter()
+        for i in range(PERSISTED_ADDS):
+            manager.add_task(f"Persisted {i}", "Added by the benchmark")
+            update_data_file(data_file, storage, fsync="none")
+        elapsed = time.perf_counter() - start
+        print(f"update_data_file per add   {PERSISTED_ADDS / elapsed:10.1f} adds/s")
+
+        storage = load(data_file)
+        flusher = BackgroundFlusher(
+            data_file, storage, flush_interval=0.1, flush_every=50_000, fsync="none"
+        )
+        start = time.perf_counter()
+        added = add_for(TaskManager(storage), seconds)
+        elapsed = time.perf_counter() - start
+        flusher.close()
+        stats = flusher.stats()
+        print(
+            f"background flusher         {added / elapsed:10.1f} adds/s   "
+            f"{stats['commits']} commits, "
+            f"{stats['mutations_per_commit']:.0f} adds per commit on average, "
+            f"{stats['max_batch']} at most, "
+            f"{stats['seconds_per_commit']:.2f} s per commit"
+        )
+        assert len(load(data_file).tasks) == count + PERSISTED_ADDS + added
@@ -0,0 +1,56 @@
+"""
+Compares the memory taken by the same tasks held in a Storage (one Task object per task)
+and in a TaskTable (columns). Run from the project root:
+
+    python -m benchmarks.bench_memory [number of tasks]
+"""
+
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+from storage import Storage
+from task import Task
+from task_table import TaskTable
+
+
+def generate_tasks(count: int):
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        completed = i % 2 == 0
+        yield Task(
+            f"Task {i}",
+            f"Description of the work for project {i % 100}",
+            completed,
+            start + timedelta(seconds=i),
+            str(timedelta(seconds=i % 7200, microseconds=i)) if completed else None,
+        )
+
+
+def measure(store_class, count: int) -> int:
+    """
+    Returns the bytes still allocated once the tasks have been saved into a new store.
+    """
+    tracemalloc.start()
+    store = store_class()
+    for task in generate_tasks(count):
+        store.save_task(task)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del store
+    return size
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    results = {
+        store_class.__name__: measure(store_class, count)
+        for store_class in (Storage, TaskTable)
+    }
+
+    for name, size in results.items():
+        print(f"{name:<10} {size / 1e6:8.1f} MB  {size / count:6.1f} bytes/task")
+    print(
+        f"TaskTable uses {results['TaskTable'] / results['Storage']:.0%} of the memory "
+        "of Storage"
+    )
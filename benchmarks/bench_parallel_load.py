@@ -0,0 +1,52 @@
+"""
+Times loading a JSON data file into a Storage sequentially and with parallel_load for a
+growing number of worker processes, and reports the speedup next to the number of cores.
+Run from the project root:
+
+    python -m benchmarks.bench_parallel_load [number of tasks]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.datasets import write_dataset
+from parallel_load import load_tasks_parallel
+from storage import Storage
+
+
+def time_load(data_file: str, workers: int) -> tuple[float, Storage]:
+    storage = Storage()
+    start = time.perf_counter()
+    if workers == 1:
+        with open(data_file, "r") as f:
+            storage.load_tasks(f)
+    else:
+        load_tasks_parallel(storage, data_file, workers)
+    return time.perf_counter() - start, storage
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    cores = os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, "tasks.json")
+        write_dataset(data_file, count)
+        size = os.path.getsize(data_file)
+
+        sequential, expected = time_load(data_file, 1)
+        titles = list(expected.tasks)
+        print(f"{count} tasks ({size / 2**20:.0f} MiB), {cores} cores")
+        print(f"workers  1   {sequential:7.2f} s   (sequential load_tasks)")
+
+        workers = 2
+        while workers <= max(2, cores):
+            seconds, storage = time_load(data_file, workers)
+            assert list(storage.tasks) == titles
+            print(
+                f"workers {workers:2}   {seconds:7.2f} s   speedup "
+                f"{sequential / seconds:5.2f}x"
+            )
+            workers *= 2
@@ -0,0 +1,83 @@
+"""
+Times listing the pending tasks and counting tasks by status on a Storage, with the
+pending index against the full scans they used to be. Run from the project root:
+
+    python -m benchmarks.bench_pending [number of tasks] [share of pending tasks]
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta
+
+from storage import Storage
+from task import Task
+from task_manager import TaskManager
+
+
+def build_storage(count: int, pending_share: float) -> Storage:
+    start = datetime(2024, 1, 1)
+    every = max(1, round(1 / pending_share))
+    storage = Storage()
+    for i in range(count):
+        completed = i % every != 0
+        storage.save_task(
+            Task(
+                f"Task {i}",
+                "Description",
+                completed,
+                start + timedelta(seconds=i),
+                "0:03:12" if completed else None,
+            )
+        )
+    return storage
+
+
+def best_of(function, repeat: int = 5) -> float:
+    """The fastest of a few runs in seconds, the slower ones are mostly noise."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def scan_pending(storage: Storage) -> list[Task]:
+    """How pending tasks were listed before the index, one pass over every task."""
+    return [task for task in storage.get_all_tasks() if not task.completed]
+
+
+def scan_counts(storage: Storage) -> tuple[int, int]:
+    """How the report counted tasks by status before the index."""
+    tasks = storage.get_all_tasks()
+    completed = [task for task in tasks if task.completed]
+    pending = [task for task in tasks if not task.completed]
+    return len(completed), len(pending)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    pending_share = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+
+    storage = build_storage(count, pending_share)
+    manager = TaskManager(storage)
+    assert scan_pending(storage) == manager.list_tasks()
+
+    rows = [
+        (
+            "list pending",
+            best_of(lambda: scan_pending(storage)),
+            best_of(manager.list_tasks),
+        ),
+        (
+            "count by status",
+            best_of(lambda: scan_counts(storage)),
+            best_of(storage.get_report_stats),
+        ),
+    ]
+    print(f"{count} tasks, {len(manager.list_tasks())} pending")
+    for name, scan, indexed in rows:
+        print(
+            f"{name:<16} scan {scan * 1e3:9.3f} ms   index {indexed * 1e3:9.3f} ms   "
+            f"{scan / indexed:8.0f}x"
+        )
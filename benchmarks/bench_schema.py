@@ -0,0 +1,64 @@
+"""
+Compares loading a data file into a Storage, generating the report and dumping the file
+back, for schema version 1 (ISO timestamps and str(timedelta) completion times) and
+version 2 (microseconds, see storage.SCHEMA_VERSIONS).
+Run from the project root:
+
+    python -m benchmarks.bench_schema [number of tasks]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.datasets import write_dataset
+from storage import Storage
+from task_manager import TaskManager
+from utils import create_data_file, migrate_data_file, update_data_file
+
+
+def measure(data_file: str) -> tuple[float, float, float, dict]:
+    """
+    Returns the seconds taken by the load, the report and the dump, and the report.
+    """
+    storage = Storage()
+    start = time.perf_counter()
+    create_data_file(data_file, storage)
+    loaded = time.perf_counter()
+    # A fresh manager over freshly loaded tasks, so nothing is reused from an earlier
+    # report
+    report = TaskManager(storage).generate_report(self_check=True)
+    reported = time.perf_counter()
+    storage.changed = True
+    update_data_file(data_file, storage, fsync="none")
+    dumped = time.perf_counter()
+    return loaded - start, reported - loaded, dumped - reported, report
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    with tempfile.TemporaryDirectory() as directory:
+        v1 = os.path.join(directory, "v1.json")
+        write_dataset(v1, count)
+        v2 = os.path.join(directory, "v2.json")
+        shutil.copy(v1, v2)
+        start = time.perf_counter()
+        migrate_data_file(v2, fsync="none")
+        print(
+            f"{count} tasks, migrated to version 2 in "
+            f"{time.perf_counter() - start:.2f} s"
+        )
+
+        reports = []
+        for version, data_file in ((1, v1), (2, v2)):
+            load, report, dump, result = measure(data_file)
+            reports.append(result)
+            print(
+                f"version {version}   load {load:6.2f} s   report {report:6.3f} s   "
+                f"dump {dump:6.2f} s   "
+                f"{os.path.getsize(data_file) / 2**20:7.1f} MiB"
+            )
+        assert reports[0] == reports[1]
@@ -0,0 +1,73 @@
+"""
+Times writing back a single change and loading everything, for one JSON data file and
+for directories of shards.
+Run from the project root:
+
+    python -m benchmarks.bench_shards [number of tasks] [number of shards]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.datasets import generate_records, pending_titles
+from sharded_storage import ShardedStorage
+from storage import Storage, record_to_task
+from task_manager import TaskManager
+from utils import create_data_file, update_data_file
+
+
+def fill(storage: Storage, count: int) -> None:
+    for record in generate_records(count):
+        storage.save_task(record_to_task(record))
+
+
+def time_single_change(data_file: str, storage: Storage, title: str) -> float:
+    """Completes one task and writes the change back."""
+    start = time.perf_counter()
+    TaskManager(storage).complete_task(title)
+    update_data_file(data_file, storage)
+    return time.perf_counter() - start
+
+
+def time_load(data_file: str, storage: Storage, **kwargs) -> float:
+    start = time.perf_counter()
+    if kwargs:
+        storage.open(data_file, **kwargs)
+    else:
+        create_data_file(data_file, storage)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    shards = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    first, second = pending_titles(count, 0.5, 2)
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_file = os.path.join(directory, "tasks.json")
+        shards_dir = os.path.join(directory, "tasks.shards")
+
+        single = Storage()
+        fill(single, count)
+        update_data_file(json_file, single)
+        sharded = ShardedStorage(shards)
+        sharded.open(shards_dir)
+        fill(sharded, count)
+        update_data_file(shards_dir, sharded)
+
+        print(f"{count} tasks, {shards} shards")
+        print(
+            "write one change   single file "
+            f"{time_single_change(json_file, single, first) * 1e3:9.1f} ms"
+            f"   shards {time_single_change(shards_dir, sharded, first) * 1e3:9.1f} ms"
+        )
+        single = time_load(json_file, Storage())
+        one_worker = time_load(shards_dir, ShardedStorage(), workers=1)
+        all_workers = time_load(shards_dir, ShardedStorage(), workers=os.cpu_count())
+        print(
+            f"load               single file {single * 1e3:9.1f} ms"
+            f"   shards {one_worker * 1e3:9.1f} ms (1 worker)"
+            f"   {all_workers * 1e3:9.1f} ms ({os.cpu_count()} workers)"
+        )
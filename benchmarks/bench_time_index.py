@@ -0,0 +1,108 @@
+"""
+Times a two week report and listing out of years of history on a Storage, with the time
+index a long-lived process attaches against the scan a single command does. Run from the
+project root:
+
+    python -m benchmarks.bench_time_index [number of tasks]
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.bench_pending import best_of
+from storage import Storage
+from task import Task, completion_seconds
+from task_manager import TaskManager
+
+START = datetime(2020, 1, 1)
+# The tasks are spread over five years
+SPAN = timedelta(days=5 * 365)
+
+
+def build_storage(count: int) -> Storage:
+    step = SPAN / count
+    storage = Storage()
+    for i in range(count):
+        completed = i % 2 == 0
+        storage.save_task(
+            Task(
+                f"Task {i}",
+                "Description",
+                completed,
+                START + step * i,
+                "1 day, 0:03:12" if completed else None,
+            )
+        )
+    return storage
+
+
+def scan_report(
+    storage: Storage, since: datetime, until: datetime
+) -> tuple[int, int, float | None]:
+    """The aggregates of the range, looking at every task like a report had to."""
+    total = completed = 0
+    seconds = 0.0
+    for task in storage.tasks.values():
+        if since <= task.created_at < until:
+            total += 1
+            if task.completed:
+                completed += 1
+                seconds += completion_seconds(task.completion_time)
+    return total, completed, seconds / completed if completed else None
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    storage = build_storage(count)
+    since = START + timedelta(days=700)
+    until = since + timedelta(days=14)
+    print(f"{count} tasks over {SPAN.days} days, a {(until - since).days} day range")
+
+    # A single command scans, nothing is attached to the storage
+    manager = TaskManager(storage)
+    scanned_report = best_of(lambda: manager.generate_report(since=since, until=until))
+    scanned_list = best_of(
+        lambda: list(
+            manager.iter_tasks(
+                True, limit=100, created_after=since, created_before=until
+            )
+        )
+    )
+    report = manager.generate_report(since=since, until=until)
+
+    start = time.perf_counter()
+    storage.attach_time_index()
+    print(f"building the index        {time.perf_counter() - start:9.3f} s")
+
+    indexed = best_of(lambda: manager.generate_report(since=since, until=until))
+    print(f"report, scanning          {scanned_report * 1e3:9.2f} ms")
+    print(
+        f"report, time index        {indexed * 1e3:9.2f} ms   "
+        f"{scanned_report / indexed:6.0f}x"
+    )
+    assert manager.generate_report(since=since, until=until) == report
+
+    indexed = best_of(
+        lambda: list(
+            manager.iter_tasks(
+                True, limit=100, created_after=since, created_before=until
+            )
+        )
+    )
+    print(f"list 100, scanning        {scanned_list * 1e3:9.2f} ms")
+    print(
+        f"list 100, time index      {indexed * 1e3:9.2f} ms   "
+        f"{scanned_list / indexed:6.0f}x"
+    )
+
+    added = best_of(
+        lambda: storage.save_task(
+            Task(f"Added {time.perf_counter_ns()}", "Description")
+        ),
+        repeat=1000,
+    )
+    print(f"save_task with the index  {added * 1e6:9.2f} us")
+
+    total, completed, _ = scan_report(storage, since, until)
+    assert (report["total"], report["completed"]) == (total, completed)
@@ -0,0 +1,103 @@
+"""
+Compares two result files of the suite and flags the benchmarks that got slower or took
+more memory.
+"""
+
+import json
+
+DEFAULT_THRESHOLD = 0.10
+# Differences below this many seconds are timer noise, whatever their ratio
+NOISE_SECONDS = 0.001
+
+
+def load_results(path: str) -> dict:
+    """Reads a result file written by save_results."""
+    with open(path, "r") as f:
+        results = json.load(f)
+    if not isinstance(results, dict) or "results" not in results:
+        raise ValueError(f"*** {path} is not a benchmark result file. ***")
+    return results
+
+
+def save_results(results: dict, path: str) -> None:
+    """Writes the results of run_suite as JSON."""
+    with open(path, "w") as f:
+        json.dump(results, f, indent=4)
+        f.write("\n")
+
+
+def compare(
+    baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD
+) -> list[dict]:
+    """
+    Pairs the results of two runs by benchmark and size.
+
+    Parameters:
+        - baseline: dict
+            the results of the reference run
+        - current: dict
+            the results of the run being checked
+        - threshold: float
+            the relative slowdown (or memory growth) from which a benchmark is flagged,
+            0.10 for 10%
+
+    Returns:
+        - list[dict]
+            one row per benchmark found in both runs, in the order of the current run,
+            with the time and memory ratios (current / baseline) and a regression flag
+    """
+    reference = {(row["benchmark"], row["size"]): row for row in baseline["results"]}
+    rows = []
+    for row in current["results"]:
+        before = reference.get((row["benchmark"], row["size"]))
+        if before is None:
+            continue
+
+        time_ratio = row["seconds"] / before["seconds"] if before["seconds"] else None
+        slower = (
+            time_ratio is not None
+            and time_ratio > 1 + threshold
+            and row["seconds"] - before["seconds"] > NOISE_SECONDS
+        )
+
+        memory_ratio = None
+        if row.get("peak_bytes") is not None and before.get("peak_bytes"):
+            memory_ratio = row["peak_bytes"] / before["peak_bytes"]
+        bigger = memory_ratio is not None and memory_ratio > 1 + threshold
+
+        rows.append(
+            {
+                "benchmark": row["benchmark"],
+                "size": row["size"],
+                "baseline_seconds": before["seconds"],
+                "seconds": row["seconds"],
+                "time_ratio": time_ratio,
+                "baseline_peak_bytes": before.get("peak_bytes"),
+                "peak_bytes": row.get("peak_bytes"),
+                "memory_ratio": memory_ratio,
+                "regression": slower or bigger,
+            }
+        )
+    return rows
+
+
+def format_comparison(rows: list[dict]) -> str:
+    """Formats the rows of compare as a table, regressions are marked with !!."""
+    lines = [
+        f"{'benchmark':<18} {'size':>10} {'before ms':>12} {'after ms':>12} "
+        f"{'time':>8} {'memory':>8}"
+    ]
+    for row in rows:
+        time_ratio = (
+            f"{row['time_ratio']:.2f}x" if row["time_ratio"] is not None else "-"
+        )
+        memory_ratio = (
+            f"{row['memory_ratio']:.2f}x" if row["memory_ratio"] is not None else "-"
+        )
+        lines.append(
+            f"{row['benchmark']:<18} {row['size']:>10} "
+            f"{row['baseline_seconds'] * 1e3:12.3f} "
+            f"{row['seconds'] * 1e3:12.3f} {time_ratio:>8} {memory_ratio:>8}"
+            + ("  !!" if row["regression"] else "")
+        )
+    return "\n".join(lines)
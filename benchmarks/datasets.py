@@ -0,0 +1,140 @@
+"""
+Deterministic synthetic datasets: the same size, completed ratio and seed always give
+the same tasks, so runs of the suite on different commits measure the same work.
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from json_stream import write_json_array
+
+START = datetime(2024, 1, 1)
+PROJECTS = 100
+_WORDS = [
+    "review",
+    "update",
+    "fix",
+    "write",
+    "plan",
+    "design",
+    "test",
+    "deploy",
+    "refactor",
+    "document",
+    "migrate",
+    "report",
+    "schedule",
+    "clean",
+    "merge",
+    "release",
+    "audit",
+    "profile",
+    "index",
+    "sync",
+]
+
+_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_size(text: str) -> int:
+    """Parses a dataset size like 5000, 10k or 10M."""
+    text = text.strip().lower()
+    multiplier = _SUFFIXES.get(text[-1:], 1)
+    digits = text[:-1] if text[-1:] in _SUFFIXES else text
+    try:
+        size = int(float(digits) * multiplier)
+    except ValueError:
+        raise ValueError(
+            f"*** '{text}' is not a dataset size, use a count like 5000, 10k or 10M. "
+            "***"
+        ) from None
+    if size < 0:
+        raise ValueError(
+            f"*** '{text}' is not a dataset size, use a count like 5000, 10k or 10M. "
+            "***"
+        )
+    return size
+
+
+def is_completed(i: int, completed_ratio: float) -> bool:
+    """
+    Whether the i-th task is completed. Completed tasks are spread evenly and match the
+    ratio at every prefix.
+    """
+    return int((i + 1) * completed_ratio) > int(i * completed_ratio)
+
+
+def pending_titles(count: int, completed_ratio: float, limit: int) -> list[str]:
+    """The titles of the first pending tasks of a dataset, at most limit of them."""
+    titles = []
+    for i in range(count):
+        if len(titles) >= limit:
+            break
+        if not is_completed(i, completed_ratio):
+            titles.append(task_title(i))
+    return titles
+
+
+def task_title(i: int) -> str:
+    return f"Task {i}"
+
+
+def generate_records(
+    count: int, completed_ratio: float = 0.5, seed: int = 0
+) -> Iterator[dict]:
+    """
+    Yields the records of a dataset, as they are stored in the data file.
+
+    Parameters:
+        - count: int
+            the number of tasks
+        - completed_ratio: float
+            the share of completed tasks, between 0 and 1
+        - seed: int
+            the seed of the descriptions and completion times
+
+    Returns:
+        - Iterator[dict]
+
+    Raises:
+        - ValueError
+            if the ratio is not between 0 and 1
+    """
+    if not 0 <= completed_ratio <= 1:
+        raise ValueError(
+            "*** The completed ratio should be between 0 and 1, not "
+            f"{completed_ratio}. ***"
+        )
+
+    rng = random.Random(seed)
+    for i in range(count):
+        completed = is_completed(i, completed_ratio)
+        words = " ".join(rng.choices(_WORDS, k=4))
+        yield {
+            "title": task_title(i),
+            "description": f"{words} for project {rng.randrange(PROJECTS)}",
+            "completed": completed,
+            "created_at": (START + timedelta(seconds=i)).isoformat(),
+            "completion_time": (
+                str(
+                    timedelta(
+                        seconds=rng.randrange(60, 7 * 86400),
+                        microseconds=rng.randrange(1_000_000),
+                    )
+                )
+                if completed
+                else None
+            ),
+        }
+
+
+def write_dataset(
+    data_file: str, count: int, completed_ratio: float = 0.5, seed: int = 0
+) -> None:
+    """
+    Writes a dataset as a JSON data file, one record at a time so even 10M tasks never
+    sit in memory.
+    """
+    with open(data_file, "w") as f:
+        write_json_array(generate_records(count, completed_ratio, seed), f)
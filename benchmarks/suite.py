@@ -0,0 +1,228 @@
+"""
+Times the core operations of the task manager on synthetic datasets and records their
+peak memory.
+
+Every benchmark is a setup, which is not timed, and a run. The run is timed repeat times
+and the fastest time is kept, the slower ones are mostly noise. Peak memory is traced in
+one extra run, since tracing slows everything down; it is the peak of what the run
+allocated on top of what its setup left.
+"""
+
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from itertools import count
+
+from benchmarks.datasets import pending_titles, write_dataset
+from storage import Storage
+from task import Task
+from task_manager import TaskManager
+from utils import create_data_file, update_data_file
+
+RESULTS_VERSION = 1
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+
+def measure(
+    setup, run, repeat: int = 3, memory: bool = True
+) -> tuple[float, int | None]:
+    """
+    Times run(setup()) and traces its peak memory.
+
+    Parameters:
+        - setup: Callable[[], object]
+            builds the argument of a run, called before every run
+        - run: Callable[[object], object]
+            the work being measured
+        - repeat: int
+            the number of timed runs
+        - memory: bool
+            whether to trace the peak memory in an extra run
+
+    Returns:
+        - tuple[float, int | None]
+            the fastest run in seconds and the peak memory in bytes (None when not
+            traced)
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        argument = setup()
+        start = time.perf_counter()
+        run(argument)
+        best = min(best, time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        argument = setup()
+        tracemalloc.start()
+        try:
+            run(argument)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best, peak
+
+
+def benchmarks(
+    data_file: str, size: int, completed_ratio: float, operations: int
+) -> list[tuple]:
+    """
+    The benchmarks of a dataset as (name, number of operations, setup, run). The ones
+    working on a loaded storage share it, which is why the ones adding and completing
+    tasks, the only ones changing it, come last.
+    """
+    storage = Storage()
+    with open(data_file, "r") as f:
+        storage.load_tasks(f)
+    manager = TaskManager(storage)
+    output_file = data_file + ".out"
+
+    def load_tasks(_):
+        with open(data_file, "r") as f:
+            Storage().load_tasks(f)
+
+    def dump(_):
+        with open(output_file, "w") as f:
+            storage.dump(f)
+
+    def touch():
+        # update_data_file skips a storage without changes, which is not what is being
+        # measured
+        storage.changed = True
+
+    def update(_):
+        update_data_file(output_file, storage)
+
+    adds = count()
+
+    def new_titles():
+        return [f"Benchmark {next(adds)}" for _ in range(operations)]
+
+    def add_tasks(titles):
+        for title in titles:
+            manager.add_task(title, "Added by the benchmark")
+
+    # complete_task runs on the same pending tasks every time, the setup puts them back
+    # to pending
+    pending = pending_titles(size, completed_ratio, operations)
+
+    def reopen():
+        for title in pending:
+            task = storage.get_task(title)
+            storage.update_task(
+                Task(task.title, task.description, False, task.created_at, None)
+            )
+        return pending
+
+    def complete_tasks(titles):
+        for title in titles:
+            manager.complete_task(title)
+
+    def add_tasks_bulk(titles):
+        manager.add_tasks((title, "Added by the benchmark") for title in titles)
+
+    def nothing() -> None:
+        pass
+
+    return [
+        ("load_tasks", 1, nothing, load_tasks),
+        ("dump", 1, nothing, dump),
+        (
+            "create_data_file",
+            1,
+            nothing,
+            lambda _: create_data_file(data_file, Storage()),
+        ),
+        ("update_data_file", 1, touch, update),
+        ("list_tasks", 1, nothing, lambda _: manager.list_tasks()),
+        ("generate_report", 1, nothing, lambda _: manager.generate_report()),
+        ("add_task", operations, new_titles, add_tasks),
+        ("complete_task", len(pending), reopen, complete_tasks),
+        ("add_tasks", operations, new_titles, add_tasks_bulk),
+        ("complete_tasks", len(pending), reopen, manager.complete_tasks),
+    ]
+
+
+def run_suite(
+    sizes=DEFAULT_SIZES,
+    completed_ratio: float = 0.5,
+    seed: int = 0,
+    repeat: int = 3,
+    operations: int = 1000,
+    memory: bool = True,
+    only: tuple[str, ...] | None = None,
+    log=None,
+) -> dict:
+    """
+    Runs every benchmark on a dataset of every size.
+
+    Parameters:
+        - sizes: Iterable[int]
+            the numbers of tasks of the datasets
+        - completed_ratio: float
+            the share of completed tasks of the datasets
+        - seed: int
+            the seed of the datasets
+        - repeat: int
+            the number of timed runs of every benchmark
+        - operations: int
+            the number of tasks add_task and complete_task are timed on, per run
+        - memory: bool
+            whether to record the peak memory
+        - only: tuple[str, ...] | None
+            the names of the benchmarks to run, all of them when None
+        - log: file object | None
+            where progress is written, nothing is written when None
+
+    Returns:
+        - dict
+            the results, as written by save_results
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            data_file = os.path.join(directory, f"tasks_{size}.json")
+            write_dataset(data_file, size, completed_ratio, seed)
+            for name, operations_run, setup, run in benchmarks(
+                data_file, size, completed_ratio, operations
+            ):
+                if only is not None and name not in only:
+                    continue
+                seconds, peak = measure(setup, run, repeat, memory)
+                results.append(
+                    {
+                        "benchmark": name,
+                        "size": size,
+                        "operations": operations_run,
+                        "seconds": seconds,
+                        "seconds_per_operation": (
+                            seconds / operations_run if operations_run else None
+                        ),
+                        "peak_bytes": peak,
+                    }
+                )
+                if log is not None:
+                    log.write(f"{name:<18} {size:>10} tasks {seconds * 1e3:12.3f} ms\n")
+            os.remove(data_file)
+
+    return {
+        "version": RESULTS_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "config": {
+            "sizes": list(sizes),
+            "completed_ratio": completed_ratio,
+            "seed": seed,
+            "repeat": repeat,
+            "operations": operations,
+        },
+        "results": results,
+    }
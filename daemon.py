@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import functools
+import json
+import os
+import signal
+import sys
+from itertools import islice
+
+from batch import MUTATIONS, apply_operation, iter_list_records
+from daemon_client import DaemonClient, default_socket_path
+from main import COMPACT, DATA_FILE, FSYNC, WORKERS, build_storage
+from task_manager import TaskManager
+from utils import DEFAULT_FSYNC, create_data_file, update_data_file
+
+# The number of tasks per reply line of a listing
+LIST_PAGE_SIZE = 1000
+
+
+class TaskDaemon:
+    """
+    Keeps a storage and its TaskManager in memory and applies the operations clients
+    send over a Unix domain socket, so a command costs a round trip instead of an
+    interpreter start, a full load and a full write.
+
+    Changes are written to the data file with update_data_file according to the flush
+    policy: once flush_every changes have piled up, or flush_interval seconds after the
+    first unwritten change, whichever comes first. flush_every=1 writes after every
+    change. Everything is written on shutdown as well. fsync is the fsync policy of the
+    writes and compact whether a JSON file is written without indentation, see
+    utils.update_data_file.
+
+    Operations run one at a time on the event loop, so they never interleave. The flush
+    runs in an executor, so the loop keeps accepting connections meanwhile, and
+    operations wait for it to finish.
+
+    Besides the operations of batch.apply_operation, the daemon understands {"op":
+    "flush"} and {"op": "shutdown"}. A listing is written in pages of LIST_PAGE_SIZE
+    tasks, one reply line each, all of them but the last with "more": true, see
+    DaemonClient.iter_tasks.
+    """
+
+    def __init__(
+        self,
+        data_file: str,
+        storage,
+        socket_path: str,
+        flush_interval: float = 1.0,
+        flush_every: int = 1000,
+        fsync: str = DEFAULT_FSYNC,
+        compact: bool = False,
+    ):
+        self.data_file = data_file
+        self.storage = storage
+        self.manager = TaskManager(storage, index_time_ranges=True)
+        self.socket_path = socket_path
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.fsync = fsync
+        self.compact = compact
+
+        self.unflushed = 0
+        self._lock = asyncio.Lock()
+        self._flush_timer: asyncio.TimerHandle | None = None
+        self._flush_task: asyncio.Task | None = None
+        self._stopped: asyncio.Event | None = None
+
+    async def serve(self) -> None:
+        """
+        Listens on the socket until a shutdown operation or SIGINT/SIGTERM, then flushes
+        and cleans up.
+        """
+        self._remove_stale_socket()
+        create_data_file(self.data_file, self.storage, workers=WORKERS)
+
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, self._stopped.set)
+
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        try:
+            async with server:
+                await self._stopped.wait()
+        finally:
+            await self.flush()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    async def flush(self) -> None:
+        """Writes the changes to the data file, if there are any."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        async with self._lock:
+            if self.unflushed:
+                await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    functools.partial(
+                        update_data_file,
+                        self.data_file,
+                        self.storage,
+                        fsync=self.fsync,
+                        compact=self.compact,
+                    ),
+                )
+                self.unflushed = 0
+
+    async def apply(self, op) -> dict:
+        """Applies an operation sent by a client and returns its result."""
+        if isinstance(op, dict) and op.get("op") == "flush":
+            await self.flush()
+            return {"ok": True, "status": "flushed"}
+        if isinstance(op, dict) and op.get("op") == "shutdown":
+            self._stopped.set()
+            return {"ok": True, "status": "stopping"}
+
+        try:
+            async with self._lock:
+                try:
+                    result = apply_operation(self.manager, op)
+                except (ValueError, AssertionError) as e:
+                    return _error(e)
+                except Exception:
+                    # The operation may have changed tasks before it failed, they are
+                    # flushed like any other change
+                    if op.get("op") in MUTATIONS:
+                        self._changed()
+                    raise
+
+                if result["ok"] and op["op"] in MUTATIONS:
+                    self._changed()
+                return result
+        finally:
+            if self.unflushed >= self.flush_every:
+                await self.flush()
+
+    async def write_listing(self, op: dict, writer: asyncio.StreamWriter) -> None:
+        """
+        Writes the result of a list operation page by page, so a long listing is never
+        held as one reply. Other operations wait until the last page is written.
+        """
+        async with self._lock:
+            try:
+                records = iter_list_records(self.manager, op)
+                page = list(islice(records, LIST_PAGE_SIZE))
+            except (ValueError, AssertionError) as e:
+                writer.write(_encode(_error(e)))
+                return
+
+            while True:
+                next_page = list(islice(records, LIST_PAGE_SIZE))
+                writer.write(
+                    _encode(
+                        {
+                            "ok": True,
+                            "status": "listed",
+                            "tasks": page,
+                            "more": bool(next_page),
+                        }
+                    )
+                )
+                await writer.drain()
+                if not next_page:
+                    break
+                page = next_page
+
+    def _changed(self) -> None:
+        """
+        Counts a change and schedules a flush, apply flushes right away once flush_every
+        is reached.
+        """
+        self.unflushed += 1
+        if self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(
+                self.flush_interval, self._flush_later
+            )
+
+    def _flush_later(self) -> None:
+        """
+        Starts the flush the timer is due for, the task is kept so it is not garbage
+        collected while running.
+        """
+        self._flush_timer = None
+        self._flush_task = asyncio.ensure_future(self.flush())
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serves one client connection, one JSON line per operation."""
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                try:
+                    op = json.loads(line.decode("utf-8"))
+                except ValueError as e:
+                    writer.write(_encode(_error(e)))
+                else:
+                    if isinstance(op, dict) and op.get("op") == "list":
+                        await self.write_listing(op, writer)
+                    else:
+                        writer.write(_encode(await self.apply(op)))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _remove_stale_socket(self) -> None:
+        """Removes the socket left behind by a daemon that did not shut down cleanly."""
+        if not os.path.exists(self.socket_path):
+            return
+        client = DaemonClient.connect(self.socket_path)
+        if client is not None:
+            client.close()
+            raise ValueError(
+                f"*** A task daemon is already listening on {self.socket_path}. ***"
+            )
+        os.remove(self.socket_path)
+
+
+def _error(e: Exception) -> dict:
+    return {"ok": False, "status": "error", "error": str(e)}
+
+
+def _encode(result: dict) -> bytes:
+    return json.dumps(result).encode("utf-8") + b"\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Task Management System daemon")
+    parser.add_argument(
+        "--socket", help="The Unix socket to listen on (default: <data file>.sock)"
+    )
+    parser.add_argument(
+        "--flush-interval",
+        type=float,
+        default=1.0,
+        help="Seconds after the first unwritten change until the data file is written",
+    )
+    parser.add_argument(
+        "--flush-every",
+        type=int,
+        default=1000,
+        help=(
+            "Number of unwritten changes that triggers a write right away (1 writes "
+            "after every change)"
+        ),
+    )
+    args = parser.parse_args()
+
+    daemon = TaskDaemon(
+        DATA_FILE,
+        build_storage(),
+        args.socket or default_socket_path(DATA_FILE),
+        flush_interval=args.flush_interval,
+        flush_every=max(1, args.flush_every),
+        fsync=FSYNC,
+        compact=COMPACT,
+    )
+    try:
+        asyncio.run(daemon.serve())
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
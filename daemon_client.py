@@ -0,0 +1,104 @@
+import json
+import os
+import socket
+from typing import Iterator
+
+# Every main.py call imports this module to look for a daemon, so it only depends on the
+# standard library
+
+_CLOSED = "*** The task daemon closed the connection, nothing more was applied. ***"
+
+
+def default_socket_path(data_file: str) -> str:
+    """
+    The socket a daemon serving data_file listens on, unless TASKS_SOCKET says
+    otherwise.
+    """
+    return os.environ.get("TASKS_SOCKET", os.path.abspath(data_file) + ".sock")
+
+
+class DaemonClient:
+    """
+    A connection to a running daemon. Operations are sent as JSON lines and every one
+    gets a JSON line back, see batch.apply_operation for what they look like.
+    """
+
+    def __init__(self, connection: socket.socket):
+        self.connection = connection
+        self.reader = connection.makefile("r", encoding="utf-8")
+
+    @classmethod
+    def connect(cls, socket_path: str) -> "DaemonClient | None":
+        """
+        Connects to the daemon listening on socket_path.
+
+        Returns:
+            - DaemonClient | None
+                the client, None if no daemon is running
+        """
+        if not hasattr(socket, "AF_UNIX"):
+            return None
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            connection.close()
+            return None
+        return cls(connection)
+
+    def request_line(self, line: str) -> dict:
+        """Sends an operation that is already a JSON line and returns the result, a
+        listing with all its pages.
+
+        Raises:
+            - ValueError
+                if the daemon went away
+        """
+        self._send(line)
+        result = self._reply()
+        more = result.pop("more", False)
+        while more:
+            page = self._reply()
+            result["tasks"] += page["tasks"]
+            more = page["more"]
+        return result
+
+    def request(self, op: dict) -> dict:
+        """Sends an operation and returns the result."""
+        return self.request_line(json.dumps(op))
+
+    def iter_tasks(self, op: dict) -> Iterator[dict]:
+        """Sends a list operation and yields its records as the pages of the listing
+        arrive.
+
+        Raises:
+            - ValueError
+                if the operation failed or the daemon went away
+        """
+        self._send(json.dumps(op))
+        while True:
+            result = self._reply()
+            if not result["ok"]:
+                raise ValueError(result["error"])
+            yield from result["tasks"]
+            if not result.get("more"):
+                return
+
+    def close(self) -> None:
+        self.reader.close()
+        self.connection.close()
+
+    def _send(self, line: str) -> None:
+        try:
+            self.connection.sendall(line.rstrip("\n").encode("utf-8") + b"\n")
+        except OSError:
+            raise ValueError(_CLOSED) from None
+
+    def _reply(self) -> dict:
+        try:
+            reply = self.reader.readline()
+        except OSError:
+            reply = ""
+        if not reply:
+            raise ValueError(_CLOSED)
+        return json.loads(reply)
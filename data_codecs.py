@@ -0,0 +1,76 @@
+import bz2
+import gzip
+import io
+import lzma
+
+# Compressed JSON data files are named <name>.json.<codec>
+CODECS = {"gz": gzip, "xz": lzma, "bz2": bz2}
+
+# The errors a codec raises on data it can not decompress
+CODEC_ERRORS = (OSError, EOFError, lzma.LZMAError)
+
+# gzip defaults to its slowest level, 6 is what the gzip tool uses and compresses tasks
+# almost as well
+_WRITE_OPTIONS = {"gz": {"compresslevel": 6}, "xz": {}, "bz2": {}}
+
+
+def codec_of(path: str) -> str | None:
+    """
+    The codec of a compressed JSON data file (.json.gz, .json.xz or .json.bz2), None for
+    any other file.
+    """
+    tokens = path.split(".")
+    if len(tokens) > 2 and tokens[-2] == "json" and tokens[-1] in CODECS:
+        return tokens[-1]
+    return None
+
+
+def open_text(path: str, mode: str = "r"):
+    """
+    Opens a data file in text mode, decompressing or compressing it on the fly when its
+    name says it is compressed. Nothing is decompressed ahead of time, reads and writes
+    stream through the codec.
+
+    Parameters:
+        - path: str
+            file path
+        - mode: str
+            "r" or "w"
+
+    Returns:
+        - file object
+            a text file object
+    """
+    codec = codec_of(path)
+    if codec is None:
+        return open(path, mode)
+    options = _WRITE_OPTIONS[codec] if "w" in mode else {}
+    return CODECS[codec].open(path, mode + "t", encoding="utf-8", **options)
+
+
+def open_writer(raw, codec: str):
+    """
+    Wraps a binary file object that is open for writing in a text file object
+    compressing what is written to it. Closing the text file object ends the compressed
+    stream but leaves the binary one open, so it can still be synced before it is
+    closed.
+
+    Parameters:
+        - raw: file object
+            a binary file object open for writing
+        - codec: str
+            one of CODECS
+
+    Returns:
+        - file object
+            a text file object
+    """
+    if codec == "gz":
+        # No file name or time in the header, the same tasks always compress to the same
+        # bytes
+        compressed = gzip.GzipFile(
+            filename="", mode="wb", fileobj=raw, mtime=0, **_WRITE_OPTIONS[codec]
+        )
+    else:
+        compressed = CODECS[codec].open(raw, "wb", **_WRITE_OPTIONS[codec])
+    return io.TextIOWrapper(compressed, encoding="utf-8")
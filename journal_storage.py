@@ -0,0 +1,260 @@
+import json
+import os
+import threading
+
+from data_codecs import codec_of, open_text, open_writer
+from storage import Storage, record_to_task, task_to_record
+from task import Task
+
+
+class JournalStorage(Storage):
+    """
+    A Storage that appends every mutation to a journal file next to the data file
+    instead of rewriting the whole data file on every run.
+
+    The data file acts as the last snapshot. On load, the snapshot is read first and
+    then the journal is replayed on top of it. Once the journal grows past a size
+    threshold, it is rotated and merged into a fresh snapshot by a background thread.
+
+    Journal format:
+        - One JSON object per line: {"op": "save" | "update", "task": <record>}
+          where <record> has the same fields as a task in the data file.
+
+    Attributes:
+            - data_file: str
+                    path of the JSON snapshot
+            - journal_file: str
+                    path of the active journal (data_file + ".journal")
+            - compact_threshold: int
+                    the journal size in bytes after which a compaction is started
+    """
+
+    def __init__(self, data_file: str, compact_threshold: int = 4 * 1024 * 1024):
+        """Initializes a journal-backed storage for the given data file."""
+        super().__init__()
+        self.data_file = data_file
+        self.journal_file = data_file + ".journal"
+        self.compact_threshold = compact_threshold
+
+        self._journal = None
+        self._journal_size = 0
+        self._replaying = False
+        self._compactor: threading.Thread | None = None
+
+    @property
+    def _rotated_file(self) -> str:
+        """The journal that is currently being merged into the snapshot."""
+        return self.journal_file + ".compacting"
+
+    def save_task(self, task: Task) -> bool:
+        """Adds a new task to the storage and journals it. See Storage.save_task."""
+        saved = super().save_task(task)
+        if saved and not self._replaying:
+            self._append("save", task)
+        return saved
+
+    def update_task(self, updated_task: Task) -> None:
+        """
+        Updates an existing task in the storage and journals it. See
+        Storage.update_task.
+        """
+        super().update_task(updated_task)
+        if not self._replaying:
+            self._append("update", updated_task)
+
+    def load_tasks(self, f) -> None:
+        """
+        Loads the snapshot from a file into the storage and replays the journal on top
+        of it.
+
+        Parameters:
+                - f: file object
+                        the snapshot to read tasks from in JSON format
+
+        Returns:
+                - None
+        """
+        self._replaying = True
+        try:
+            super().load_tasks(f)
+        finally:
+            self._replaying = False
+        self.replay_journal()
+
+    def replay_journal(self) -> None:
+        """
+        Applies the journaled mutations on top of what has been loaded so far. A journal
+        left behind by an interrupted compaction is replayed before the active one.
+
+        Replaying is idempotent, every record carries the full state of its task, so a
+        journal that has already been merged into the snapshot can safely be replayed
+        again.
+
+        Returns:
+                - None
+        """
+        self._replaying = True
+        try:
+            for journal in (self._rotated_file, self.journal_file):
+                _replay_file(self, journal)
+        finally:
+            self._replaying = False
+
+        try:
+            self._journal_size = os.path.getsize(self.journal_file)
+        except FileNotFoundError:
+            self._journal_size = 0
+
+    def sync(self) -> None:
+        """
+        Flushes the journal to disk. The snapshot itself is never rewritten here, that
+        only happens during compaction.
+
+        Returns:
+                - None
+        """
+        if self._journal is not None:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def close(self) -> None:
+        """
+        Flushes and closes the journal and waits for a running compaction to finish.
+        """
+        if self._journal is not None:
+            self.sync()
+            self._journal.close()
+            self._journal = None
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def compact(self, wait: bool = False) -> bool:
+        """
+        Rotates the active journal and merges it into a new snapshot in a background
+        thread.
+
+        Parameters:
+                - wait: bool
+                        blocks until the compaction has finished when True
+
+        Returns:
+                - True: bool
+                        if a compaction was started
+                - False: bool
+                        if a compaction is already running
+        """
+        if self._compactor is not None and self._compactor.is_alive():
+            if wait:
+                self._compactor.join()
+            return False
+
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if not os.path.exists(self.journal_file):
+            return False
+
+        # Leftover of an interrupted compaction, it has to be merged before it can be
+        # replaced
+        if os.path.exists(self._rotated_file):
+            _merge_into_snapshot(self.data_file, self._rotated_file)
+
+        os.replace(self.journal_file, self._rotated_file)
+        self._journal_size = 0
+
+        # Not a daemon thread so the interpreter waits for the snapshot to be written on
+        # exit
+        self._compactor = threading.Thread(
+            target=_merge_into_snapshot,
+            args=(self.data_file, self._rotated_file),
+            name="journal-compactor",
+        )
+        self._compactor.start()
+        if wait:
+            self._compactor.join()
+        return True
+
+    def _append(self, op: str, task: Task) -> None:
+        """Appends a single mutation to the active journal."""
+        if self._journal is None:
+            # Kept open across appends and closed by close, so it can not be a context
+            # manager
+            journal = open(self.journal_file, "a", encoding="utf-8")  # noqa: SIM115
+            self._journal = journal
+
+        line = json.dumps({"op": op, "task": task_to_record(task)}) + "\n"
+        self._journal.write(line)
+        self._journal.flush()
+        self._journal_size += len(line.encode("utf-8"))
+
+        if self._journal_size >= self.compact_threshold:
+            self.compact()
+
+
+def _replay_file(store: Storage, journal: str) -> None:
+    """Applies every record of a journal file to the given storage."""
+    try:
+        with open(journal, "rb+") as f:
+            offset = 0
+            for line_number, line in enumerate(f, start=1):
+                # A crash in the middle of an append can leave a torn last line behind.
+                # It is cut off so the next append starts on a fresh line.
+                if not line.endswith(b"\n"):
+                    f.truncate(offset)
+                    break
+                try:
+                    entry = json.loads(line)
+                    record, op = entry["task"], entry["op"]
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    raise ValueError(
+                        f"*** The journal {journal} is corrupted at line "
+                        f"{line_number}. ***"
+                    ) from None
+                offset += len(line)
+
+                task = record_to_task(record)
+                if op == "save":
+                    store.save_task(task)
+                else:
+                    store.update_task(task)
+    except FileNotFoundError:
+        return
+
+
+def _merge_into_snapshot(data_file: str, rotated_journal: str) -> None:
+    """
+    Builds a fresh snapshot from the snapshot on disk and the rotated journal.
+
+    Only files are read here, the live storage is never touched, so the compaction can
+    run concurrently with further mutations. The new snapshot replaces the old one
+    atomically before the rotated journal is removed.
+    """
+    merged = Storage()
+    try:
+        with open_text(data_file, "r") as f:
+            if f.read(1) != "":
+                merged.load_tasks(f)
+    except FileNotFoundError:
+        pass
+    _replay_file(merged, rotated_journal)
+
+    temp_file = data_file + ".tmp"
+    codec = codec_of(data_file)
+    try:
+        with open(temp_file, "wb" if codec else "w") as f:
+            if codec:
+                with open_writer(f, codec) as text:
+                    merged.dump(text)
+            else:
+                merged.dump(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, data_file)
+    except BaseException:
+        # The old snapshot and the rotated journal stay, the next compaction merges them
+        # again
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    os.remove(rotated_journal)
@@ -0,0 +1,332 @@
+import json
+import re
+from codecs import getincrementaldecoder
+from typing import Iterable, Iterator
+
+# The amount of text read from the file at a time. Only the current chunk plus the
+# record being parsed is ever held in memory.
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+# A decode error this close to the end of the buffered text can be a literal, number or
+# escape cut off by the chunk
+_MAX_CUT_TOKEN = 16
+
+
+class RawJSON(str):
+    """Text that is already JSON, write_json_array writes it out verbatim."""
+
+
+def iter_json_array(
+    f, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[tuple[int, object]]:
+    """
+    Incrementally parses a file containing a top-level JSON array and yields its
+    elements one at a time, so the whole list never has to be built in memory.
+
+    Parameters:
+        - f: file object
+            the file to read from, positioned at the start of the array
+        - chunk_size: int
+            the number of characters read from the file at a time
+
+    Returns:
+        - Iterator[tuple[int, object]]
+            the byte offset of each element in the file along with the parsed element
+
+    Raises:
+        - ValueError
+            if the file is not a well formed JSON array, the message contains the byte
+            offset of the first malformed element
+    """
+    return (
+        (offset, value)
+        for offset, value, _ in _JsonArrayReader(f, chunk_size).records()
+    )
+
+
+def iter_json_array_text(
+    f, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[tuple[int, object, RawJSON]]:
+    """
+    Same as iter_json_array, but also yields the text each element was parsed from,
+    exactly as it is in the file.
+
+    Parameters:
+        - f: file object
+            the file to read from, positioned at the start of the array
+        - chunk_size: int
+            the number of characters read from the file at a time
+
+    Returns:
+        - Iterator[tuple[int, object, RawJSON]]
+            the byte offset of each element, the parsed element and its text
+    """
+    return _JsonArrayReader(f, chunk_size).records()
+
+
+def write_json_array(records: Iterable[object], f, indent: int | None = 4) -> None:
+    """
+    Writes elements to a file as a JSON array one at a time, so the whole list never has
+    to be built in memory. The output is the same as json.dump(list(records), f,
+    indent=indent). RawJSON elements are written as they are.
+
+    Parameters:
+        - records: Iterable[object]
+            the JSON serializable elements to write
+        - f: file object
+            the file to write to
+        - indent: int | None
+            the indentation json.dump would be called with
+
+    Returns:
+        - None
+    """
+    if indent is None:
+        separator, newline = ", ", ""
+    else:
+        separator, newline = ",", "\n" + " " * indent
+
+    opening = "[" + newline
+    for record in records:
+        text = record if isinstance(record, RawJSON) else format_element(record, indent)
+        f.write(opening + text)
+        opening = separator + newline
+
+    # Nothing was written if the opening bracket is still pending
+    f.write("[]" if opening.startswith("[") else newline[:1] + "]")
+
+
+def iter_json_lines(f) -> Iterator[tuple[int, object, RawJSON]]:
+    """
+    Parses a file holding one JSON value per line (JSON Lines) and yields the values one
+    at a time. Blank lines are skipped.
+
+    Parameters:
+        - f: file object
+            the file to read from, positioned at the start of a line
+
+    Returns:
+        - Iterator[tuple[int, object, RawJSON]]
+            the byte offset of each value in the file, the parsed value and its text
+
+    Raises:
+        - ValueError
+            if a line is not valid JSON, the message contains its byte offset
+    """
+    raw = getattr(f, "buffer", None)
+    # Reading the binary buffer keeps the offsets exact, like _JsonArrayReader
+    offset = raw.tell() if raw is not None else 0
+    for line in raw if raw is not None else f:
+        text = line.decode("utf-8") if raw is not None else line
+        size = len(line) if raw is not None else len(line.encode("utf-8"))
+        text = text.strip()
+        if text:
+            try:
+                value = json.loads(text)
+            except json.JSONDecodeError:
+                raise ValueError(
+                    "*** The data file is malformed. *** \n -   The line is not valid "
+                    f"JSON (byte offset {offset})."
+                ) from None
+            yield offset, value, RawJSON(text)
+        offset += size
+
+
+def write_json_lines(
+    records: Iterable[object], f, header: object | None = None
+) -> None:
+    """
+    Writes elements to a file as JSON Lines, one compact element per line. RawJSON
+    elements are written as they are, they should not hold line breaks.
+
+    Parameters:
+        - records: Iterable[object]
+            the JSON serializable elements to write
+        - f: file object
+            the file to write to
+        - header: object | None
+            written on the first line when given
+
+    Returns:
+        - None
+    """
+    if header is not None:
+        f.write(format_line(header) + "\n")
+    for record in records:
+        text = record if isinstance(record, RawJSON) else format_line(record)
+        f.write(text + "\n")
+
+
+def format_line(record: object) -> RawJSON:
+    """
+    Formats an element the way write_json_lines writes it, compact and without the line
+    break.
+    """
+    return RawJSON(json.dumps(record, separators=(",", ":")))
+
+
+def format_element(record: object, indent: int | None = 4) -> RawJSON:
+    """
+    Formats an element the way write_json_array writes it, so the text can be kept and
+    written again as it is.
+
+    Parameters:
+        - record: object
+            the JSON serializable element
+        - indent: int | None
+            the indentation of the array it is written in
+
+    Returns:
+        - RawJSON
+            the text of the element
+    """
+    text = json.dumps(record, indent=indent)
+    if indent is not None:
+        text = text.replace("\n", "\n" + " " * indent)
+    return RawJSON(text)
+
+
+class _JsonArrayReader:
+    """
+    A small pull parser over a sliding text buffer.
+
+    Elements are decoded with json's raw_decode. When an element straddles the end of
+    the buffer, more text is read and the element is decoded again, so the buffer never
+    holds more than one chunk plus the element currently being parsed. Each retry reads
+    at least as much as the buffer already holds, so an element spanning many chunks is
+    still read in linear time, and an element that is malformed before the end of the
+    buffer fails right away instead of reading on.
+
+    Byte offsets are tracked by encoding the consumed text back to UTF-8 segment by
+    segment. When the file object exposes its binary buffer, it is read and decoded
+    directly to keep the offsets exact, since text mode would translate line endings.
+    """
+
+    def __init__(self, f, chunk_size: int):
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        # Byte offset in the file of self.buffer[self.pos]
+        self.offset = 0
+        self.eof = False
+
+        raw = getattr(f, "buffer", None)
+        if raw is not None:
+            decoder = getincrementaldecoder("utf-8")()
+
+            def read(size: int) -> str:
+                data = raw.read(size)
+                return decoder.decode(data, final=not data)
+
+            self._read = read
+        else:
+            self._read = f.read
+
+    def records(self) -> Iterator[tuple[int, object, RawJSON]]:
+        """
+        Yields (byte offset, element, element text) for every element of the array.
+        """
+        if self._next_char() != "[":
+            self._fail("The data file has to contain a JSON array of tasks")
+        self._advance(self.pos + 1)
+
+        if self._next_char() == "]":
+            self._advance(self.pos + 1)
+            self._expect_end()
+            return
+
+        while True:
+            self._next_char()
+            offset = self.offset
+            yield offset, *self._decode_value()
+
+            separator = self._next_char()
+            if separator == ",":
+                self._advance(self.pos + 1)
+            elif separator == "]":
+                self._advance(self.pos + 1)
+                self._expect_end()
+                return
+            else:
+                self._fail("Expected ',' or ']' after a task")
+
+    def _decode_value(self) -> tuple[object, RawJSON]:
+        """
+        Decodes the element starting at the current position, reading more text if
+        needed.
+        """
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # Only an element cut off by the end of the buffer can be completed by
+                # reading more
+                if self.eof or not _may_be_cut_off(e, len(self.buffer)):
+                    self._fail("The task is not valid JSON")
+                self._fill(len(self.buffer) - self.pos)
+                continue
+
+            # A scalar ending right at the end of the buffer might continue in the next
+            # chunk
+            if end == len(self.buffer) and not self.eof:
+                self._fill(len(self.buffer) - self.pos)
+                continue
+
+            text = RawJSON(self.buffer[self.pos : end])
+            self._advance(end)
+            return value, text
+
+    def _next_char(self) -> str:
+        """
+        Skips whitespace and returns the next character, or '' at the end of the file.
+        """
+        while True:
+            self._advance(_WHITESPACE.match(self.buffer, self.pos).end())
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                return ""
+            self._fill()
+
+    def _expect_end(self) -> None:
+        """Makes sure nothing but whitespace follows the closing bracket."""
+        if self._next_char() != "":
+            self._fail("Unexpected data after the end of the task list")
+
+    def _advance(self, new_pos: int) -> None:
+        """Moves the current position forward and keeps the byte offset in sync."""
+        if new_pos > self.pos:
+            self.offset += len(self.buffer[self.pos : new_pos].encode("utf-8"))
+            self.pos = new_pos
+
+    def _fill(self, at_least: int = 0) -> None:
+        """
+        Drops the consumed text and appends the next chunk from the file, at least
+        at_least characters long.
+        """
+        chunk = self._read(max(self.chunk_size, at_least))
+        if not chunk:
+            self.eof = True
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+
+    def _fail(self, reason: str) -> None:
+        raise ValueError(
+            f"*** The data file is malformed. *** \n -   {reason} (byte offset "
+            f"{self.offset})."
+        )
+
+
+def _may_be_cut_off(error: json.JSONDecodeError, length: int) -> bool:
+    """
+    Whether a decode error may only come from the end of the buffered text, which holds
+    length characters. A string is unterminated when no closing quote was buffered yet
+    (a line break in it is an error of its own), other values are cut off near the end
+    of the buffer.
+    """
+    return (
+        error.msg.startswith("Unterminated string")
+        or length - error.pos <= _MAX_CUT_TOKEN
+    )
@@ -0,0 +1,401 @@
+import json
+import math
+from array import array
+from typing import Iterator
+
+from json_stream import RawJSON
+from storage import (
+    detect_schema,
+    iter_file_records,
+    record_reader,
+    record_writer,
+    write_records,
+)
+from task import (
+    Task,
+    completion_microseconds,
+    completion_seconds,
+    task_completion_seconds,
+    to_epoch_us,
+)
+
+
+class LazyStorage:
+    """
+    A storage that defers building tasks until they are needed. It has the same
+    interface as storage.Storage, so the TaskManager can use either of them.
+
+    Loading only indexes the data file: every record is kept as the exact text it was
+    read from, keyed by title, and a Task is built (and validated) the first time
+    get_task or an iteration reaches it. dump writes the records that were never saved
+    or updated back as that same text, so a command touching a single task does not pay
+    for building and serializing all the others.
+
+    Validation is deferred as well: only the title of a record is checked while loading,
+    a record with other issues raises ValueError when it is first materialized.
+
+    Tasks should only be changed through save_task and update_task, like with
+    storage.Storage.
+
+    Attributes:
+        - changed: bool
+            whether tasks were saved or updated since the storage was loaded or last
+            written
+        - schema_version: int
+            the schema version dump writes, the one of the file last loaded (see
+            storage.SCHEMA_VERSIONS)
+    """
+
+    def __init__(self):
+        """Initializes an empty storage."""
+        # Title -> the record text while the record is untouched, or the Task once it
+        # has been saved or updated
+        self._entries: dict[str, Task | RawJSON] = {}
+        # Tasks built from records that are still untouched
+        self._materialized: dict[str, Task] = {}
+        # Titles of the untouched records that are pending, so listing them does not
+        # build the rest
+        self._pending: set[str] = set()
+
+        # Completion time in seconds of the tasks that have been saved or updated.
+        # Untouched records are parsed again on the rare occasion their contribution has
+        # to be taken back.
+        self._completion_seconds: dict[str, float] = {}
+        self._completed_count = 0
+        self._total_completion_seconds = 0.0
+        self.changed = False
+        self.schema_version = 1
+        # The schema version of the record texts, untouched records are only written as
+        # they are in that version
+        self._records_version = 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def save_task(self, task: Task) -> bool:
+        """
+        Adds a new task to the storage
+
+        Parameters:
+            - task: Task
+                the task to be added
+
+        Returns:
+            - True: bool
+                if the save was successful
+            - False: bool
+                if there is an existing task with matching titles
+        """
+        if task.title in self._entries:
+            return False
+
+        self._entries[task.title] = task
+        self._count(
+            task.title, task_completion_seconds(task) if task.completed else None
+        )
+        self.changed = True
+        return True
+
+    def update_task(self, updated_task: Task) -> None:
+        """
+        Updates an existing task in the storage, or adds it if it does not exist.
+
+        Parameters:
+            - updated_task: Task
+                the task with the updated details
+
+        Returns:
+            - None
+        """
+        title = updated_task.title
+        if title in self._entries:
+            self._uncount(title)
+        self._entries[title] = updated_task
+        self._materialized.pop(title, None)
+        self._pending.discard(title)
+        self._count(
+            title,
+            task_completion_seconds(updated_task) if updated_task.completed else None,
+        )
+        self.changed = True
+
+    def get_task(self, title: str) -> Task | None:
+        """Fetches a task by its title, building it if it has not been built yet
+
+        Parameters:
+            - title: str
+                title of the task to be fetched
+
+        Returns:
+            - Task | None
+                Task object if found else None
+
+        Raises:
+            - ValueError
+                if the record of the task has logical issues
+        """
+        entry = self._entries.get(title)
+        if isinstance(entry, RawJSON):
+            return self._materialize(title, entry)
+        return entry
+
+    def get_all_tasks(self) -> list[Task]:
+        """Returns the list of all the tasks in the storage, building the ones that have
+        not been built yet.
+
+        Returns:
+            list[Tasks]
+        """
+        return [self.get_task(title) for title in self._entries]
+
+    def get_pending_tasks(self) -> list[Task]:
+        """Returns the list of the tasks that have not been completed yet, only those
+        get built.
+
+        Returns:
+            list[Tasks]
+        """
+        pending = []
+        for title, entry in self._entries.items():
+            if isinstance(entry, RawJSON):
+                if title in self._pending:
+                    pending.append(self._materialize(title, entry))
+            elif not entry.completed:
+                pending.append(entry)
+        return pending
+
+    def iter_tasks(
+        self, include_completed: bool = True, after: str | None = None
+    ) -> Iterator[Task]:
+        """Yields the tasks one at a time in insertion order, only the ones reached get
+        built.
+
+        Parameters:
+            - include_completed: bool
+                False yields the pending tasks only
+            - after: str | None
+                the title of a task to start after
+
+        Returns:
+            - Iterator[Task]
+
+        Raises:
+            - ValueError
+                if there is no task titled after
+        """
+        entries = iter(self._entries.items())
+        if after is not None:
+            if after not in self._entries:
+                raise ValueError(
+                    f"*** There is no task titled '{after}' to continue after. ***"
+                )
+            for title, _ in entries:
+                if title == after:
+                    break
+
+        for title, entry in entries:
+            if isinstance(entry, RawJSON):
+                if include_completed or title in self._pending:
+                    yield self._materialize(title, entry)
+            elif include_completed or not entry.completed:
+                yield entry
+
+    def get_report_stats(self) -> tuple[int, int, float | None]:
+        """Returns the aggregates the report is built from, they are counted while
+        indexing and kept up to date as tasks are saved and updated.
+
+        Returns:
+            - tuple[int, int, float | None]
+                the total number of tasks, the number of completed tasks and the average
+                completion time in seconds (None if no task has been completed)
+        """
+        completed = self._completed_count
+        average = self._total_completion_seconds / completed if completed else None
+        return len(self._entries), completed, average
+
+    def get_time_columns(self) -> tuple[array, array, bytes]:
+        """Builds the columns the detailed report is computed from, every task gets
+        built.
+
+        Returns:
+            - tuple[array, array, bytes]
+                created_at in microseconds since task.EPOCH (int64), completion times in
+                microseconds (int64, 0 while pending) and a bitmap of the completed
+                tasks
+        """
+        tasks = self.get_all_tasks()
+        created_at = array("q", [to_epoch_us(task.created_at) for task in tasks])
+        completion = array(
+            "q", [completion_microseconds(task.completion_time) for task in tasks]
+        )
+
+        completed = bytearray((len(tasks) + 7) // 8)
+        for row, task in enumerate(tasks):
+            if task.completed:
+                completed[row >> 3] |= 1 << (row & 7)
+        return created_at, completion, bytes(completed)
+
+    def check_report_stats(self) -> None:
+        """Builds every task, recomputes the aggregates of the report and compares them
+        with the running ones.
+
+        Raises:
+            - AssertionError
+                if the running aggregates have drifted from the tasks
+            - ValueError
+                if a record has logical issues
+        """
+        completed = [task for task in self.get_all_tasks() if task.completed]
+        total_completion_seconds = sum(
+            task_completion_seconds(task) for task in completed
+        )
+
+        matches = len(completed) == self._completed_count and math.isclose(
+            total_completion_seconds,
+            self._total_completion_seconds,
+            rel_tol=1e-9,
+            abs_tol=1e-6,
+        )
+        if not matches:
+            raise AssertionError(
+                f"*** The report aggregates are out of sync with the tasks. ***"
+                f"\n -   Maintained: {self._completed_count} completed, "
+                f"{self._total_completion_seconds} seconds"
+                f"\n -   Recomputed: {len(completed)} completed, "
+                f"{total_completion_seconds} seconds"
+            )
+
+    def load_tasks(self, f) -> None:
+        """
+        Indexes the tasks of a file by title, without building them.
+
+        Parameters:
+            - f: file object
+                the file to read tasks from in JSON format
+
+        Returns:
+            - None
+
+        Raises:
+            - ValueError
+                if the file is malformed or a record has no title, along with its byte
+                offset
+        """
+        self.schema_version = self._records_version = detect_schema(f)
+        for offset, record, text in iter_file_records(f, self.schema_version):
+            title = record.get("title") if isinstance(record, dict) else None
+            if not isinstance(title, str):
+                raise ValueError(
+                    "*** Every task in the data file has to be a JSON object with a "
+                    "title. ***"
+                    f"\n -   The first malformed task starts at byte offset {offset}."
+                )
+            if title in self._entries:
+                continue
+
+            self._entries[title] = text
+            if record.get("completed"):
+                self._count(
+                    title, self._record_completion_seconds(record), remember=False
+                )
+            else:
+                self._pending.add(title)
+
+    def dump(self, f, indent: int | None = 4) -> None:
+        """Dumps all the tasks into a JSON file, one task at a time. Untouched records
+        are written as they were read.
+
+        Parameters:
+            - f: file object
+                a file object to write the tasks in JSON format
+            - indent: int | None
+                the indentation of the JSON, None writes it without line breaks
+
+        Returns:
+            - None
+        """
+        to_record = record_writer(self.schema_version)
+        # The record texts are in the layout of the loaded file, an indented array
+        verbatim = self.schema_version == self._records_version and (
+            self.schema_version > 1 or indent == 4
+        )
+        records = (
+            (
+                entry
+                if verbatim and isinstance(entry, RawJSON)
+                else to_record(self.get_task(title))
+            )
+            for title, entry in self._entries.items()
+        )
+        write_records(records, f, self.schema_version, indent)
+
+    def _materialize(self, title: str, text: RawJSON) -> Task:
+        """Builds and validates the task of an untouched record, once."""
+        task = self._materialized.get(title)
+        if task is None:
+            try:
+                task = record_reader(self._records_version)(json.loads(text))
+            except ValueError as e:
+                raise ValueError(
+                    f"{e}\n -   The malformed task is '{title}'."
+                ) from None
+            self._materialized[title] = task
+        return task
+
+    def _count(self, title: str, seconds: float | None, remember: bool = True) -> None:
+        """
+        Adds a task's completion time to the running aggregates, seconds is None for a
+        pending task.
+        """
+        if seconds is None:
+            return
+        if remember:
+            self._completion_seconds[title] = seconds
+        self._completed_count += 1
+        self._total_completion_seconds += seconds
+
+    def _uncount(self, title: str) -> None:
+        """Removes what a task used to contribute to the running aggregates."""
+        entry = self._entries[title]
+        if isinstance(entry, RawJSON):
+            # The materialized task may have been changed in place already, the record
+            # text has not
+            record = json.loads(entry)
+            seconds = (
+                self._record_completion_seconds(record)
+                if record.get("completed")
+                else None
+            )
+        else:
+            seconds = self._completion_seconds.pop(title, None)
+
+        if seconds is not None:
+            self._completed_count -= 1
+            self._total_completion_seconds -= seconds
+            if not self._completed_count:
+                # Resetting once nothing is left keeps floating point drift from piling
+                # up
+                self._total_completion_seconds = 0.0
+
+    def _record_completion_seconds(self, record: dict) -> float:
+        """
+        The completion time of a completed record in seconds, 0 if it is missing (the
+        record fails validation later).
+        """
+        if self._records_version > 1:
+            completion = record.get("completion_us")
+            return completion / 1e6 if isinstance(completion, int) else 0.0
+        return _record_completion_seconds(record)
+
+
+def _record_completion_seconds(record: dict) -> float:
+    """
+    The completion time of a completed version 1 record in seconds, 0 if it is missing.
+    """
+    completion_time = record.get("completion_time")
+    if not isinstance(completion_time, str) or not completion_time:
+        return 0.0
+    try:
+        return completion_seconds(completion_time)
+    except ValueError:
+        return 0.0
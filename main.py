@@ -1,86 +1,560 @@
 import argparse
-from task_manager import TaskManager
-from storage import Storage
-from utils import create_data_file, update_data_file
+import json
+import os
+import sys
+import profiler
+from daemon_client import DaemonClient, default_socket_path
 
+# The application supports JSON files, compressed JSON files (.json.gz, .json.xz or
+# .json.bz2), binary snapshots (.snap), SQLite databases (.sqlite3 or .db) and
+# directories of shards (.shards) Changing the extension to anything else will safely
+# throw an error message TASKS_DATA_FILE can point the application to another data file
 
-# The application currently only supports JSON files
-# Changing the extension to anything else will safely throw an error message
+DATA_FILE = os.environ.get("TASKS_DATA_FILE", "./tasks.json")
 
-DATA_FILE = "./tasks.json"
+# Setting TASKS_JOURNAL=1 appends each change to tasks.json.journal instead of rewriting
+# tasks.json
+USE_JOURNAL = os.environ.get("TASKS_JOURNAL", "0") == "1"
 
+# Setting TASKS_COLUMNAR=1 keeps the tasks in memory as columns instead of one object
+# per task
+USE_COLUMNAR = os.environ.get("TASKS_COLUMNAR", "0") == "1"
 
-def main():
-    # Initialize a storage and access/create the JSON dataset that will persist
-    storage = Storage()
+# Setting TASKS_LAZY=1 only indexes tasks.json on load and builds the tasks a command
+# actually touches
+USE_LAZY = os.environ.get("TASKS_LAZY", "0") == "1"
 
-    try:
-        create_data_file(DATA_FILE, storage)
+# TASKS_CACHE=1 caches the validated tasks next to tasks.json (tasks.json.cache) so
+# commands can skip parsing it. The cache is a pickle, loading one runs code, so it is
+# off unless asked for
+USE_CACHE = os.environ.get("TASKS_CACHE", "0") == "1"
 
-        # Initialize the TaskManager with the storage
-        manager = TaskManager(storage)
+# Data files of 8 MiB and more are parsed by one worker process per CPU, TASKS_WORKERS=N
+# sets the number of processes and TASKS_WORKERS=1 keeps the load in this process
+WORKERS = int(os.environ["TASKS_WORKERS"]) if os.environ.get("TASKS_WORKERS") else None
+
+# TASKS_FSYNC picks how hard a write makes sure the data file reached the disk: none,
+# file (default) or full, see utils.update_data_file. The data file is only written when
+# a command changed something.
+FSYNC = os.environ.get("TASKS_FSYNC", "file")
+
+# Setting TASKS_COMPACT=1 writes JSON data files without indentation or line breaks,
+# smaller and faster to read and write
+COMPACT = os.environ.get("TASKS_COMPACT", "0") == "1"
+
+# TASKS_PROFILE=1 (or --profile) prints where the time of a command goes as a JSON line
+# on stderr, see profiler.py
+
+# When a daemon (python daemon.py) serves DATA_FILE, commands are sent to it and nothing
+# below is imported or loaded. The storages, the TaskManager and NumPy are only imported
+# when the command runs in this process.
+
+
+def build_storage():
+    """Picks the storage matching the data file and the environment."""
+    from utils import SHARDS_EXTENSION, SNAPSHOT_EXTENSION, SQLITE_EXTENSIONS
+
+    extension = DATA_FILE.split(".")[-1]
+    if extension == SHARDS_EXTENSION:
+        from sharded_storage import ShardedStorage
+
+        return ShardedStorage()
+    if extension in SQLITE_EXTENSIONS:
+        from sqlite_storage import SqliteStorage
+
+        return SqliteStorage()
+    if extension == SNAPSHOT_EXTENSION:
+        from snapshot import SnapshotStorage
+
+        return SnapshotStorage()
+    if USE_JOURNAL:
+        from journal_storage import JournalStorage
+
+        return JournalStorage(DATA_FILE)
+    if USE_COLUMNAR:
+        from task_table import TaskTable
+
+        return TaskTable()
+    if USE_LAZY:
+        from lazy_storage import LazyStorage
+
+        return LazyStorage()
+    from storage import Storage
+
+    return Storage()
 
-        parser = argparse.ArgumentParser(description="Task Management System")
-        subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
-        # Add task
-        add_parser = subparsers.add_parser("add", help="Add a new task")
-        add_parser.add_argument("title", help="Task title")
-        add_parser.add_argument("description", help="Task description")
+def build_parser() -> argparse.ArgumentParser:
+    # Without abbreviations, otherwise the top-level --profile flags take subcommand
+    # flags such as the --p of list for an ambiguous prefix of theirs
+    parser = argparse.ArgumentParser(
+        description="Task Management System", allow_abbrev=False
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=(
+            "Prints the wall/CPU time and allocations of every phase as a JSON line on "
+            "stderr"
+        ),
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Like --profile, and traces allocated bytes with tracemalloc (slower)",
+    )
+    parser.add_argument(
+        "--profile-dump",
+        metavar="FILE",
+        help=(
+            "Like --profile, and writes the cProfile stats of the slowest phase to "
+            "FILE (see pstats)"
+        ),
+    )
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
-        # Complete task
-        complete_parser = subparsers.add_parser(
-            "complete", help="Mark a task as completed"
+    # Add task
+    add_parser = subparsers.add_parser("add", help="Add a new task")
+    add_parser.add_argument("title", help="Task title")
+    add_parser.add_argument("description", help="Task description")
+
+    # Complete task
+    complete_parser = subparsers.add_parser("complete", help="Mark a task as completed")
+    complete_parser.add_argument("title", help="Task title")
+
+    # List tasks
+    list_parser = subparsers.add_parser("list", help="List incomplete tasks")
+    list_parser.add_argument(
+        "--p", action="store_false", help="Shows only pending tasks"
+    )
+    list_parser.add_argument(
+        "--limit", type=int, default=None, help="The maximum number of tasks to list"
+    )
+    list_parser.add_argument(
+        "--offset", type=int, default=0, help="The number of tasks to skip first"
+    )
+    list_parser.add_argument(
+        "--after",
+        default=None,
+        help=(
+            "Lists the tasks after this title, pass the last title of a page to get "
+            "the next one"
+        ),
+    )
+    list_parser.add_argument(
+        "--created-after",
+        metavar="DATE",
+        default=None,
+        help=(
+            "Lists the tasks created at or after this date or time (e.g. 2024-06-03 or "
+            "2024-06-03T09:30), by creation time"
+        ),
+    )
+    list_parser.add_argument(
+        "--created-before",
+        metavar="DATE",
+        default=None,
+        help="Lists the tasks created before this date or time",
+    )
+    list_parser.add_argument(
+        "--format",
+        choices=["text", "ndjson", "tsv"],
+        default="text",
+        help=(
+            "text lines, one JSON task per line, or tab separated columns with a header"
+        ),
+    )
+
+    # Generate report
+    report_parser = subparsers.add_parser("report", help="Generate a report")
+    report_parser.add_argument(
+        "--check",
+        action="store_true",
+        help=(
+            "Recomputes the report from every task and checks it against the stored "
+            "aggregates"
+        ),
+    )
+    report_parser.add_argument(
+        "--detailed",
+        action="store_true",
+        help=(
+            "Adds completion time percentiles, a histogram and throughput (needs NumPy)"
+        ),
+    )
+    report_parser.add_argument(
+        "--period",
+        choices=["day", "week"],
+        default="day",
+        help="The period the detailed report counts completed tasks by",
+    )
+    report_parser.add_argument(
+        "--bins",
+        type=int,
+        default=10,
+        help="The number of buckets of the detailed histogram",
+    )
+    report_parser.add_argument(
+        "--since",
+        metavar="DATE",
+        default=None,
+        help=(
+            "Only reports the tasks created at or after this date or time (e.g. "
+            "2024-06-03 or 2024-06-03T09:30)"
+        ),
+    )
+    report_parser.add_argument(
+        "--until",
+        metavar="DATE",
+        default=None,
+        help="Only reports the tasks created before this date or time",
+    )
+
+    # Search tasks
+    search_parser = subparsers.add_parser(
+        "search", help='Search titles and descriptions: words, prefix* and "phrases"'
+    )
+    search_parser.add_argument("query", help="Every part of the query has to match")
+    search_parser.add_argument(
+        "--limit",
+        type=int,
+        default=10,
+        help="The maximum number of results, best first",
+    )
+
+    # Change the number of shards of a sharded data file
+    reshard_parser = subparsers.add_parser(
+        "reshard",
+        help=(
+            "Redistribute the tasks of a .shards data file into another number of "
+            "shards"
+        ),
+    )
+    reshard_parser.add_argument("shards", type=int, help="The new number of shards")
+
+    # Rewrite a JSON data file in another schema version
+    migrate_parser = subparsers.add_parser(
+        "migrate", help="Rewrite the JSON data file in another schema version, in place"
+    )
+    migrate_parser.add_argument(
+        "--to",
+        type=int,
+        choices=[1, 2],
+        default=2,
+        help="The schema version to write (see storage.SCHEMA_VERSIONS)",
+    )
+
+    # Apply many operations with a single load and a single write
+    batch_parser = subparsers.add_parser(
+        "batch", help="Apply JSONL operations from a file, or from stdin with '-'"
+    )
+    batch_parser.add_argument(
+        "source", help="JSONL file with one operation per line, or '-'"
+    )
+
+    return parser
+
+
+def to_operation(args: argparse.Namespace) -> dict:
+    """Turns the parsed command line into an operation, see batch.apply_operation."""
+    if args.command == "add":
+        return {"op": "add", "title": args.title, "description": args.description}
+    if args.command == "complete":
+        return {"op": "complete", "title": args.title}
+    if args.command == "list":
+        return {
+            "op": "list",
+            "all": args.p,
+            "limit": args.limit,
+            "offset": args.offset,
+            "after": args.after,
+            "records": args.format != "text",
+            "created_after": args.created_after,
+            "created_before": args.created_before,
+        }
+    if args.command == "search":
+        return {"op": "search", "query": args.query, "limit": args.limit}
+    if args.command == "reshard":
+        return {"op": "reshard", "shards": args.shards}
+    return {
+        "op": "report",
+        "check": args.check,
+        "detailed": args.detailed,
+        "period": args.period,
+        "bins": args.bins,
+        "since": args.since,
+        "until": args.until,
+    }
+
+
+def print_result(args: argparse.Namespace, result: dict) -> None:
+    """Prints the outcome of a command, whether it ran here or in the daemon."""
+    if result["status"] == "error":
+        print(result["error"])
+    elif args.command == "add":
+        conflict_msg = (
+            "This title already exists for a task. Please select another title with "
+            f"the description: '{args.description}'"
         )
-        complete_parser.add_argument("title", help="Task title")
+        if not result["ok"]:
+            print(conflict_msg)
+        else:
+            print(f"Task: '{args.title}' added successfully.")
+    elif args.command == "complete":
+        if result["status"] == "completed":
+            print(f"Task '{args.title}' marked as completed.")
+        elif result["status"] == "not_found":
+            print(f"Task '{args.title}' not found.")
+        else:
+            print(f"Task '{args.title}' has already been marked as completed before.")
+    elif args.command == "list":
+        print_tasks(args, result["tasks"])
+    elif args.command == "search":
+        if result["tasks"]:
+            for task in result["tasks"]:
+                status = "Completed" if task["completed"] else "Pending"
+                print(f"{task['title']} - {status}")
+        else:
+            print(f"No tasks match '{args.query}'.")
+    elif args.command == "reshard":
+        print(f"The tasks are now split into {result['shards']} shards.")
+    elif args.command == "report":
+        if args.detailed:
+            print(json.dumps(result["report"], indent=4))
+        else:
+            print(result["report"])
+
 
-        # List tasks
-        list_parser = subparsers.add_parser("list", help="List incomplete tasks")
-        list_parser.add_argument(
-            "--p", action="store_false", help="Shows only pending tasks"
+def print_tasks(args: argparse.Namespace, records) -> None:
+    """Writes a listing as its records come, in chunks, see batch.write_tasks."""
+    from batch import write_tasks
+
+    count = write_tasks(records, args.format, sys.stdout)
+    if not count and args.format == "text":
+        pending_string_modifier = "pending" if not args.p else ""
+        print(f"No {pending_string_modifier} tasks found.")
+
+
+def run_list_command(args: argparse.Namespace) -> None:
+    """
+    Lists tasks straight from the storage: the tasks of the page are formatted and
+    written as the storage yields them, nothing is collected in between, and the data
+    file is never written back.
+    """
+    with profiler.phase("import"):
+        from storage import task_to_record
+        from task import parse_timestamp
+        from task_manager import TaskManager
+        from utils import create_data_file
+
+        storage = build_storage()
+    profiler.instrument()
+
+    created_after, created_before = parse_timestamp(
+        args.created_after
+    ), parse_timestamp(args.created_before)
+    with profiler.phase("load"):
+        create_data_file(DATA_FILE, storage, cache=USE_CACHE, workers=WORKERS)
+
+    with profiler.phase("command"):
+        tasks = TaskManager(storage).iter_tasks(
+            include_completed=args.p,
+            limit=args.limit,
+            offset=args.offset,
+            after=args.after,
+            created_after=created_after,
+            created_before=created_before,
         )
+        if args.format == "text":
+            records = (
+                {"title": task.title, "completed": task.completed} for task in tasks
+            )
+        else:
+            records = (task_to_record(task) for task in tasks)
+        print_tasks(args, records)
 
-        # Generate report
-        subparsers.add_parser("report", help="Generate a report")
 
-        args = parser.parse_args()
+def run_migrate_command(args: argparse.Namespace, client: DaemonClient | None) -> None:
+    """
+    Migrates the data file in this process, the daemon would keep writing the version it
+    loaded.
+    """
+    if client is not None:
+        raise ValueError(
+            "*** Stop the daemon serving the data file before migrating it. ***"
+        )
+    with profiler.phase("import"):
+        from utils import migrate_data_file
+    profiler.instrument()
 
-        if args.command == "add":
-            successful = manager.add_task(args.title, args.description)
-            conflict_msg = f"This title already exists for a task. Please select another title with the description: '{args.description}'"
-            if not successful:
-                print(conflict_msg)
-            else:
-                print(f"Task: '{args.title}' added successfully.")
-        elif args.command == "complete":
-            response = manager.complete_task(args.title)
-            if response == (True, 1):
-                print(f"Task '{args.title}' marked as completed.")
-            elif response == (False, -1):
-                print(f"Task '{args.title}' not found.")
-            else:
-                print(
-                    f"Task '{args.title}' has already been marked as completed before."
-                )
-        elif args.command == "list":
-            tasks = manager.list_tasks(include_completed=args.p)
-            checking_pending = args.p
-            pending_string_modifier = "pending" if not checking_pending else ""
-            if tasks:
-                for task in tasks:
-                    status = "Completed" if task.completed else "Pending"
-                    print(f"{task.title} - {status}")
-            else:
-                print(f"No {pending_string_modifier} tasks found.")
-        elif args.command == "report":
-            print(manager.generate_report())
+    with profiler.phase("command"):
+        migrated = migrate_data_file(DATA_FILE, args.to, fsync=FSYNC)
+    with profiler.phase("output"):
+        if migrated is not None:
+            print(f"Migrated {migrated} tasks to schema version {args.to}.")
+        else:
+            print(f"The data file already has schema version {args.to}.")
+
+
+def run_batch_command(args: argparse.Namespace, client: DaemonClient | None) -> None:
+    """
+    Runs the batch command in the daemon, or in this process with a single load and a
+    single write.
+    """
+    from batch import run_batch, write_results
+
+    source = sys.stdin if args.source == "-" else open(args.source, "r")  # noqa: SIM115
+    try:
+        if client is not None:
+            results = (
+                {"line": line_number, **client.request_line(line)}
+                for line_number, line in enumerate(source, start=1)
+                if line.strip()
+            )
+            with profiler.phase("command"):
+                count, seconds = write_results(results, sys.stdout)
         else:
-            parser.print_help()
+            with profiler.phase("import"):
+                from task_manager import TaskManager
+                from utils import create_data_file, update_data_file
+
+                storage = build_storage()
+            profiler.instrument()
 
-        update_data_file(DATA_FILE, storage)
+            with profiler.phase("load"):
+                create_data_file(DATA_FILE, storage, cache=USE_CACHE, workers=WORKERS)
+            try:
+                with profiler.phase("command"):
+                    count, seconds = write_results(
+                        run_batch(TaskManager(storage), source), sys.stdout
+                    )
+            finally:
+                # Written even when an unexpected error stops the batch, the operations
+                # reported before it stay done
+                with profiler.phase("write"):
+                    update_data_file(
+                        DATA_FILE,
+                        storage,
+                        cache=USE_CACHE,
+                        fsync=FSYNC,
+                        compact=COMPACT,
+                    )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    rate = count / seconds if seconds else float("inf")
+    print(
+        f"Applied {count} operations in {seconds:.3f} s ({rate:.0f} ops/s).",
+        file=sys.stderr,
+    )
 
-    except ValueError as e:
+
+def run_operation(op: dict) -> dict:
+    """
+    Loads the data file, applies a single operation and writes the data file back if it
+    can have changed.
+    """
+    with profiler.phase("import"):
+        from batch import MUTATIONS, apply_operation
+        from search_index import index_file, load_search_index, save_search_index
+        from task_manager import TaskManager
+        from utils import create_data_file, is_json_file, update_data_file
+
+        # Initialize a storage
+        storage = build_storage()
+    profiler.instrument()
+
+    # Access/create the dataset that will persist
+    with profiler.phase("load"):
+        create_data_file(DATA_FILE, storage, cache=USE_CACHE, workers=WORKERS)
+
+    # With TASKS_CACHE=1 a search persists its index next to a JSON data file, a pickle
+    # like the parse cache. A change makes the index stale, it is removed rather than
+    # loaded and saved again, and the next search rebuilds it.
+    index_loaded = False
+    persist_index = (
+        USE_CACHE
+        and op["op"] == "search"
+        and hasattr(storage, "attach_search_index")
+        and is_json_file(DATA_FILE)
+        and not USE_JOURNAL
+    )
+    if persist_index:
+        with profiler.phase("load_index"):
+            index = load_search_index(DATA_FILE)
+            index_loaded = index is not None
+            storage.attach_search_index(index)
+
+    # Initialize the TaskManager with the storage
+    with profiler.phase("command"):
+        manager = TaskManager(storage)
+        result = apply_operation(manager, op)
+
+    with profiler.phase("write"):
+        if op["op"] in MUTATIONS:
+            update_data_file(
+                DATA_FILE, storage, cache=USE_CACHE, fsync=FSYNC, compact=COMPACT
+            )
+            if os.path.exists(index_file(DATA_FILE)):
+                os.remove(index_file(DATA_FILE))
+        if persist_index and not index_loaded:
+            save_search_index(DATA_FILE, storage.search_index)
+    return result
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return
+
+    profile, profile_memory, profile_dump = profiler.settings_from_env()
+    profile_memory = profile_memory or args.profile_memory
+    profile_dump = args.profile_dump or profile_dump
+    if profile or args.profile or profile_memory or profile_dump:
+        profiler.start(memory=profile_memory, dump_file=profile_dump)
+
+    client = None
+    try:
+        # Use the daemon serving the data file if there is one, otherwise access the
+        # file directly
+        with profiler.phase("connect"):
+            client = DaemonClient.connect(default_socket_path(DATA_FILE))
+        try:
+            if args.command == "batch":
+                run_batch_command(args, client)
+            elif args.command == "migrate":
+                run_migrate_command(args, client)
+            elif client is not None and args.command == "list":
+                # The records are written as the pages of the listing arrive
+                with profiler.phase("output"):
+                    print_tasks(args, client.iter_tasks(to_operation(args)))
+            elif client is not None:
+                with profiler.phase("command"):
+                    result = client.request(to_operation(args))
+                with profiler.phase("output"):
+                    print_result(args, result)
+            elif args.command == "list":
+                run_list_command(args)
+            else:
+                result = run_operation(to_operation(args))
+                with profiler.phase("output"):
+                    print_result(args, result)
+        finally:
+            if client is not None:
+                client.close()
+
+    except (ValueError, AssertionError) as e:
         print(e)
+    except BrokenPipeError:
+        # The reader went away (e.g. list | head), stdout is pointed at devnull so the
+        # exit flush stays quiet
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        profiler.finish(
+            command=args.command, data_file=DATA_FILE, daemon=client is not None
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+import json
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from storage import record_to_task
+from task import Task
+
+# Below this many bytes, starting worker processes costs more than parsing the file here
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+# Chunks per worker, a few more than one so a slow chunk does not leave the other
+# workers idle
+CHUNKS_PER_WORKER = 4
+
+# JSON strings can not hold a raw newline, so a newline is always outside of a string,
+# and one followed by an opening brace starts an element of the top-level array (tasks
+# hold no nested objects)
+_RECORD_START = re.compile(rb"\n[ \t\r]*\{")
+
+
+def split_records(data_file: str, chunks: int) -> list[tuple[int, int]]:
+    """
+    Splits a JSON data file into byte ranges that each hold whole records, by moving
+    evenly spaced cut points forward to the next line that starts a record. The first
+    range starts at the opening bracket and the last one ends at the closing bracket.
+
+    Parameters:
+        - data_file: str
+            file path
+        - chunks: int
+            the number of ranges wanted, there are fewer when the file has fewer lines
+            starting a record
+
+    Returns:
+        - list[tuple[int, int]]
+            the (start, end) byte offsets of the ranges, in order
+    """
+    size = os.path.getsize(data_file)
+    if size == 0:
+        return []
+    cuts = [0]
+    with open(data_file, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        for i in range(1, chunks):
+            target = max(size * i // chunks, cuts[-1] + 1)
+            match = _RECORD_START.search(data, target)
+            if match is None:
+                break
+            cut = match.end() - 1
+            if cut > cuts[-1]:
+                cuts.append(cut)
+    cuts.append(size)
+    return list(zip(cuts, cuts[1:], strict=False))
+
+
+def parse_chunk(data_file: str, start: int, end: int) -> list[tuple]:
+    """
+    Parses and validates the records of a byte range of a data file. It runs in worker
+    processes, so it returns plain tuples, which are much cheaper to send back than Task
+    objects.
+
+    Parameters:
+        - data_file: str
+            file path
+        - start: int
+            the offset of the range, the opening bracket of the array or the opening
+            brace of a record
+        - end: int
+            the end of the range, the start of the next one or the end of the file
+
+    Returns:
+        - list[tuple]
+            the arguments of Task for every record of the range, in order
+
+    Raises:
+        - ValueError
+            if the range is not a sequence of records, or a record has logical issues
+    """
+    with open(data_file, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8").strip()
+
+    if start == 0:
+        if not text.startswith("["):
+            raise ValueError("*** The data file is not a JSON array. ***")
+        text = text[1:]
+    if end == os.path.getsize(data_file):
+        text = text.rstrip()
+        if not text.endswith("]"):
+            raise ValueError("*** The data file is not a JSON array. ***")
+        text = text[:-1]
+    text = text.strip().rstrip(",")
+
+    rows = []
+    for record in json.loads("[" + text + "]"):
+        task = record_to_task(record)
+        rows.append(
+            (
+                task.title,
+                task.description,
+                task.completed,
+                task.created_at,
+                str(task.completion_time) if task.completion_time else None,
+            )
+        )
+    return rows
+
+
+def load_tasks_parallel(store, data_file: str, workers: int | None = None) -> None:
+    """
+    Loads a JSON data file into a storage by parsing and validating record-aligned
+    chunks of it in worker processes. The tasks are saved in file order, so the storage
+    ends up exactly as with store.load_tasks: same order, and the first of two tasks
+    with the same title wins.
+
+    When anything goes wrong in a worker, the file is loaded with store.load_tasks
+    instead, so the error raised is the one a sequential load raises, with the byte
+    offset of the first malformed record, whichever worker ran into a problem first.
+
+    Parameters:
+        - store: Storage | TaskTable
+            an empty storage, loading does not mark it changed
+        - data_file: str
+            file path
+        - workers: int | None
+            the number of worker processes, one per CPU when None
+
+    Returns:
+        - None
+
+    Raises:
+        - ValueError
+            if the file is malformed or a task has logical issues
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = split_records(data_file, workers * CHUNKS_PER_WORKER)
+    if not ranges:
+        return
+
+    starts, ends = zip(*ranges, strict=True)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = list(
+                pool.map(parse_chunk, [data_file] * len(ranges), starts, ends)
+            )
+    except Exception:
+        # The sequential load raises the error it would have raised anyway, or loads the
+        # file if only the split was at fault (e.g. a hand formatted file) or the
+        # workers could not run
+        with open(data_file, "r") as f:
+            store.load_tasks(f)
+        return
+
+    changed = store.changed
+    for rows in chunks:
+        for row in rows:
+            store.save_task(Task(*row))
+    store.changed = changed
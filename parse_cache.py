@@ -0,0 +1,147 @@
+import hashlib
+import os
+import pickle
+
+from task import Task
+
+# Bumped whenever the layout of the cached state changes, older caches are then ignored
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".cache"
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def cache_file(data_file: str) -> str:
+    """The sidecar cache of a data file."""
+    return data_file + CACHE_SUFFIX
+
+
+def fingerprint(data_file: str) -> tuple[str, int, int, str]:
+    """
+    Identifies the current content of a data file. The path, size and modification time
+    are cheap to compare, the content hash catches edits that keep the size and the
+    modification time.
+
+    Parameters:
+        - data_file: str
+            file path
+
+    Returns:
+        - tuple[str, int, int, str]
+            the absolute path, the size in bytes, the modification time in nanoseconds
+            and the BLAKE2b hash
+    """
+    return *_file_stat(data_file), _content_hash(data_file)
+
+
+def fingerprint_matches(data_file: str, saved: tuple) -> bool:
+    """
+    Whether a data file still has a fingerprint saved earlier. The file is only hashed
+    once its size and modification time match, any other edit is ruled out by a stat.
+
+    Parameters:
+        - data_file: str
+            file path
+        - saved: tuple
+            the fingerprint saved along with a cache or an index
+
+    Returns:
+        - bool
+            True if the data file has not changed since
+    """
+    if tuple(saved[:3]) != _file_stat(data_file):
+        return False
+    return saved[3] == _content_hash(data_file)
+
+
+def _file_stat(data_file: str) -> tuple[str, int, int]:
+    """
+    The absolute path, the size and the modification time of a data file, without
+    reading it.
+    """
+    stat = os.stat(data_file)
+    return os.path.abspath(data_file), stat.st_size, stat.st_mtime_ns
+
+
+def _content_hash(data_file: str) -> str:
+    """
+    The BLAKE2b hash of a data file, the one part of the fingerprint that reads the
+    whole file.
+    """
+    digest = hashlib.blake2b()
+    with open(data_file, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_cached_tasks(data_file: str) -> list[Task] | None:
+    """
+    Loads the tasks of a data file from its cache, without parsing or validating the
+    JSON again.
+
+    Parameters:
+        - data_file: str
+            file path
+
+    Returns:
+        - list[Task] | None
+            the tasks, None if there is no cache or it does not match the data file
+            anymore
+    """
+    try:
+        with open(cache_file(data_file), "rb") as f:
+            version, cached_fingerprint, rows = pickle.load(f)
+    except (
+        OSError,
+        pickle.UnpicklingError,
+        EOFError,
+        ValueError,
+        TypeError,
+        AttributeError,
+    ):
+        return None
+
+    if version != CACHE_VERSION or not fingerprint_matches(
+        data_file, cached_fingerprint
+    ):
+        return None
+    return [Task(*row) for row in rows]
+
+
+def save_cached_tasks(data_file: str, tasks: list[Task]) -> None:
+    """
+    Stores the validated tasks of a data file in its cache, along with the fingerprint
+    of the file as it is now. The cache is written to a temporary file first, so a
+    reader never sees half of it.
+
+    Parameters:
+        - data_file: str
+            file path, it has to hold exactly these tasks
+        - tasks: list[Task]
+            the tasks
+
+    Returns:
+        - None
+    """
+    # Completion times are stored the way the data file holds them, a freshly completed
+    # task still has a timedelta
+    rows = [
+        (
+            task.title,
+            task.description,
+            task.completed,
+            task.created_at,
+            str(task.completion_time) if task.completion_time else None,
+        )
+        for task in tasks
+    ]
+    path = cache_file(data_file)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        pickle.dump(
+            (CACHE_VERSION, fingerprint(data_file), rows),
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(temporary_path, path)
@@ -0,0 +1,264 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+# TASKS_PROFILE=1 profiles every command like --profile, TASKS_PROFILE=memory like
+# --profile-memory. TASKS_PROFILE_DUMP=<file> writes the cProfile stats of the slowest
+# phase, like --profile-dump.
+PROFILE_ENV = "TASKS_PROFILE"
+PROFILE_DUMP_ENV = "TASKS_PROFILE_DUMP"
+
+# The modules whose record conversions are counted and timed, see Profiler.instrument
+INSTRUMENTED_MODULES = (
+    "storage",
+    "journal_storage",
+    "lazy_storage",
+    "snapshot",
+    "sqlite_storage",
+    "task_table",
+)
+# The functions parsing records into validated tasks and back, with the field of the
+# phase their time goes to
+INSTRUMENTED_FUNCTIONS = (
+    ("record_to_task", "validate_s"),
+    ("record_to_task_v2", "validate_s"),
+    ("task_to_record", "serialize_s"),
+    ("task_to_record_v2", "serialize_s"),
+)
+
+_NULL_PHASE = nullcontext()
+_active: "Profiler | None" = None
+
+
+class Profiler:
+    """
+    Records where the time of a command goes, phase by phase: wall and CPU time, the
+    change in the number of allocated blocks, and, in memory mode, the net and peak
+    bytes allocated through tracemalloc (which slows everything down, so the times are
+    not comparable with the time mode).
+
+    While instrumented, the calls to record_to_task (parsing a record into a validated
+    task) and task_to_record (formatting a task for the data file) are counted and
+    timed, so a phase reports how many records it went through, its cost per record and
+    how much of it was validation or serialization.
+
+    Attributes:
+        - memory: bool
+            whether allocations are traced with tracemalloc
+        - dump_file: str | None
+            where the cProfile stats of the slowest phase are written, None to skip
+            cProfile
+        - phases: list[dict]
+            the phases recorded so far, in the order they ended
+    """
+
+    def __init__(self, memory: bool = False, dump_file: str | None = None):
+        self.memory = memory
+        self.dump_file = dump_file
+        self.phases: list[dict] = []
+        self._stack: list[dict] = []
+        self._cprofiles: dict[str, object] = {}
+        self._patched: list[tuple[object, str, object]] = []
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        if memory:
+            import tracemalloc
+
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Records a phase, phases can be nested and records are counted in the innermost
+        one.
+        """
+        stats = {"name": name, "records": 0, "validate_s": 0.0, "serialize_s": 0.0}
+        self._stack.append(stats)
+        cprofile = None
+        if self.dump_file is not None:
+            import cProfile
+
+            cprofile = self._cprofiles.setdefault(name, cProfile.Profile())
+        if self.memory:
+            import tracemalloc
+
+            tracemalloc.reset_peak()
+            memory_start = tracemalloc.get_traced_memory()[0]
+        blocks_start = sys.getallocatedblocks()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if cprofile is not None:
+            cprofile.enable()
+        try:
+            yield stats
+        finally:
+            if cprofile is not None:
+                cprofile.disable()
+            stats["wall_s"] = time.perf_counter() - wall_start
+            stats["cpu_s"] = time.process_time() - cpu_start
+            stats["allocated_blocks"] = sys.getallocatedblocks() - blocks_start
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                stats["allocated_bytes"] = current - memory_start
+                stats["peak_bytes"] = peak - memory_start
+            if stats["records"]:
+                stats["per_record_us"] = stats["wall_s"] / stats["records"] * 1e6
+            self._stack.pop()
+            self.phases.append(stats)
+
+    def instrument(self) -> None:
+        """
+        Counts and times record_to_task and task_to_record in the storage modules that
+        are loaded.
+        """
+        for module_name in INSTRUMENTED_MODULES:
+            module = sys.modules.get(module_name)
+            for function_name, field in INSTRUMENTED_FUNCTIONS:
+                function = getattr(module, function_name, None)
+                if (
+                    function is None
+                    or getattr(function, "__wrapped__", None) is not None
+                ):
+                    continue
+                setattr(module, function_name, self._timed(function, field))
+                self._patched.append((module, function_name, function))
+
+    def uninstrument(self) -> None:
+        """Puts back the functions instrument replaced."""
+        for module, function_name, function in reversed(self._patched):
+            setattr(module, function_name, function)
+        self._patched.clear()
+
+    def _timed(self, function, field: str):
+        stack = self._stack
+
+        def timed(*args):
+            start = time.perf_counter()
+            result = function(*args)
+            if stack:
+                stats = stack[-1]
+                stats[field] += time.perf_counter() - start
+                stats["records"] += 1
+            return result
+
+        timed.__wrapped__ = function
+        return timed
+
+    def report(self, **context) -> dict:
+        """
+        Builds the profile of the command.
+
+        Parameters:
+            - **context
+                fields describing the command, added to the profile as they are
+
+        Returns:
+            - dict
+                the profile, with the total times since the profiler was created and the
+                recorded phases
+        """
+        hot_phase = (
+            max(self.phases, key=lambda stats: stats["wall_s"])["name"]
+            if self.phases
+            else None
+        )
+        return {
+            "event": "profile",
+            **context,
+            "mode": "memory" if self.memory else "time",
+            # CPU time since the process started, which includes the interpreter start
+            # and the imports
+            "process_cpu_s": time.process_time(),
+            "wall_s": time.perf_counter() - self._start_wall,
+            "cpu_s": time.process_time() - self._start_cpu,
+            "phases": self.phases,
+            "hot_phase": hot_phase,
+            "cprofile": (
+                self.dump_file
+                if self.dump_file is not None and hot_phase is not None
+                else None
+            ),
+        }
+
+    def finish(self, out=None, **context) -> dict:
+        """
+        Stops profiling, writes the cProfile stats of the slowest phase and emits the
+        profile as a single JSON line.
+
+        Parameters:
+            - out: file object | None
+                where the JSON line is written, stderr when None
+            - **context
+                fields describing the command, see report
+
+        Returns:
+            - dict
+                the profile that was emitted
+        """
+        self.uninstrument()
+        profile = self.report(**context)
+        if profile["cprofile"] is not None:
+            self._cprofiles[profile["hot_phase"]].dump_stats(self.dump_file)
+        if self.memory:
+            import tracemalloc
+
+            tracemalloc.stop()
+        out = sys.stderr if out is None else out
+        out.write(json.dumps(profile) + "\n")
+        out.flush()
+        return profile
+
+
+def start(memory: bool = False, dump_file: str | None = None) -> Profiler:
+    """
+    Starts profiling, phase then records into the returned profiler until finish is
+    called.
+    """
+    global _active
+    _active = Profiler(memory, dump_file)
+    return _active
+
+
+def finish(out=None, **context) -> dict | None:
+    """
+    Stops profiling and emits the profile, see Profiler.finish. Nothing happens when
+    profiling is off.
+    """
+    global _active
+    profiler, _active = _active, None
+    if profiler is None:
+        return None
+    return profiler.finish(out, **context)
+
+
+def phase(name: str):
+    """
+    A context manager recording a phase of the command while profiling. When profiling
+    is off it is a shared no-op context, so leaving the phases in the code costs a
+    function call each.
+    """
+    if _active is None:
+        return _NULL_PHASE
+    return _active.phase(name)
+
+
+def instrument() -> None:
+    """
+    Instruments the storage modules loaded so far, see Profiler.instrument. Nothing
+    happens when profiling is off.
+    """
+    if _active is not None:
+        _active.instrument()
+
+
+def settings_from_env() -> tuple[bool, bool, str | None]:
+    """
+    Reads whether to profile, whether to trace memory and the cProfile dump file from
+    the environment.
+    """
+    value = os.environ.get(PROFILE_ENV, "0").lower()
+    dump_file = os.environ.get(PROFILE_DUMP_ENV) or None
+    enabled = value not in ("", "0", "false", "no") or dump_file is not None
+    return enabled, value == "memory", dump_file
@@ -0,0 +1,382 @@
+import heapq
+import math
+import os
+import pickle
+import re
+from array import array
+from bisect import bisect_left
+
+from parse_cache import fingerprint, fingerprint_matches
+from task import Task
+
+# Bumped whenever the layout of the persisted index changes, older files are then
+# rebuilt
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".search"
+
+# A token found in the title counts this many times more than one found in the
+# description
+TITLE_WEIGHT = 3
+
+_TOKEN = re.compile(r"\w+")
+_QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(text: str) -> list[str]:
+    """Splits text into lowercase word tokens."""
+    return _TOKEN.findall(text.lower())
+
+
+class SearchIndex:
+    """
+    An inverted index over the titles and descriptions of tasks.
+
+    Every task gets a document id, and every token points to the ids of the tasks
+    containing it, with separate postings for titles and descriptions. Postings are
+    arrays of ids, which are compact and pickle as a single block of memory. Taking a
+    task out only marks its id as removed, the stale ids are skipped by queries and
+    dropped when the index is pickled.
+
+    Queries are made of space separated parts, every one of them has to match:
+        - token: a whole word, e.g. report
+        - prefix: the start of a word, e.g. rep*
+        - phrase: consecutive words in the same field, e.g. "weekly report"
+    Matches are ranked by the rarity of the matched tokens, a match in the title counts
+    TITLE_WEIGHT times more than one in the description. Phrases are checked against the
+    text of the few tasks containing all of their words, which is why search needs a way
+    to fetch tasks by title.
+    """
+
+    def __init__(self):
+        # Document id -> title, None once the task has been taken out
+        self._titles: list[str | None] = []
+        self._ids: dict[str, int] = {}
+        self._title_postings: dict[str, array] = {}
+        self._description_postings: dict[str, array] = {}
+        # Sorted vocabulary for prefix queries, rebuilt on the first prefix query after
+        # a new token shows up
+        self._vocabulary: list[str] | None = None
+
+    @classmethod
+    def build(cls, tasks) -> "SearchIndex":
+        """Indexes every task of an iterable."""
+        index = cls()
+        for task in tasks:
+            index.add(task)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getstate__(self) -> tuple:
+        """
+        Drops the ids of removed tasks and packs every postings dictionary into its
+        tokens, one array of offsets and one array holding all the ids, so unpickling
+        does not have to rebuild an array per token.
+        """
+        titles = self._titles
+        renumbered = None
+        if len(self._ids) != len(titles):
+            renumbered = {}
+            titles = []
+            for old_id, title in enumerate(self._titles):
+                if title is not None:
+                    renumbered[old_id] = len(titles)
+                    titles.append(title)
+
+        return (
+            titles,
+            _pack(self._title_postings, renumbered),
+            _pack(self._description_postings, renumbered),
+        )
+
+    def __setstate__(self, state: tuple) -> None:
+        titles, title_postings, description_postings = state
+        self._titles = titles
+        self._ids = {title: i for i, title in enumerate(titles)}
+        self._title_postings = _unpack(title_postings)
+        self._description_postings = _unpack(description_postings)
+        self._vocabulary = None
+
+    def add(self, task: Task) -> None:
+        """Indexes a task, replacing what was indexed under its title before."""
+        self.remove(task.title)
+
+        document_id = len(self._titles)
+        self._titles.append(task.title)
+        self._ids[task.title] = document_id
+        for postings, text in (
+            (self._title_postings, task.title),
+            (self._description_postings, task.description),
+        ):
+            for token in set(tokenize(text)):
+                ids = postings.get(token)
+                if ids is None:
+                    postings[token] = ids = array("I")
+                    self._vocabulary = None
+                ids.append(document_id)
+
+    def remove(self, title: str) -> None:
+        """Takes a task out of the index, nothing happens if it is not indexed."""
+        document_id = self._ids.pop(title, None)
+        if document_id is not None:
+            self._titles[document_id] = None
+
+    def search(self, query: str, get_task, limit: int = 10) -> list[tuple[str, float]]:
+        """
+        Finds the tasks matching every part of a query.
+
+        Parameters:
+            - query: str
+                tokens, prefixes ending with * and "quoted phrases"
+            - get_task: Callable[[str], Task]
+                fetches a task by title, only used to check phrases
+            - limit: int
+                the maximum number of results
+
+        Returns:
+            - list[tuple[str, float]]
+                the titles of the best matches with their scores, best first (ties by
+                title)
+
+        Raises:
+            - ValueError
+                if the query has no word in it
+        """
+        terms = self._parse(query)
+        if not terms:
+            raise ValueError("*** The search query needs at least one word. ***")
+
+        # Every term scores the documents it matches, the rarest term goes first so the
+        # others only have to look at the documents that are still in the running
+        scores = None
+        for term in sorted(terms, key=self._estimated_matches):
+            term_scores = self._score(term, scores)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    i: score + term_scores[i]
+                    for i, score in scores.items()
+                    if i in term_scores
+                }
+            if not scores:
+                return []
+
+        for kind, value in terms:
+            if kind == "phrase":
+                scores = {
+                    i: score
+                    for i, score in scores.items()
+                    if _has_phrase(get_task(self._titles[i]), value)
+                }
+
+        results = ((self._titles[i], score) for i, score in scores.items())
+        return heapq.nsmallest(
+            limit, results, key=lambda result: (-result[1], result[0])
+        )
+
+    def _parse(self, query: str) -> list[tuple[str, object]]:
+        """
+        Turns a query into (kind, value) terms, kind is "token", "prefix" or "phrase".
+        """
+        terms = []
+        for phrase, word in _QUERY_PART.findall(query):
+            if phrase:
+                tokens = tokenize(phrase)
+                if len(tokens) > 1:
+                    terms.append(("phrase", tuple(tokens)))
+                elif tokens:
+                    terms.append(("token", tokens[0]))
+                continue
+
+            tokens = tokenize(word)
+            if word.endswith("*") and tokens:
+                terms.extend(("token", token) for token in tokens[:-1])
+                terms.append(("prefix", tokens[-1]))
+            else:
+                terms.extend(("token", token) for token in tokens)
+        return terms
+
+    def _tokens(self, term: tuple[str, object]) -> tuple[str, ...]:
+        """
+        The tokens a term stands for, a prefix stands for every token of the vocabulary
+        it starts.
+        """
+        kind, value = term
+        if kind == "token":
+            return (value,)
+        if kind == "phrase":
+            return value
+
+        if self._vocabulary is None:
+            self._vocabulary = sorted(
+                self._title_postings.keys() | self._description_postings.keys()
+            )
+        start = bisect_left(self._vocabulary, value)
+        tokens = []
+        for token in self._vocabulary[start:]:
+            if not token.startswith(value):
+                break
+            tokens.append(token)
+        return tuple(tokens)
+
+    def _document_frequency(self, token: str) -> int:
+        return len(self._title_postings.get(token, ())) + len(
+            self._description_postings.get(token, ())
+        )
+
+    def _estimated_matches(self, term: tuple[str, object]) -> int:
+        frequencies = [self._document_frequency(token) for token in self._tokens(term)]
+        if not frequencies:
+            return 0
+        # A document needs all the words of a phrase but any of the tokens of a prefix
+        return min(frequencies) if term[0] == "phrase" else sum(frequencies)
+
+    def _score(
+        self, term: tuple[str, object], within: dict[int, float] | None
+    ) -> dict[int, float]:
+        """
+        Scores the live documents matching a term, restricted to within when it is
+        given. A phrase only matches documents with all of its words here, whether they
+        are consecutive is checked afterwards.
+        """
+        documents = max(len(self._ids), 1)
+        per_token = []
+        for token in self._tokens(term):
+            idf = math.log(1 + documents / max(self._document_frequency(token), 1))
+            token_scores: dict[int, float] = {}
+            for postings, weight in (
+                (self._title_postings, TITLE_WEIGHT * idf),
+                (self._description_postings, idf),
+            ):
+                for i in postings.get(token, ()):
+                    if (within is None or i in within) and self._titles[i] is not None:
+                        token_scores[i] = token_scores.get(i, 0.0) + weight
+            per_token.append(token_scores)
+
+        if not per_token:
+            return {}
+        if term[0] == "phrase":
+            per_token.sort(key=len)
+            matched = per_token[0]
+            for token_scores in per_token[1:]:
+                matched = {
+                    i: score + token_scores[i]
+                    for i, score in matched.items()
+                    if i in token_scores
+                }
+            return matched
+
+        matched = {}
+        for token_scores in per_token:
+            for i, score in token_scores.items():
+                matched[i] = matched.get(i, 0.0) + score
+        return matched
+
+
+def _pack(
+    postings: dict[str, array], renumbered: dict[int, int] | None
+) -> tuple[list[str], array, array]:
+    """
+    Packs postings into (tokens, offsets, ids), renumbering the ids and dropping the
+    removed ones if needed.
+    """
+    tokens = []
+    offsets = array("Q", [0])
+    ids = array("I")
+    for token, token_ids in postings.items():
+        if renumbered is not None:
+            token_ids = [renumbered[i] for i in token_ids if i in renumbered]
+            if not token_ids:
+                continue
+        tokens.append(token)
+        ids.extend(token_ids)
+        offsets.append(len(ids))
+    return tokens, offsets, ids
+
+
+def _unpack(packed: tuple[list[str], array, array]) -> dict[str, array]:
+    tokens, offsets, ids = packed
+    return {token: ids[offsets[i] : offsets[i + 1]] for i, token in enumerate(tokens)}
+
+
+def _has_phrase(task: Task | None, phrase: tuple[str, ...]) -> bool:
+    """
+    Whether the title or the description of a task holds the words of a phrase one after
+    the other.
+    """
+    if task is None:
+        return False
+    width = len(phrase)
+    for text in (task.title, task.description):
+        tokens = tokenize(text)
+        if any(
+            tuple(tokens[i : i + width]) == phrase
+            for i in range(len(tokens) - width + 1)
+        ):
+            return True
+    return False
+
+
+def index_file(data_file: str) -> str:
+    """The persisted search index of a data file."""
+    return data_file + INDEX_SUFFIX
+
+
+def load_search_index(data_file: str) -> SearchIndex | None:
+    """
+    Loads the persisted search index of a data file.
+
+    Parameters:
+        - data_file: str
+            file path
+
+    Returns:
+        - SearchIndex | None
+            the index, None if there is none or the data file has changed since it was
+            saved
+    """
+    try:
+        with open(index_file(data_file), "rb") as f:
+            version, indexed_fingerprint, index = pickle.load(f)
+    except (
+        OSError,
+        pickle.UnpicklingError,
+        EOFError,
+        ValueError,
+        TypeError,
+        AttributeError,
+    ):
+        return None
+    if version != INDEX_VERSION or not fingerprint_matches(
+        data_file, indexed_fingerprint
+    ):
+        return None
+    return index
+
+
+def save_search_index(data_file: str, index: SearchIndex) -> None:
+    """
+    Persists the search index of a data file along with the fingerprint of the file as
+    it is now, so it is only used for as long as the data file holds the same tasks. It
+    is written to a temporary file first.
+
+    Parameters:
+        - data_file: str
+            file path
+        - index: SearchIndex
+            the index of the tasks the data file holds
+
+    Returns:
+        - None
+    """
+    path = index_file(data_file)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        pickle.dump(
+            (INDEX_VERSION, fingerprint(data_file), index),
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(temporary_path, path)
@@ -0,0 +1,392 @@
+import argparse
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from json_stream import write_json_array
+from parallel_load import PARALLEL_MIN_BYTES
+from storage import (
+    Storage,
+    detect_schema,
+    iter_file_records,
+    record_reader,
+    task_to_record,
+)
+from task import Task
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+DEFAULT_SHARDS = 16
+MAX_SHARDS = 4096
+
+
+def shard_of(title: str, shards: int) -> int:
+    """
+    The shard a title belongs to. CRC-32 is stable across processes, unlike hash() on
+    strings.
+    """
+    return zlib.crc32(title.encode("utf-8")) % shards
+
+
+class ShardedStorage(Storage):
+    """
+    A storage kept in a directory of shards instead of a single data file. It is a
+    Storage, so everything in memory works the same, only persistence differs.
+
+    Tasks are partitioned into shards by a hash of their title (see shard_of). Every
+    shard is a JSON data file of its own, in the same format as tasks.json, and a small
+    manifest records the number of shards and their generation. save_task and
+    update_task mark the shard of the task dirty, and update_data_file only rewrites the
+    dirty shards, so a command changing one task rewrites about 1/N of the dataset.
+
+    Shards are read in parallel worker processes when there is enough to read (see
+    open). Every record of a shard also holds the sequence number of its task ("seq"),
+    counting the tasks in the order they were added, so the order of the tasks across
+    shards is restored on load.
+
+    reshard changes the number of shards: every task is assigned to a new shard file of
+    the next generation, the manifest switches to the new generation once they are all
+    written, and the files of the previous generation are removed afterwards. A crash in
+    between leaves either generation complete.
+
+    Attributes:
+        - directory: str | None
+            the directory of the shards, None until open is called
+        - shards: int
+            the number of shards
+        - generation: int
+            bumped by every reshard, shard files are named after it
+        - dirty_shards: set[int]
+            the shards changed since they were last written
+    """
+
+    def __init__(self, shards: int = DEFAULT_SHARDS):
+        """
+        Initializes an empty storage with the given number of shards, until open reads
+        it from a manifest.
+        """
+        _check_shard_count(shards)
+        self.directory: str | None = None
+        self.shards = shards
+        self.generation = 0
+        self.dirty_shards: set[int] = set()
+        # Whether the manifest on disk is missing or describes another generation
+        self.manifest_changed = True
+        # The files of a previous generation, removed once the manifest no longer points
+        # to them
+        self.stale_files: list[str] = []
+        self._titles_by_shard: list[dict[str, None]] = [{} for _ in range(shards)]
+        # The sequence number of every task, and the one the next new task gets
+        self._sequences: dict[str, int] = {}
+        self._next_sequence = 0
+        super().__init__()
+
+    @Storage.tasks.setter
+    def tasks(self, tasks: dict[str, Task]) -> None:
+        Storage.tasks.fset(self, tasks)
+        self._titles_by_shard = [{} for _ in range(self.shards)]
+        for title in tasks:
+            self._titles_by_shard[shard_of(title, self.shards)][title] = None
+        self._sequences = {title: sequence for sequence, title in enumerate(tasks)}
+        self._next_sequence = len(tasks)
+        self.dirty_shards = set(range(self.shards))
+
+    def save_task(self, task: Task) -> bool:
+        """
+        Adds a new task to the storage and marks its shard dirty. See Storage.save_task.
+        """
+        if not super().save_task(task):
+            return False
+        shard = shard_of(task.title, self.shards)
+        self._titles_by_shard[shard][task.title] = None
+        self._sequences[task.title] = self._next_sequence
+        self._next_sequence += 1
+        self.dirty_shards.add(shard)
+        return True
+
+    def update_task(self, updated_task: Task) -> None:
+        """
+        Updates a task in the storage and marks its shard dirty. See
+        Storage.update_task.
+        """
+        super().update_task(updated_task)
+        shard = shard_of(updated_task.title, self.shards)
+        self._titles_by_shard[shard][updated_task.title] = None
+        if updated_task.title not in self._sequences:
+            self._sequences[updated_task.title] = self._next_sequence
+            self._next_sequence += 1
+        self.dirty_shards.add(shard)
+
+    def shard_file(self, shard: int, generation: int | None = None) -> str:
+        """
+        The path of a shard file, of the current generation unless another one is given.
+        """
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.directory, f"shard-{generation:04d}-{shard:04d}.json")
+
+    def manifest_file(self) -> str:
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def open(self, directory: str, workers: int | None = None) -> None:
+        """
+        Loads the shards of a directory, creating the directory if it does not exist.
+        The manifest of a new directory is written along with its shards by
+        update_data_file.
+
+        Parameters:
+            - directory: str
+                the directory of the shards
+            - workers: int | None
+                the number of processes reading shards, None picks one per CPU (at most
+                one per shard) once the shards hold more than PARALLEL_MIN_BYTES, 1
+                reads them all in this process
+
+        Returns:
+            - None
+
+        Raises:
+            - ValueError
+                if the manifest or a shard is malformed, or a task has logical issues
+        """
+        self.directory = directory
+        manifest = self.manifest_file()
+        if not os.path.exists(manifest):
+            os.makedirs(directory, exist_ok=True)
+            self.dirty_shards = set(range(self.shards))
+            self.manifest_changed = True
+            self.changed = True
+            return
+
+        try:
+            with open(manifest, "r") as f:
+                content = json.load(f)
+            shards, generation = content["shards"], content["generation"]
+            if content["version"] != MANIFEST_VERSION:
+                raise ValueError
+            _check_shard_count(shards)
+        except (ValueError, KeyError, TypeError):
+            raise ValueError(
+                f"*** {manifest} is not a valid shard manifest. ***"
+            ) from None
+
+        self.shards, self.generation = shards, generation
+        self.tasks = {}
+        paths = [self.shard_file(shard) for shard in range(shards)]
+        if workers is None:
+            size = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+            workers = (
+                min(os.cpu_count() or 1, shards) if size >= PARALLEL_MIN_BYTES else 1
+            )
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                shard_rows = list(pool.map(read_shard, paths))
+        else:
+            shard_rows = [read_shard(path) for path in paths]
+
+        rows = [row for rows in shard_rows for row in rows]
+        numbered = all(sequence is not None for sequence, _ in rows)
+        if numbered:
+            rows.sort(key=lambda row: row[0])
+        else:
+            # Shards written without sequence numbers are put in order of creation, and
+            # all rewritten with them
+            rows.sort(key=lambda row: row[1][3])
+        for sequence, row in rows:
+            self.save_task(Task(*row))
+            if numbered:
+                self._sequences[row[0]] = sequence
+        self._next_sequence = max(self._sequences.values(), default=-1) + 1
+
+        self.dirty_shards = set() if numbered else set(range(shards))
+        self.manifest_changed = False
+        self.changed = False
+
+    def dump_shard(self, shard: int, f) -> None:
+        """
+        Writes the tasks of a shard to a file object as a JSON data file, with their
+        sequence numbers.
+        """
+        tasks, sequences = self.tasks, self._sequences
+        write_json_array(
+            (
+                {**task_to_record(tasks[title]), "seq": sequences[title]}
+                for title in self._titles_by_shard[shard]
+            ),
+            f,
+        )
+
+    def dump_manifest(self, f) -> None:
+        """Writes the manifest of the shards to a file object."""
+        json.dump(
+            {
+                "version": MANIFEST_VERSION,
+                "shards": self.shards,
+                "generation": self.generation,
+                "hash": "crc32",
+            },
+            f,
+            indent=4,
+        )
+
+    def mark_written(self) -> None:
+        """
+        Forgets the dirty shards and the stale files once they have all been written and
+        removed.
+        """
+        self.dirty_shards = set()
+        self.manifest_changed = False
+        self.stale_files = []
+        self.changed = False
+
+    def reshard(self, shards: int) -> None:
+        """
+        Redistributes the tasks into another number of shards. Every shard of the new
+        generation is dirty, and the files of the current generation become stale.
+        Nothing is written until update_data_file.
+
+        Parameters:
+            - shards: int
+                the new number of shards
+
+        Returns:
+            - None
+
+        Raises:
+            - ValueError
+                if the number of shards is not between 1 and MAX_SHARDS
+        """
+        _check_shard_count(shards)
+        if self.directory is not None:
+            self.stale_files.extend(
+                path
+                for path in (self.shard_file(shard) for shard in range(self.shards))
+                if os.path.exists(path)
+            )
+        self.shards = shards
+        self.generation += 1
+        self._titles_by_shard = [{} for _ in range(shards)]
+        for title in self.tasks:
+            self._titles_by_shard[shard_of(title, shards)][title] = None
+        self.dirty_shards = set(range(shards))
+        self.manifest_changed = True
+        self.changed = True
+
+
+def read_shard(path: str) -> list[tuple]:
+    """
+    Parses and validates a shard file. It runs in worker processes, so it returns plain
+    tuples, which are much cheaper to send back than Task objects. A missing shard is
+    empty.
+
+    Parameters:
+        - path: str
+            the shard file
+
+    Returns:
+        - list[tuple]
+            the sequence number (None if the shard has none) and the arguments of Task
+            of every task of the shard, in order
+
+    Raises:
+        - ValueError
+            if the shard is malformed or a task has logical issues
+    """
+    rows = []
+    try:
+        f = open(path, "r")  # noqa: SIM115
+    except FileNotFoundError:
+        return rows
+    with f:
+        version = detect_schema(f)
+        to_task = record_reader(version)
+        for offset, record, _ in iter_file_records(f, version):
+            try:
+                task = to_task(record)
+                sequence = record.get("seq")
+                if sequence is not None and (
+                    not isinstance(sequence, int) or isinstance(sequence, bool)
+                ):
+                    raise ValueError(
+                        f"*** The sequence number of '{task.title}' has to be an "
+                        "integer. ***"
+                    )
+            except ValueError as e:
+                raise ValueError(
+                    f"{e}\n -   The first malformed task of {path} starts at byte "
+                    f"offset {offset}."
+                ) from None
+            rows.append(
+                (
+                    sequence,
+                    (
+                        task.title,
+                        task.description,
+                        task.completed,
+                        task.created_at,
+                        str(task.completion_time) if task.completion_time else None,
+                    ),
+                )
+            )
+    return rows
+
+
+def _check_shard_count(shards: int) -> None:
+    if (
+        not isinstance(shards, int)
+        or isinstance(shards, bool)
+        or not 1 <= shards <= MAX_SHARDS
+    ):
+        raise ValueError(
+            f"*** The number of shards should be between 1 and {MAX_SHARDS}, not "
+            f"{shards}. ***"
+        )
+
+
+def migrate_json_to_shards(
+    json_file: str, directory: str, shards: int = DEFAULT_SHARDS
+) -> int:
+    """
+    One-shot migration of a JSON data file into a directory of shards.
+
+    Parameters:
+        - json_file: str
+            path of the JSON data file
+        - directory: str
+            the directory of the shards, it should not hold shards yet
+        - shards: int
+            the number of shards
+
+    Returns:
+        - int
+            the number of tasks migrated
+    """
+    from utils import update_data_file
+
+    store = ShardedStorage(shards)
+    store.open(directory)
+    with open(json_file, "r") as f:
+        store.load_tasks(f)
+    update_data_file(directory, store)
+    return len(store.tasks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Split a JSON task file into a directory of shards"
+    )
+    parser.add_argument("json_file", help="the existing JSON data file")
+    parser.add_argument(
+        "directory", help="the directory of shards to create, e.g. tasks.shards"
+    )
+    parser.add_argument(
+        "--shards", type=int, default=DEFAULT_SHARDS, help="the number of shards"
+    )
+    args = parser.parse_args()
+
+    count = migrate_json_to_shards(args.json_file, args.directory, args.shards)
+    print(
+        f"Split {args.json_file} into {args.shards} shards in {args.directory}, "
+        f"{count} tasks."
+    )
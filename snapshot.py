@@ -0,0 +1,546 @@
+import argparse
+import mmap
+import os
+import struct
+from array import array
+from datetime import timedelta
+from typing import Iterable, Iterator
+
+from json_stream import write_json_array
+from storage import Storage, iter_file_tasks, task_to_record
+from task import Task, completion_microseconds, from_epoch_us, to_epoch_us
+
+# Layout of a snapshot file, all integers are little endian:
+#
+#   header MAGIC, version, task count, completed count, sum of completion times and the
+#   offsets
+#                 of the three sections below
+#   records one fixed width record per task, in insertion order: created_at and
+#   completion time
+#                 in microseconds, completed flag, and where the title and description
+#                 are in the heap
+#   offset table the record numbers sorted by title, so a task is found with a binary
+#   search
+#   string heap the UTF-8 titles and descriptions, back to back
+#
+# The file is opened with mmap, so opening a snapshot only reads the header. Records are
+# decoded when they are accessed, and the report aggregates are in the header.
+
+MAGIC = b"TSNP"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHxxQQqQQQ")
+_RECORD = struct.Struct("<qqQQIIB7x")
+_ROW = struct.Struct("<I")
+
+
+class Snapshot:
+    """
+    A read-only, memory-mapped snapshot file.
+
+    Attributes:
+        - count: int
+            the number of tasks in the snapshot
+        - completed: int
+            the number of completed tasks
+        - total_completion: int
+            the sum of the completion times of the completed tasks in microseconds
+    """
+
+    def __init__(self, snapshot_file: str):
+        """Maps the file and reads its header."""
+        with open(snapshot_file, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError(
+                    f"*** {snapshot_file} is not a version {VERSION} task snapshot. ***"
+                )
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            fields = _HEADER.unpack_from(self._mm, 0)
+        except struct.error:
+            fields = (b"",) + (0,) * 8
+        magic, version = fields[:2]
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(
+                f"*** {snapshot_file} is not a version {VERSION} task snapshot. ***"
+            )
+
+        (
+            self.count,
+            self.completed,
+            self.total_completion,
+            self._records,
+            self._offsets,
+            self._heap,
+        ) = fields[2:]
+
+        # The sections are back to back, a truncated or corrupt file would otherwise
+        # fail later with a struct.error or return garbage
+        self._file = snapshot_file
+        valid_layout = (
+            self._records == _HEADER.size
+            and self._offsets == self._records + self.count * _RECORD.size
+            and self._heap == self._offsets + self.count * _ROW.size
+            and self._heap <= len(self._mm)
+            and self.completed <= self.count
+        )
+        if not valid_layout:
+            self._mm.close()
+            raise ValueError(f"*** {snapshot_file} is truncated or corrupt. ***")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def title(self, row: int) -> str:
+        """Decodes only the title of a record."""
+        record = _RECORD.unpack_from(self._mm, self._records + row * _RECORD.size)
+        return self._string(record[2], record[4])
+
+    def completion(self, row: int) -> tuple[bool, int]:
+        """
+        Reads only the completed flag and the completion time in microseconds of a
+        record.
+        """
+        record = _RECORD.unpack_from(self._mm, self._records + row * _RECORD.size)
+        return bool(record[6]), record[1]
+
+    def task(self, row: int) -> Task:
+        """Decodes a whole record into a Task."""
+        (
+            created_at,
+            completion,
+            title_offset,
+            description_offset,
+            title_length,
+            description_length,
+            completed,
+        ) = _RECORD.unpack_from(self._mm, self._records + row * _RECORD.size)
+        return Task(
+            self._string(title_offset, title_length),
+            self._string(description_offset, description_length),
+            bool(completed),
+            from_epoch_us(created_at),
+            str(timedelta(microseconds=completion)) if completed else None,
+        )
+
+    def find(self, title: str) -> int | None:
+        """Binary searches the offset table for a title, returns its record number."""
+        key = title.encode("utf-8")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            row = _ROW.unpack_from(self._mm, self._offsets + middle * _ROW.size)[0]
+            if row >= self.count:
+                raise ValueError(f"*** {self._file} is truncated or corrupt. ***")
+            record = _RECORD.unpack_from(self._mm, self._records + row * _RECORD.size)
+            start = self._heap + record[2]
+            candidate = self._mm[start : start + record[4]]
+            if candidate == key:
+                return row
+            if candidate < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def columns(self) -> tuple[array, array, bytearray]:
+        """
+        Reads the created_at, completion and completed columns of every record in one
+        pass.
+        """
+        created_at, completion = array("q"), array("q")
+        completed = bytearray((self.count + 7) // 8)
+        end = self._records + self.count * _RECORD.size
+        with memoryview(self._mm) as view:
+            for row, record in enumerate(
+                _RECORD.iter_unpack(view[self._records : end])
+            ):
+                created_at.append(record[0])
+                completion.append(record[1])
+                if record[6]:
+                    completed[row >> 3] |= 1 << (row & 7)
+        return created_at, completion, completed
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._heap + offset
+        if start + length > len(self._mm):
+            raise ValueError(f"*** {self._file} is truncated or corrupt. ***")
+        return self._mm[start : start + length].decode("utf-8")
+
+
+def write_snapshot(snapshot_file: str, tasks: Iterable[Task]) -> None:
+    """
+    Writes tasks into a new snapshot file. The file is written next to the target and
+    moved over it once complete, so a snapshot that is currently mapped stays valid and
+    a crash never leaves half a file behind. utils.update_data_file writes snapshots
+    with dump_snapshot instead, to apply its fsync policy.
+
+    Parameters:
+        - snapshot_file: str
+            path of the snapshot
+        - tasks: Iterable[Task]
+            the tasks in insertion order
+
+    Returns:
+        - None
+    """
+    temp_file = snapshot_file + ".tmp"
+    with open(temp_file, "wb") as f:
+        dump_snapshot(tasks, f)
+    os.replace(temp_file, snapshot_file)
+
+
+def dump_snapshot(tasks: Iterable[Task], f) -> None:
+    """
+    Writes tasks as a snapshot to a binary file object.
+
+    Parameters:
+        - tasks: Iterable[Task]
+            the tasks in insertion order
+        - f: file object
+            opened in binary mode
+
+    Returns:
+        - None
+    """
+    records = bytearray()
+    heap = bytearray()
+    titles: list[tuple[bytes, int]] = []
+    completed = 0
+    total_completion = 0
+
+    for row, task in enumerate(tasks):
+        title = task.title.encode("utf-8")
+        description = task.description.encode("utf-8")
+        completion = (
+            completion_microseconds(task.completion_time) if task.completed else 0
+        )
+        if task.completed:
+            completed += 1
+            total_completion += completion
+
+        records += _RECORD.pack(
+            to_epoch_us(task.created_at),
+            completion,
+            len(heap),
+            len(heap) + len(title),
+            len(title),
+            len(description),
+            1 if task.completed else 0,
+        )
+        heap += title
+        heap += description
+        titles.append((title, row))
+
+    titles.sort()
+    count = len(titles)
+    offsets = bytearray(count * _ROW.size)
+    for position, (_, row) in enumerate(titles):
+        _ROW.pack_into(offsets, position * _ROW.size, row)
+
+    records_offset = _HEADER.size
+    offsets_offset = records_offset + len(records)
+    heap_offset = offsets_offset + len(offsets)
+    header = _HEADER.pack(
+        MAGIC,
+        VERSION,
+        count,
+        completed,
+        total_completion,
+        records_offset,
+        offsets_offset,
+        heap_offset,
+    )
+
+    f.write(header)
+    f.write(records)
+    f.write(offsets)
+    f.write(heap)
+
+
+class SnapshotStorage:
+    """
+    A storage on top of a memory-mapped snapshot. It has the same interface as
+    storage.Storage, so the TaskManager can use either of them.
+
+    Attaching a snapshot costs the same no matter how many tasks it holds. Only the
+    tasks a command touches are decoded, and tasks that are saved or updated are kept in
+    memory as changes on top of the snapshot until the next snapshot is written.
+    """
+
+    def __init__(self):
+        """Initializes a storage with an empty snapshot."""
+        self.snapshot: Snapshot | None = None
+        # Saved and updated tasks, and what each of them contributes to the report
+        # aggregates
+        self._changes: dict[str, Task] = {}
+        self._contributions: dict[str, int | None] = {}
+        self._new_titles = 0
+        self._completed = 0
+        self._total_completion = 0
+
+    def attach(self, snapshot: Snapshot) -> None:
+        """
+        Uses a snapshot as the base of the storage, dropping any change made so far.
+
+        Parameters:
+            - snapshot: Snapshot
+                the mapped snapshot
+
+        Returns:
+            - None
+        """
+        if self.snapshot is not None:
+            self.snapshot.close()
+        self.snapshot = snapshot
+        self._changes = {}
+        self._contributions = {}
+        self._new_titles = 0
+        self._completed = snapshot.completed
+        self._total_completion = snapshot.total_completion
+
+    @property
+    def changed(self) -> bool:
+        """Whether anything was saved or updated since the snapshot was attached."""
+        return bool(self._changes)
+
+    def close(self) -> None:
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+    def save_task(self, task: Task) -> bool:
+        """
+        Adds a new task to the storage
+
+        Parameters:
+            - task: Task
+                the task to be added
+
+        Returns:
+            - True: bool
+                if the save was successful
+            - False: bool
+                if there is an existing task with matching titles
+        """
+        if task.title in self._changes or self._find(task.title) is not None:
+            return False
+        self._changes[task.title] = task
+        self._new_titles += 1
+        self._count(task)
+        return True
+
+    def update_task(self, updated_task: Task) -> None:
+        """
+        Updates an existing task in the storage.
+
+        Parameters:
+            - updated_task: Task
+                the task with the updated details
+
+        Returns:
+            - None
+        """
+        title = updated_task.title
+        if title in self._contributions:
+            previous = self._contributions[title]
+        else:
+            row = self._find(title)
+            if row is None:
+                self._new_titles += 1
+                previous = None
+            else:
+                completed, completion = self.snapshot.completion(row)
+                previous = completion if completed else None
+
+        if previous is not None:
+            self._completed -= 1
+            self._total_completion -= previous
+        self._changes[title] = updated_task
+        self._count(updated_task)
+
+    def get_task(self, title: str) -> Task | None:
+        """Fetches a task by its title, decoding it from the snapshot if it has not been
+        changed
+
+        Parameters:
+            - title: str
+                title of the task to be fetched
+
+        Returns:
+            - Task | None
+                Task object if found else None
+        """
+        if title in self._changes:
+            return self._changes[title]
+        row = self._find(title)
+        return self.snapshot.task(row) if row is not None else None
+
+    def get_all_tasks(self) -> list[Task]:
+        """Returns the list of all the tasks in the storage.
+
+        Returns:
+            list[Tasks]
+        """
+        return list(self._iter_tasks())
+
+    def get_pending_tasks(self) -> list[Task]:
+        """Returns the list of the tasks that have not been completed yet. Only pending
+        records are decoded.
+
+        Returns:
+            list[Tasks]
+        """
+        return [
+            task for task in self._iter_tasks(pending_only=True) if not task.completed
+        ]
+
+    def get_report_stats(self) -> tuple[int, int, float | None]:
+        """Returns the aggregates the report is built from, starting from the ones in
+        the snapshot header.
+
+        Returns:
+            - tuple[int, int, float | None]
+                the total number of tasks, the number of completed tasks and the average
+                completion time in seconds (None if no task has been completed)
+        """
+        total = len(self.snapshot or ()) + self._new_titles
+        average = (
+            self._total_completion / self._completed / 1e6 if self._completed else None
+        )
+        return total, self._completed, average
+
+    def check_report_stats(self) -> None:
+        """Recomputes the aggregates of the report from every task and compares them
+        with the maintained ones.
+
+        Raises:
+            - AssertionError
+                if the maintained aggregates have drifted from the tasks
+        """
+        completed = 0
+        total_completion = 0
+        for task in self._iter_tasks():
+            if task.completed:
+                completed += 1
+                total_completion += completion_microseconds(task.completion_time)
+        if (completed, total_completion) != (self._completed, self._total_completion):
+            raise AssertionError(
+                f"*** The report aggregates are out of sync with the tasks. ***"
+                f"\n -   Maintained: {self._completed} completed, "
+                f"{self._total_completion} microseconds"
+                f"\n -   Recomputed: {completed} completed, {total_completion} "
+                "microseconds"
+            )
+
+    def get_time_columns(self) -> tuple[array, array, bytes]:
+        """Builds the columns the detailed report is computed from, see
+        analytics.detailed_report.
+
+        Returns:
+            - tuple[array, array, bytes]
+                created_at in microseconds since task.EPOCH (int64), completion times in
+                microseconds (int64, 0 while pending) and a bitmap of the completed
+                tasks
+        """
+        if not self._changes and self.snapshot is not None:
+            return self.snapshot.columns()
+        # With changes on top it is simpler to go through the tasks like Storage does
+        merged = Storage()
+        merged.tasks = {task.title: task for task in self._iter_tasks()}
+        return merged.get_time_columns()
+
+    def load_tasks(self, f) -> None:
+        """
+        Loads tasks from a JSON file, they are kept as changes until the next snapshot
+        is written.
+
+        Parameters:
+            - f: file object
+                the file to read tasks from in JSON format
+
+        Returns:
+            - None
+        """
+        for task in iter_file_tasks(f):
+            self.save_task(task)
+
+    def dump(self, f, indent: int | None = 4) -> None:
+        """Formats each task into JSON and dumps all of it into a JSON file, one task at
+        a time.
+
+        Parameters:
+            - f: file object
+                a file object to write the tasks in JSON format
+            - indent: int | None
+                the indentation of the JSON, None writes it without line breaks
+
+        Returns:
+            - None
+        """
+        write_json_array(map(task_to_record, self._iter_tasks()), f, indent)
+
+    def _iter_tasks(self, pending_only: bool = False) -> Iterator[Task]:
+        """
+        Yields every task in insertion order, decoding snapshot records one at a time.
+        """
+        seen = set()
+        for row in range(len(self.snapshot or ())):
+            # Completed records are skipped without decoding them, unless they have been
+            # changed since
+            if (
+                pending_only
+                and self.snapshot.completion(row)[0]
+                and (not self._changes or self.snapshot.title(row) not in self._changes)
+            ):
+                continue
+            task = self.snapshot.task(row)
+            if task.title in self._changes:
+                task = self._changes[task.title]
+                seen.add(task.title)
+            yield task
+        for title, task in self._changes.items():
+            if title not in seen:
+                yield task
+
+    def _find(self, title: str) -> int | None:
+        return self.snapshot.find(title) if self.snapshot is not None else None
+
+    def _count(self, task: Task) -> None:
+        if task.completed:
+            completion = completion_microseconds(task.completion_time)
+            self._completed += 1
+            self._total_completion += completion
+            self._contributions[task.title] = completion
+        else:
+            self._contributions[task.title] = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Convert a JSON task file into a snapshot, or a snapshot back into JSON"
+        )
+    )
+    parser.add_argument("source", help="the .json or .snap file to read")
+    parser.add_argument("target", help="the .snap or .json file to write")
+    args = parser.parse_args()
+
+    if args.source.endswith(".snap"):
+        source = Snapshot(args.source)
+        with open(args.target, "w") as target:
+            write_json_array(
+                (task_to_record(source.task(row)) for row in range(len(source))), target
+            )
+        source.close()
+    else:
+        store = Storage()
+        with open(args.source, "r") as f:
+            store.load_tasks(f)
+        write_snapshot(args.target, store.tasks.values())
+    print(f"Converted {args.source} into {args.target}.")
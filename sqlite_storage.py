@@ -0,0 +1,389 @@
+import argparse
+import math
+import sqlite3
+from array import array
+from datetime import datetime
+from typing import Iterator
+
+from json_stream import write_json_array
+from storage import iter_file_tasks, task_to_record
+from task import Task, completion_seconds
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    title TEXT PRIMARY KEY,
+    description TEXT NOT NULL,
+    completed INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    completion_time TEXT,
+    completion_seconds REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_completed ON tasks (completed);
+CREATE INDEX IF NOT EXISTS tasks_created_at ON tasks (created_at);
+
+-- Running aggregates of the report, kept in sync with the tasks by the triggers below
+CREATE TABLE IF NOT EXISTS report_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total INTEGER NOT NULL,
+    completed INTEGER NOT NULL,
+    completion_seconds REAL NOT NULL
+);
+INSERT OR IGNORE INTO report_stats
+    SELECT 0, COUNT(*), COALESCE(SUM(completed), 0),
+        COALESCE(SUM(completion_seconds), 0) FROM tasks;
+
+CREATE TRIGGER IF NOT EXISTS report_stats_insert AFTER INSERT ON tasks BEGIN
+    UPDATE report_stats SET
+        total = total + 1,
+        completed = completed + NEW.completed,
+        completion_seconds = completion_seconds + COALESCE(NEW.completion_seconds, 0);
+END;
+CREATE TRIGGER IF NOT EXISTS report_stats_update AFTER UPDATE ON tasks BEGIN
+    UPDATE report_stats SET
+        completed = completed - OLD.completed + NEW.completed,
+        completion_seconds = completion_seconds
+            - COALESCE(OLD.completion_seconds, 0) + COALESCE(NEW.completion_seconds, 0);
+END;
+CREATE TRIGGER IF NOT EXISTS report_stats_delete AFTER DELETE ON tasks BEGIN
+    UPDATE report_stats SET
+        total = total - 1,
+        completed = completed - OLD.completed,
+        completion_seconds = completion_seconds - COALESCE(OLD.completion_seconds, 0);
+END;
+"""
+
+_COLUMNS = "title, description, completed, created_at, completion_time"
+
+# Tasks are listed in the order they were added, which is the rowid order of the table
+_INSERT = (
+    f"INSERT OR IGNORE INTO tasks ({_COLUMNS}, completion_seconds) VALUES (?, ?, ?, ?, "
+    "?, ?)"
+)
+_UPSERT = (
+    f"INSERT INTO tasks ({_COLUMNS}, completion_seconds) VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (title) DO UPDATE SET description = excluded.description, "
+    "completed = excluded.completed, created_at = excluded.created_at, "
+    "completion_time = excluded.completion_time, completion_seconds = "
+    "excluded.completion_seconds"
+)
+
+
+class SqliteStorage:
+    """
+    A storage that keeps the tasks in a SQLite database instead of memory. It has the
+    same interface as storage.Storage, so the TaskManager can use either of them.
+
+    Single task lookups go through the primary key on the title, pending tasks are found
+    through the index on completed and the report is computed with SQL aggregates, so
+    none of the commands need the whole dataset in Python memory.
+
+    Attributes:
+        - connection: sqlite3.Connection | None
+            the connection to the database, None until connect is called
+    """
+
+    def __init__(self, db_file: str | None = None):
+        """
+        Initializes a new SQLite storage, and connects to the database if a file is
+        given.
+        """
+        self.connection: sqlite3.Connection | None = None
+        if db_file is not None:
+            self.connect(db_file)
+
+    def connect(self, db_file: str) -> None:
+        """
+        Opens the database, creating it and its tables if they don't exist.
+
+        Parameters:
+            - db_file: str
+                path of the database file
+
+        Returns:
+            - None
+        """
+        self.connection = sqlite3.connect(db_file)
+        self.connection.executescript(_SCHEMA)
+
+    def commit(self) -> None:
+        """Commits the changes made since the last commit."""
+        self.connection.commit()
+
+    def close(self) -> None:
+        """Commits and closes the connection."""
+        if self.connection is not None:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    def save_task(self, task: Task) -> bool:
+        """
+        Adds a new task to the storage
+
+        Parameters:
+            - task: Task
+                the task to be added
+
+        Returns:
+            - True: bool
+                if the save was successful
+            - False: bool
+                if there is an existing task with matching titles
+        """
+        cursor = self.connection.execute(_INSERT, _to_row(task))
+        return cursor.rowcount == 1
+
+    def update_task(self, updated_task: Task) -> None:
+        """
+        Updates an existing task in the storage.
+
+        Parameters:
+            - updated_task: Task
+                the task with the updated details
+
+        Returns:
+            - None
+        """
+        self.connection.execute(_UPSERT, _to_row(updated_task))
+
+    def get_task(self, title: str) -> Task | None:
+        """Fetches a task by its title
+
+        Parameters:
+            - title: str
+                title of the task to be fetched
+
+        Returns:
+            - Task | None
+                Task object if found else None
+        """
+        row = self.connection.execute(
+            f"SELECT {_COLUMNS} FROM tasks WHERE title = ?", (title,)
+        ).fetchone()
+        return _from_row(row) if row else None
+
+    def get_all_tasks(self) -> list[Task]:
+        """Returns the list of all the tasks in the storage.
+
+        Returns:
+            list[Tasks]
+        """
+        rows = self.connection.execute(f"SELECT {_COLUMNS} FROM tasks ORDER BY rowid")
+        return [_from_row(row) for row in rows]
+
+    def get_pending_tasks(self) -> list[Task]:
+        """Returns the list of the tasks that have not been completed yet.
+
+        Returns:
+            list[Tasks]
+        """
+        rows = self.connection.execute(
+            f"SELECT {_COLUMNS} FROM tasks WHERE completed = 0 ORDER BY rowid"
+        )
+        return [_from_row(row) for row in rows]
+
+    def iter_tasks(
+        self, include_completed: bool = True, after: str | None = None
+    ) -> Iterator[Task]:
+        """Yields the tasks one at a time in insertion (rowid) order, straight from the
+        cursor of the query.
+
+        Parameters:
+            - include_completed: bool
+                False yields the pending tasks only
+            - after: str | None
+                the title of a task to start after, its rowid is looked up through the
+                primary key
+
+        Returns:
+            - Iterator[Task]
+
+        Raises:
+            - ValueError
+                if there is no task titled after
+        """
+        start = 0
+        if after is not None:
+            row = self.connection.execute(
+                "SELECT rowid FROM tasks WHERE title = ?", (after,)
+            ).fetchone()
+            if row is None:
+                raise ValueError(
+                    f"*** There is no task titled '{after}' to continue after. ***"
+                )
+            start = row[0]
+
+        pending_only = "" if include_completed else "AND completed = 0 "
+        rows = self.connection.execute(
+            f"SELECT {_COLUMNS} FROM tasks WHERE rowid > ? {pending_only}ORDER BY "
+            "rowid",
+            (start,),
+        )
+        for row in rows:
+            yield _from_row(row)
+
+    def get_report_stats(self) -> tuple[int, int, float | None]:
+        """Returns the aggregates the report is built from. They are stored in the
+        database and kept up to date by triggers, so this does not depend on the number
+        of tasks.
+
+        Returns:
+            - tuple[int, int, float | None]
+                the total number of tasks, the number of completed tasks and the average
+                completion time in seconds (None if no task has been completed)
+        """
+        total, completed, total_completion_seconds = self.connection.execute(
+            "SELECT total, completed, completion_seconds FROM report_stats"
+        ).fetchone()
+        average = total_completion_seconds / completed if completed else None
+        return total, completed, average
+
+    def get_time_columns(self) -> tuple[array, array, bytes]:
+        """Builds the columns the detailed report is computed from, see
+        analytics.detailed_report. The timestamps are converted by SQLite itself: whole
+        seconds with strftime and the microseconds straight from the ISO string.
+
+        Returns:
+            - tuple[array, array, bytes]
+                created_at in microseconds since task.EPOCH (int64), completion times in
+                microseconds (int64, 0 while pending) and a bitmap of the completed
+                tasks
+        """
+        rows = self.connection.execute(
+            "SELECT CAST(strftime('%s', created_at) AS INTEGER) * 1000000 "
+            "+ CAST(substr(created_at || '.000000', 21, 6) AS INTEGER), "
+            "CAST(ROUND(COALESCE(completion_seconds, 0) * 1000000.0) AS INTEGER), "
+            "completed "
+            "FROM tasks ORDER BY rowid"
+        )
+        created_at, completion = array("q"), array("q")
+        completed = bytearray()
+        for row, (created, taken, done) in enumerate(rows):
+            created_at.append(created)
+            completion.append(taken)
+            if row % 8 == 0:
+                completed.append(0)
+            if done:
+                completed[row >> 3] |= 1 << (row & 7)
+        return created_at, completion, bytes(completed)
+
+    def check_report_stats(self) -> None:
+        """Recomputes the aggregates of the report with SQL aggregates and compares them
+        with the stored ones.
+
+        Raises:
+            - AssertionError
+                if the stored aggregates have drifted from the tasks
+        """
+        stored = self.connection.execute(
+            "SELECT total, completed, completion_seconds FROM report_stats"
+        ).fetchone()
+        recomputed = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(completed), 0), "
+            "COALESCE(SUM(completion_seconds), 0) FROM tasks"
+        ).fetchone()
+
+        matches = stored[:2] == recomputed[:2] and math.isclose(
+            stored[2], recomputed[2], rel_tol=1e-9, abs_tol=1e-6
+        )
+        if not matches:
+            raise AssertionError(
+                f"*** The report aggregates are out of sync with the tasks. ***"
+                f"\n -   Stored: {stored}"
+                f"\n -   Recomputed: {recomputed}"
+            )
+
+    def load_tasks(self, f) -> None:
+        """
+        Loads tasks from a JSON data file into the database, in a single transaction.
+
+        Parameters:
+            - f: file object
+                the file to read tasks from in JSON format
+
+        Returns:
+            - None
+
+        Raises:
+            - ValueError
+                if the file is malformed or a task has logical issues
+        """
+        with self.connection:
+            self.connection.executemany(_INSERT, map(_to_row, iter_file_tasks(f)))
+
+    def dump(self, f, indent: int | None = 4) -> None:
+        """Formats each task into JSON and dumps all of it into a JSON file, one task at
+        a time.
+
+        Parameters:
+            - f: file object
+                a file object to write the tasks in JSON format
+            - indent: int | None
+                the indentation of the JSON, None writes it without line breaks
+
+        Returns:
+            - None
+        """
+        rows = self.connection.execute(f"SELECT {_COLUMNS} FROM tasks ORDER BY rowid")
+        write_json_array((task_to_record(_from_row(row)) for row in rows), f, indent)
+
+
+def _to_row(task: Task) -> tuple:
+    """Converts a task into a row of the tasks table."""
+    completion_time = task.completion_time
+    return (
+        task.title,
+        task.description,
+        1 if task.completed else 0,
+        task.created_at.isoformat(),
+        str(completion_time) if completion_time else None,
+        completion_seconds(completion_time) if completion_time else None,
+    )
+
+
+def _from_row(row: tuple) -> Task:
+    """Builds a task from a row of the tasks table."""
+    title, description, completed, created_at, completion_time = row
+    return Task(
+        title,
+        description,
+        bool(completed),
+        datetime.fromisoformat(created_at),
+        completion_time,
+    )
+
+
+def migrate_json_to_sqlite(json_file: str, db_file: str) -> int:
+    """
+    One-shot migration of a JSON data file into a SQLite database. Tasks that already
+    exist in the database are kept as they are.
+
+    Parameters:
+        - json_file: str
+            path of the JSON data file
+        - db_file: str
+            path of the database, created if it does not exist
+
+    Returns:
+        - int
+            the number of tasks in the database after the migration
+    """
+    store = SqliteStorage(db_file)
+    try:
+        with open(json_file, "r") as f:
+            store.load_tasks(f)
+        return store.get_report_stats()[0]
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Migrate a JSON task file into a SQLite database"
+    )
+    parser.add_argument("json_file", help="the existing JSON data file")
+    parser.add_argument("db_file", help="the SQLite database to create")
+    args = parser.parse_args()
+
+    count = migrate_json_to_sqlite(args.json_file, args.db_file)
+    print(f"Migrated {args.json_file} into {args.db_file}, it now holds {count} tasks.")
@@ -1,7 +1,45 @@
 import datetime
+import math
+from array import array
 import json
-from task import Task
-from datetime import datetime
+from typing import Iterable, Iterator
+from task import (
+    Task,
+    completion_microseconds,
+    task_completion_seconds,
+    from_epoch_us,
+    to_epoch_us,
+)
+from datetime import datetime, timedelta
+from json_stream import (
+    RawJSON,
+    format_element,
+    format_line,
+    iter_json_array_text,
+    iter_json_lines,
+    write_json_array,
+    write_json_lines,
+)
+from search_index import SearchIndex
+from time_index import TimeIndex, scan_range
+
+# The schema versions of JSON data files. Version 1 is a JSON array of records with ISO
+# timestamps and str(timedelta) completion times. Version 2 is JSON Lines: a header with
+# the version, then one record per line with timestamps in microseconds since task.EPOCH
+# and completion times in microseconds, so reading it never parses a date or a duration.
+SCHEMA_VERSIONS = (1, 2)
+LATEST_SCHEMA = 2
+SCHEMA_NAME = "tasks"
+
+_INVALID_TASK = (
+    "*** One or a few tasks in the data file have logical issues. **** "
+    "\n -   Please check if any of the tasks has missing field(s). "
+    "\n -   OR if there are logical errors such tasks stating they are completed and "
+    "have "
+    "no completion time, and vice versa."
+)
+# The longest completion time a timedelta can hold, in microseconds
+_MAX_COMPLETION_US = timedelta.max // timedelta(microseconds=1)
 
 
 class Storage:
@@ -11,12 +49,67 @@ class Storage:
     Attributes:
             - tasks: dict[str, Task]
                     the dictionary of all the tasks that have been added to storage
+            - changed: bool
+                    whether tasks were saved, updated or replaced since the storage was
+                    loaded or last written, update_data_file skips writing an unchanged
+                    storage
+            - flusher: BackgroundFlusher | None
+                    told about every change once attached, see background_flusher
+            - schema_version: int
+                    the schema version dump writes, the one of the file last loaded (see
+                    SCHEMA_VERSIONS)
+            - time_index: TimeIndex | None
+                    the tasks sorted by creation and completion time once attached, see
+                    attach_time_index
 
+    The aggregates of the report (total, completed and the sum of the completion times)
+    and the index of the pending tasks are kept up to date by save_task and update_task,
+    so neither the report nor listing the pending tasks has to look at every task. Tasks
+    should therefore only be changed through those two methods; assigning a whole new
+    dictionary to tasks is fine as well, everything is rebuilt from it.
     """
 
     def __init__(self):
         """Initializes a new storage with an empty dictionary of tasks."""
+        # Kept up to date by save_task and update_task once one is attached, see
+        # attach_search_index
+        self.search_index: SearchIndex | None = None
+        # Kept up to date the same way once one is attached, see attach_time_index
+        self.time_index: TimeIndex | None = None
+        # Notified of every change once one is attached, see attach_flusher
+        self.flusher = None
+        self.schema_version = 1
         self.tasks: dict[str, Task] = {}
+        self.changed = False
+
+    @property
+    def tasks(self) -> dict[str, Task]:
+        return self._tasks
+
+    @tasks.setter
+    def tasks(self, tasks: dict[str, Task]) -> None:
+        self._tasks = tasks
+        # The tasks may have been changed in place before they were handed over, so they
+        # are never assumed saved
+        self.changed = True
+
+        # Completion time in seconds of every completed task, it is what the running sum
+        # is made of and doubles as the index of the completed tasks. Tasks are changed
+        # in place before update_task is called, so what a task used to contribute can
+        # not be read from the task itself anymore.
+        self._completion_seconds: dict[str, float] = {}
+        self._total_completion_seconds = 0.0
+        # The pending tasks in insertion order, a task leaves it once it is completed
+        self._pending: dict[str, Task] = {}
+        for task in tasks.values():
+            self._count(task)
+
+        if self.search_index is not None:
+            self.search_index = SearchIndex.build(tasks.values())
+        if self.time_index is not None:
+            self.time_index = TimeIndex.build(tasks.values(), self._completion_seconds)
+        if self.flusher is not None:
+            self.flusher.notify()
 
     def save_task(self, task: Task) -> bool:
         """
@@ -33,6 +126,14 @@ class Storage:
         """
         if task.title not in self.tasks.keys():
             self.tasks[task.title] = task
+            self._count(task)
+            self.changed = True
+            if self.search_index is not None:
+                self.search_index.add(task)
+            if self.time_index is not None:
+                self.time_index.add(task)
+            if self.flusher is not None:
+                self.flusher.notify()
             return True
         else:
             return False
@@ -49,10 +150,80 @@ class Storage:
                 - None
         """
         self.tasks[updated_task.title] = updated_task
+        self._uncount(updated_task.title)
+        self._count(updated_task)
+        self.changed = True
+        if self.search_index is not None:
+            self.search_index.add(updated_task)
+        if self.time_index is not None:
+            self.time_index.update(updated_task)
+        if self.flusher is not None:
+            self.flusher.notify()
+
+    def attach_flusher(self, flusher) -> None:
+        """
+        Attaches a background flusher, which is notified of every change from then on.
+        It should be attached once the storage is loaded, so loading does not count as
+        changes.
+
+        Parameters:
+                - flusher: BackgroundFlusher
+                        the flusher writing the storage
+
+        Returns:
+                - None
+        """
+        self.flusher = flusher
+
+    def attach_search_index(self, index: SearchIndex | None = None) -> SearchIndex:
+        """
+        Attaches a search index, from then on it is kept up to date as tasks are saved
+        and updated.
+
+        Parameters:
+                - index: SearchIndex | None
+                        an index of exactly the tasks in the storage, e.g. a persisted
+                        one, or None to build it
+
+        Returns:
+                - SearchIndex
+                        the attached index
+        """
+        self.search_index = (
+            index if index is not None else SearchIndex.build(self.tasks.values())
+        )
+        return self.search_index
+
+    def attach_time_index(self) -> TimeIndex:
+        """
+        Builds and attaches the time index, from then on it is kept up to date as tasks
+        are saved and updated.
+
+        Returns:
+                - TimeIndex
+                        the attached index
+        """
+        if self.time_index is None:
+            self.time_index = TimeIndex.build(
+                self.tasks.values(), self._completion_seconds
+            )
+        return self.time_index
+
+    def scan_time_range(
+        self, start: int | None, end: int | None
+    ) -> tuple[int, int, float | None, int]:
+        """
+        The aggregates of a time range without a time index, from every task and the
+        completion times the storage keeps, see time_index.scan_range.
+        """
+        return scan_range(self.tasks.values(), start, end, self._completion_seconds)
 
     def load_tasks(self, f) -> None:
         """
-        Loads tasks from a file into the storage.
+        Loads tasks from a file into the storage. The file is parsed incrementally and
+        each task is validated and built as soon as its record is read, so the list of
+        raw records is never held in memory as a whole. The schema version is detected,
+        and dump writes the same one.
 
         Parameters:
                 - f: file object
@@ -60,69 +231,39 @@ class Storage:
 
         Returns:
                 - None
+
+        Raises:
+                - ValueError
+                        if the file is malformed or a task has logical issues, along
+                        with the byte offset of the first offending record
         """
 
-        f.seek(0)
-        tasks = json.load(f)
+        # The loaded tasks are what the file already holds, loading does not change the
+        # storage
+        changed = self.changed
+        self.schema_version = detect_schema(f)
+        for fetched_task in iter_file_tasks(f):
+            self.save_task(fetched_task)
+        self.changed = changed
 
-        for task in tasks:
-            title = task.get("title")
-            description = task.get("description")
-            completed = task.get("completed")
-            created_at = datetime.fromisoformat((task.get("created_at")))
-            completion_time = (
-                task.get("completion_time") if task.get("completion_time") else None
-            )
-
-            # Bad Data Checks
-            logic_1 = completed and completion_time is None
-            logic_2 = not completed and completion_time is not None
-            logic_3 = title is None
-            logic_4 = description is None
-            logic_5 = created_at is None
-            logic_6 = completed and completion_time is None
-
-            # Weed out illogical task objects
-            if logic_1 or logic_2 or logic_3 or logic_4 or logic_5 or logic_6:
-                raise ValueError(
-                    "*** One or a few tasks in the data file have logical issues. **** "
-                    "\n -   Please check if any of the tasks has missing field(s). "
-                    "\n -   OR if there are logical errors such tasks stating they are completed and have "
-                    "no completion time, and vice versa."
-                )
-            else:
-                fetched_task = Task(
-                    title, description, completed, created_at, completion_time
-                )
-                self.save_task(fetched_task)
-
-    def dump(self, f) -> None:
-        """Formats each task into JSON and dumps all of it into a JSON file.
+    def dump(self, f, indent: int | None = 4) -> None:
+        """Formats each task into JSON and dumps all of it into a JSON file, one task at
+        a time.
 
         Parameters:
                 - f: file object
                         a file object to write the tasks in JSON format
+                - indent: int | None
+                        the indentation of the JSON, None writes it without line breaks
+                        (schema version 1)
 
         Returns:
                 - None
         """
-        serializable_tasks_list = []
-        try:
-            for t in self.tasks.values():
-                task = {
-                    "title": t.title,
-                    "description": t.description,
-                    "completed": t.completed,
-                    "created_at": t.created_at.isoformat(),
-                    "completion_time": (
-                        str(t.completion_time) if t.completion_time else None
-                    ),
-                }
-                serializable_tasks_list.append(task)
-
-            json.dump(serializable_tasks_list, f, indent=4)
-        except Exception as e:
-            print(f"Failed to dump tasks to file: {e}")
+        to_record = record_writer(self.schema_version)
+        write_records(
+            map(to_record, self.tasks.values()), f, self.schema_version, indent
+        )
 
     def get_task(self, title: str) -> Task | None:
         """Fetches a task by its title
@@ -146,3 +287,467 @@ class Storage:
                 list[Tasks]
         """
         return list(self.tasks.values())
+
+    def get_pending_tasks(self) -> list[Task]:
+        """Returns the list of the tasks that have not been completed yet, straight from
+        the pending index.
+
+        Returns:
+                list[Tasks]
+        """
+        return list(self._pending.values())
+
+    def iter_tasks(
+        self, include_completed: bool = True, after: str | None = None
+    ) -> Iterator[Task]:
+        """Yields the tasks one at a time in insertion order, which is the order they
+        are listed in.
+
+        Parameters:
+                - include_completed: bool
+                        False yields the pending tasks only, straight from the pending
+                        index
+                - after: str | None
+                        the title of a task to start after, a cursor that stays valid as
+                        tasks are added and completed
+
+        Returns:
+                - Iterator[Task]
+
+        Raises:
+                - ValueError
+                        if there is no task titled after
+        """
+        if after is None:
+            yield from (
+                self.tasks.values() if include_completed else self._pending.values()
+            )
+            return
+        if after not in self.tasks:
+            raise ValueError(
+                f"*** There is no task titled '{after}' to continue after. ***"
+            )
+
+        # The pending index is in the same order as the tasks, it is only a shortcut
+        # while the cursor is pending
+        source = (
+            self._pending
+            if not include_completed and after in self._pending
+            else self.tasks
+        )
+        tasks = iter(source.values())
+        for task in tasks:
+            if task.title == after:
+                break
+        for task in tasks:
+            if include_completed or not task.completed:
+                yield task
+
+    def get_report_stats(self) -> tuple[int, int, float | None]:
+        """Returns the aggregates the report is built from. They are maintained as tasks
+        are saved and updated, so this does not depend on the number of tasks.
+
+        Returns:
+                - tuple[int, int, float | None]
+                        the total number of tasks, the number of completed tasks and the
+                        average completion time in seconds (None if no task has been
+                        completed)
+        """
+        total = len(self.tasks)
+        completed = len(self._completion_seconds)
+        average = self._total_completion_seconds / completed if completed else None
+        return total, completed, average
+
+    def get_time_columns(self) -> tuple[array, array, bytes]:
+        """Builds the columns the detailed report is computed from, see
+        analytics.detailed_report.
+
+        Returns:
+                - tuple[array, array, bytes]
+                        created_at in microseconds since task.EPOCH (int64), completion
+                        times in microseconds (int64, 0 while pending) and a bitmap of
+                        the completed tasks
+        """
+        tasks = self.tasks.values()
+        created_at = array("q", [to_epoch_us(task.created_at) for task in tasks])
+        completion = array(
+            "q", [completion_microseconds(task.completion_time) for task in tasks]
+        )
+
+        completed = bytearray((len(tasks) + 7) // 8)
+        for row, task in enumerate(tasks):
+            if task.completed:
+                completed[row >> 3] |= 1 << (row & 7)
+        return created_at, completion, bytes(completed)
+
+    def check_report_stats(self) -> None:
+        """Recomputes the aggregates of the report from scratch and compares them with
+        the running ones, the size of the pending index included.
+
+        Raises:
+                - AssertionError
+                        if the running aggregates have drifted from the tasks
+        """
+        completed = 0
+        total_completion_seconds = 0.0
+        for task in self.tasks.values():
+            if task.completed:
+                completed += 1
+                total_completion_seconds += task_completion_seconds(task)
+
+        matches = (
+            completed == len(self._completion_seconds)
+            and len(self.tasks) - completed == len(self._pending)
+            and math.isclose(
+                total_completion_seconds,
+                self._total_completion_seconds,
+                rel_tol=1e-9,
+                abs_tol=1e-6,
+            )
+        )
+        if not matches:
+            raise AssertionError(
+                f"*** The report aggregates are out of sync with the tasks. ***"
+                f"\n -   Maintained: {len(self._completion_seconds)} completed, "
+                f"{len(self._pending)} pending, "
+                f"{self._total_completion_seconds} seconds"
+                f"\n -   Recomputed: {completed} completed, "
+                f"{len(self.tasks) - completed} pending, "
+                f"{total_completion_seconds} seconds"
+            )
+
+    def _count(self, task: Task) -> None:
+        """
+        Adds a task's completion time to the running aggregates and files it under
+        pending or completed.
+        """
+        if task.completed:
+            seconds = task_completion_seconds(task)
+            self._completion_seconds[task.title] = seconds
+            self._total_completion_seconds += seconds
+            self._pending.pop(task.title, None)
+        else:
+            # A task that stays pending keeps its place, assigning an existing key does
+            # not move it
+            self._pending[task.title] = task
+
+    def _uncount(self, title: str) -> None:
+        """Removes what a task used to contribute to the running aggregates."""
+        seconds = self._completion_seconds.pop(title, None)
+        if seconds is not None:
+            self._total_completion_seconds -= seconds
+            if not self._completion_seconds:
+                # Resetting once nothing is left keeps floating point drift from piling
+                # up
+                self._total_completion_seconds = 0.0
+
+
+def task_to_record(t: Task) -> dict:
+    """Formats a task into a JSON serializable dictionary.
+
+    Parameters:
+            - t: Task
+                    the task to be formatted
+
+    Returns:
+            - dict
+                    the record as it is stored in the data file
+    """
+    return {
+        "title": t.title,
+        "description": t.description,
+        "completed": t.completed,
+        "created_at": t.created_at.isoformat(),
+        "completion_time": (str(t.completion_time) if t.completion_time else None),
+    }
+
+
+def record_to_task(task: dict) -> Task:
+    """Validates a record read from the data file and builds a Task from it.
+
+    Parameters:
+            - task: dict
+                    the record as it is stored in the data file
+
+    Returns:
+            - Task
+
+    Raises:
+            - ValueError
+                    if the record has missing fields or logical issues
+    """
+    if not isinstance(task, dict):
+        raise ValueError("*** Every task in the data file has to be a JSON object. ***")
+
+    title = task.get("title")
+    description = task.get("description")
+    completed = task.get("completed")
+    created_at = task.get("created_at")
+    completion_time = (
+        task.get("completion_time") if task.get("completion_time") else None
+    )
+
+    # Wrongly typed fields would otherwise fail further down with a TypeError
+    valid_types = (
+        isinstance(title, str)
+        and isinstance(description, str)
+        and isinstance(completed, bool)
+        and isinstance(created_at, str)
+        and (completion_time is None or isinstance(completion_time, str))
+    )
+    if not valid_types:
+        raise ValueError(_INVALID_TASK)
+    created_at = datetime.fromisoformat(created_at)
+
+    # Bad Data Checks
+    logic_1 = completed and completion_time is None
+    logic_2 = not completed and completion_time is not None
+    logic_3 = title is None
+    logic_4 = description is None
+    logic_5 = created_at is None
+    logic_6 = completed and completion_time is None
+
+    # Weed out illogical task objects
+    if logic_1 or logic_2 or logic_3 or logic_4 or logic_5 or logic_6:
+        raise ValueError(_INVALID_TASK)
+    return Task(title, description, completed, created_at, completion_time)
+
+
+def task_to_record_v2(t: Task) -> dict:
+    """Formats a task into a record of schema version 2, timestamps and durations in
+    integer microseconds.
+
+    Parameters:
+            - t: Task
+                    the task to be formatted
+
+    Returns:
+            - dict
+                    the record as it is stored in a version 2 data file
+    """
+    created_at = to_epoch_us(t.created_at)
+    completion = completion_microseconds(t.completion_time) if t.completed else None
+    return {
+        "title": t.title,
+        "description": t.description,
+        "completed": t.completed,
+        "created_at": created_at,
+        "completed_at": created_at + completion if completion is not None else None,
+        "completion_us": completion,
+    }
+
+
+def record_to_task_v2(record: dict) -> Task:
+    """Validates a record of schema version 2 and builds a Task from it, with integer
+    arithmetic only.
+
+    Parameters:
+            - record: dict
+                    the record as it is stored in a version 2 data file
+
+    Returns:
+            - Task
+                    its completion time is a timedelta
+
+    Raises:
+            - ValueError
+                    if the record has missing fields or logical issues
+    """
+    if not isinstance(record, dict):
+        raise ValueError("*** Every task in the data file has to be a JSON object. ***")
+
+    title = record.get("title")
+    description = record.get("description")
+    completed = record.get("completed")
+    created_at = record.get("created_at")
+    completion = record.get("completion_us")
+
+    valid = (
+        isinstance(title, str)
+        and isinstance(description, str)
+        and isinstance(completed, bool)
+        and _is_int(created_at)
+        and (_is_int(completion) if completed else completion is None)
+    )
+    if not valid or (completed and not 0 <= completion <= _MAX_COMPLETION_US):
+        raise ValueError(_INVALID_TASK)
+    try:
+        created_at = from_epoch_us(created_at)
+    except OverflowError:
+        # Beyond the years a datetime can hold
+        raise ValueError(_INVALID_TASK) from None
+    completion_time = timedelta(microseconds=completion) if completed else None
+    return Task(title, description, completed, created_at, completion_time)
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def record_reader(version: int):
+    """The function validating a record of a schema version into a Task."""
+    return record_to_task if version == 1 else record_to_task_v2
+
+
+def record_writer(version: int):
+    """The function formatting a Task into a record of a schema version."""
+    return task_to_record if version == 1 else task_to_record_v2
+
+
+def schema_header(version: int) -> dict:
+    """The first line of a data file of schema version 2 and later."""
+    return {"schema": SCHEMA_NAME, "version": version}
+
+
+def detect_schema(f) -> int:
+    """
+    Detects the schema version of a data file: a JSON array is version 1, later versions
+    start with a header line. An empty file is version 1. The file is rewound.
+
+    Parameters:
+            - f: file object
+                    the data file, open in text mode
+
+    Returns:
+            - int
+                    one of SCHEMA_VERSIONS
+
+    Raises:
+            - ValueError
+                    if the file starts with a header of an unknown version
+    """
+    f.seek(0)
+    start = f.read(64).lstrip()
+    f.seek(0)
+    if not start.startswith("{"):
+        return 1
+
+    line = f.readline()
+    f.seek(0)
+    try:
+        header = json.loads(line)
+    except json.JSONDecodeError:
+        header = None
+    if not isinstance(header, dict) or header.get("schema") != SCHEMA_NAME:
+        raise ValueError(
+            "*** The data file has to start with a JSON array of tasks or a schema "
+            "header. ***"
+        )
+    version = header.get("version")
+    if version not in SCHEMA_VERSIONS or version == 1:
+        raise ValueError(
+            f"*** The data file has schema version {version}, only versions "
+            f"{', '.join(map(str, SCHEMA_VERSIONS))} are supported. ***"
+        )
+    return version
+
+
+def iter_file_records(
+    f, version: int | None = None
+) -> Iterator[tuple[int, object, RawJSON]]:
+    """
+    Yields the records of a data file of any schema version one at a time, without
+    validating them.
+
+    Parameters:
+            - f: file object
+                    the data file, open in text mode
+            - version: int | None
+                    the schema version of the file, detected when None
+
+    Returns:
+            - Iterator[tuple[int, object, RawJSON]]
+                    the byte offset of each record, the parsed record and its text
+
+    Raises:
+            - ValueError
+                    if the file is malformed, along with the byte offset
+    """
+    if version is None:
+        version = detect_schema(f)
+    f.seek(0)
+    if version == 1:
+        yield from iter_json_array_text(f)
+        return
+    lines = iter_json_lines(f)
+    # The header was checked by detect_schema
+    next(lines, None)
+    yield from lines
+
+
+def iter_file_tasks(f, version: int | None = None) -> Iterator[Task]:
+    """
+    Validates and builds the tasks of a data file of any schema version one at a time.
+
+    Parameters:
+            - f: file object
+                    the data file, open in text mode
+            - version: int | None
+                    the schema version of the file, detected when None
+
+    Returns:
+            - Iterator[Task]
+
+    Raises:
+            - ValueError
+                    if the file is malformed or a task has logical issues, along with
+                    the byte offset of the first offending record
+    """
+    if version is None:
+        version = detect_schema(f)
+    to_task = record_reader(version)
+    for offset, record, _ in iter_file_records(f, version):
+        try:
+            task = to_task(record)
+        except ValueError as e:
+            raise ValueError(
+                f"{e}\n -   The first malformed task starts at byte offset {offset}."
+            ) from None
+        yield task
+
+
+def format_record(record: object, version: int, indent: int | None = 4) -> RawJSON:
+    """
+    Formats a record the way write_records writes it, so the text can be kept and
+    written again as it is.
+
+    Parameters:
+            - record: object
+                    a record formatted for the schema version, see record_writer
+            - version: int
+                    one of SCHEMA_VERSIONS
+            - indent: int | None
+                    the indentation of a version 1 file, version 2 files hold one
+                    compact record per line
+
+    Returns:
+            - RawJSON
+    """
+    return format_element(record, indent) if version == 1 else format_line(record)
+
+
+def write_records(
+    records: Iterable[object], f, version: int, indent: int | None = 4
+) -> None:
+    """
+    Writes records formatted for a schema version (see record_writer) as a data file of
+    that version.
+
+    Parameters:
+            - records: Iterable[object]
+                    the records, RawJSON ones are written as they are
+            - f: file object
+                    the file to write to
+            - version: int
+                    one of SCHEMA_VERSIONS
+            - indent: int | None
+                    the indentation of a version 1 file, version 2 files hold one record
+                    per line
+
+    Returns:
+            - None
+    """
+    if version == 1:
+        write_json_array(records, f, indent)
+    else:
+        write_json_lines(records, f, schema_header(version))
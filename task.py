@@ -1,4 +1,5 @@
-from datetime import datetime
+import math
+from datetime import datetime, timedelta
 
 
 class Task:
@@ -24,12 +25,108 @@ class Task:
         title: str,
         description: str,
         completed: bool = False,
-        created_at: datetime = datetime.now(),
+        created_at: datetime | None = None,
         completion_time: str | None = None,
     ):
-        """Initializes a new task with the given parameters"""
+        """
+        Initializes a new task with the given parameters, created_at defaults to now
+        """
         self.title = title
         self.description = description
         self.completed = completed
-        self.created_at = created_at
+        # A datetime.now() default would be evaluated once, and every task created by
+        # the same process would share it
+        self.created_at = created_at if created_at is not None else datetime.now()
         self.completion_time = completion_time
+
+
+# Timestamps are naive wall clock datetimes. The columnar and binary formats keep them
+# as microseconds since this epoch, which is plain arithmetic both ways and involves no
+# timezone conversion.
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_us(moment: datetime) -> int:
+    """Converts a naive datetime into microseconds since EPOCH."""
+    return (moment - EPOCH) // MICROSECOND
+
+
+def from_epoch_us(microseconds: int) -> datetime:
+    """Converts microseconds since EPOCH back into a naive datetime."""
+    return EPOCH + timedelta(microseconds=microseconds)
+
+
+def parse_timestamp(text: str | None) -> datetime | None:
+    """
+    Parses a date or a time given on the command line or in an operation, e.g.
+    2024-06-03 or 2024-06-03T09:30. A time with a UTC offset is converted into the naive
+    local time tasks are created in.
+
+    Parameters:
+        - text: str | None
+            an ISO 8601 date or time, or None
+
+    Returns:
+        - datetime | None
+            None if text is None
+
+    Raises:
+        - ValueError
+            if text is not an ISO 8601 date or time
+    """
+    if text is None:
+        return None
+    try:
+        moment = datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        raise ValueError(
+            f"*** '{text}' is not a date or a time, use e.g. 2024-06-03 or "
+            "2024-06-03T09:30. ***"
+        ) from None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+def completion_seconds(completion_time: str | timedelta) -> float:
+    """
+    Converts a completion time into seconds. Completion times are stored as
+    str(timedelta), which looks like "2:03:12.000001" or "1 day, 2:03:12" for durations
+    of a day and more, but a freshly completed task still holds the timedelta itself.
+
+    Parameters:
+        - completion_time: str | timedelta
+            the completion time of a task
+
+    Returns:
+        - float
+            the completion time in seconds
+    """
+    if isinstance(completion_time, timedelta):
+        return completion_time.total_seconds()
+
+    days = 0
+    if "day" in completion_time:
+        day_part, completion_time = completion_time.split(", ")
+        days = int(day_part.split(" ")[0])
+
+    h, m, s = map(float, completion_time.split(":"))
+    return days * 86400 + h * 3600 + m * 60 + s
+
+
+def task_completion_seconds(task: Task) -> float:
+    """
+    The completion time of a completed task in seconds, 0 if it has not been recorded
+    (yet).
+    """
+    return completion_seconds(task.completion_time) if task.completion_time else 0.0
+
+
+def completion_microseconds(completion_time: str | timedelta | None) -> int:
+    """Converts a completion time into whole microseconds, 0 if there is none."""
+    if not completion_time:
+        return 0
+    if isinstance(completion_time, timedelta):
+        return completion_time // MICROSECOND
+    return math.floor(completion_seconds(completion_time) * 1e6 + 0.5)
@@ -1,6 +1,19 @@
+from contextlib import nullcontext
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+from search_index import SearchIndex
 from storage import Storage
-from task import Task
-from datetime import datetime, timedelta
+from task import Task, to_epoch_us
+from time_index import TimeIndex, scan_created, scan_range
+from datetime import datetime
+
+# The per-task status codes of add_tasks and complete_tasks, one byte per task, and
+# their names
+OK = 0
+EXISTS = 1
+ALREADY_COMPLETED = 2
+NOT_FOUND = 3
+STATUS_NAMES = ("ok", "exists", "already_completed", "not_found")
 
 
 class TaskManager:
@@ -13,11 +26,19 @@ class TaskManager:
     Attributes:
         - storage: Storage
             the main Storage object the class manages
+        - index_time_ranges: bool
+            whether the first time range query attaches a time index to a Storage, see
+            generate_report
     """
 
-    def __init__(self, storage: Storage):
-        """Initialized a new TaskManager with a given Storage object."""
+    def __init__(self, storage: Storage, index_time_ranges: bool = False):
+        """
+        Initialized a new TaskManager with a given Storage object. A long-lived process
+        answering many time range queries (the daemon, AsyncTaskManager) sets
+        index_time_ranges, a single command scans instead.
+        """
         self.storage = storage
+        self.index_time_ranges = index_time_ranges
 
     def add_task(self, title: str, description: str):
         """
@@ -38,7 +59,8 @@ class TaskManager:
 
         """
         task = Task(title, description)
-        saved = self.storage.save_task(task)
+        with self._locked():
+            saved = self.storage.save_task(task)
         return saved
 
     def complete_task(self, title: str) -> (bool, int):
@@ -57,27 +79,125 @@ class TaskManager:
                 if the Task does not exist in storage
         """
 
-        task = self.storage.get_task(title)
+        with self._locked():
+            task = self.storage.get_task(title)
+
+            if task:
+                if task.completed:
+                    return False, 1
+
+                # The approximate timestamp for when the task was declared to be
+                # completed.
+                completed_at = datetime.fromisoformat(datetime.now().isoformat())
+                self._complete(task, completed_at)
+                return True, 1
+            return False, -1
+
+    def add_tasks(
+        self,
+        tasks: Iterable[tuple[str, str]],
+        persist: Callable[[], None] | None = None,
+    ) -> bytes:
+        """
+        Adds many tasks at once, in a single pass that checks every title against the
+        storage before a Task is built for it. The first of two tasks with the same
+        title wins, like with add_task.
+
+        Parameters:
+            - tasks: Iterable[tuple[str, str]]
+                the title and the description of every new task
+            - persist: Callable[[], None] | None
+                writes the storage, e.g. a call to utils.update_data_file, called once
+                after the batch if it added anything
+
+        Returns:
+            - bytes
+                the status of every task in order, OK if it was added or EXISTS if the
+                title was taken
+        """
+        # A title added earlier in the batch is in the storage already, so one lookup
+        # covers both
+        contains = self._title_lookup()
+        save_task = self.storage.save_task
+        statuses = bytearray()
+        with self._locked():
+            for title, description in tasks:
+                if contains(title):
+                    statuses.append(EXISTS)
+                else:
+                    statuses.append(
+                        OK if save_task(Task(title, description)) else EXISTS
+                    )
+
+        if persist is not None and OK in statuses:
+            persist()
+        return bytes(statuses)
+
+    def complete_tasks(
+        self, titles: Iterable[str], persist: Callable[[], None] | None = None
+    ) -> bytes:
+        """
+        Completes many tasks at once. They all share the same completion timestamp,
+        taken when the batch starts.
+
+        Parameters:
+            - titles: Iterable[str]
+                the titles of the tasks to complete
+            - persist: Callable[[], None] | None
+                writes the storage, e.g. a call to utils.update_data_file, called once
+                after the batch if it completed anything
+
+        Returns:
+            - bytes
+                the status of every title in order: OK if the task was completed,
+                ALREADY_COMPLETED, or NOT_FOUND, the same outcomes as complete_task
+        """
+        completed_at = datetime.now()
+        get_task = self.storage.get_task
+        statuses = bytearray()
+        with self._locked():
+            for title in titles:
+                task = get_task(title)
+                if task is None:
+                    statuses.append(NOT_FOUND)
+                elif task.completed:
+                    statuses.append(ALREADY_COMPLETED)
+                else:
+                    self._complete(task, completed_at)
+                    statuses.append(OK)
 
-        if task:
-            if task.completed:
-                return False, 1
+        if persist is not None and OK in statuses:
+            persist()
+        return bytes(statuses)
 
-            task.completed = True
+    def _complete(self, task: Task, completed_at: datetime) -> None:
+        """Marks a task completed at the given time and saves it."""
+        task.completed = True
 
-            # The approximate timestamp for when the task was declared to be completed.
-            completed_at = datetime.fromisoformat(datetime.now().isoformat())
-            created_at = task.created_at
+        # The approximate time taken for the task to be completed calculated using the
+        # differences between when it was completed and when it was created. The
+        # completion time is updated from None to the time taken.
+        task.completion_time = completed_at - task.created_at
+        self.storage.update_task(task)
 
-            # The approximate time taken for the task to be completed calculated using the differences between when
-            # it was completed and when it was created.
-            time_taken = completed_at - created_at
+    def _locked(self):
+        """
+        The lock of the background flusher of the storage, so it never writes a command
+        half applied.
+        """
+        flusher = getattr(self.storage, "flusher", None)
+        return flusher.lock if flusher is not None else nullcontext()
 
-            # The completion time is updated from None to the time taken.
-            task.completion_time = time_taken
-            self.storage.update_task(task)
-            return True, 1
-        return False, -1
+    def _title_lookup(self) -> Callable[[str], bool]:
+        """
+        Checks whether a title is taken, straight in the task dict of a Storage, through
+        get_task otherwise.
+        """
+        tasks = getattr(self.storage, "tasks", None)
+        if isinstance(tasks, dict):
+            return tasks.__contains__
+        get_task = self.storage.get_task
+        return lambda title: get_task(title) is not None
 
     def list_tasks(self, include_completed: bool = False) -> list[Task] | None:
         """
@@ -93,49 +213,263 @@ class TaskManager:
         if include_completed:
             return self.storage.get_all_tasks()
         else:
-            return [task for task in self.storage.get_all_tasks() if not task.completed]
+            return self.storage.get_pending_tasks()
+
+    def iter_tasks(
+        self,
+        include_completed: bool = False,
+        limit: int | None = None,
+        offset: int = 0,
+        after: str | None = None,
+        created_after: datetime | None = None,
+        created_before: datetime | None = None,
+    ) -> Iterator[Task]:
+        """
+        Lazily yields a page of tasks in the order they were added, without building the
+        whole list. Storages with an iter_tasks method stream their tasks, the others
+        are paged over their lists. With created_after or created_before, only the tasks
+        created in that range are yielded, by creation time, from the time index when
+        there is one (see generate_report).
+
+        Parameters:
+            include_completed: bool = False (default)
+                the flag that checks if we want all or just the pending tasks
+            limit: int | None = None (default)
+                the maximum number of tasks, None for no limit
+            offset: int = 0 (default)
+                the number of tasks to skip first
+            after: str | None = None (default)
+                the title of the last task of the previous page, the page starts right
+                after it. Unlike an offset, it keeps pointing at the same place while
+                tasks are added and completed.
+            created_after: datetime | None = None (default)
+                the earliest creation time of the tasks, included
+            created_before: datetime | None = None (default)
+                the creation time the tasks have to be created before, excluded
+
+        Returns:
+            An iterator over the tasks of the page
+
+        Raises:
+            ValueError if created_after is not before created_before, or if there is no
+            task titled after (in the range) when the iterator is first advanced
+        """
+        if created_after is not None or created_before is not None:
+            start, end = _range_us(created_after, created_before)
+            tasks = self._iter_created(include_completed, after, start, end)
+            return islice(tasks, offset, None if limit is None else offset + limit)
+
+        iterate = getattr(self.storage, "iter_tasks", None)
+        if iterate is not None:
+            tasks = iterate(include_completed, after)
+        else:
+            tasks = _iter_list(self.storage, include_completed, after)
+        return islice(tasks, offset, None if limit is None else offset + limit)
 
-    def generate_report(self) -> dict[str, (int | str)]:
+    def search_tasks(self, query: str, limit: int = 10) -> list[tuple[Task, float]]:
+        """
+        Searches the titles and descriptions of the tasks, see search_index.SearchIndex
+        for the query syntax. A Storage gets an index attached on the first search and
+        keeps it up to date from then on, other storages are indexed for every search.
+
+        Parameters:
+            query: str
+                tokens, prefixes ending with * and "quoted phrases", all of them have to
+                match
+            limit: int = 10 (default)
+                the maximum number of results
+
+        Returns:
+            The best matching tasks with their scores, best first
+        """
+        index = getattr(self.storage, "search_index", None)
+        if index is None:
+            if isinstance(self.storage, Storage):
+                index = self.storage.attach_search_index()
+            else:
+                index = SearchIndex.build(self.storage.get_all_tasks())
+        return [
+            (self.storage.get_task(title), score)
+            for title, score in index.search(query, self.storage.get_task, limit)
+        ]
+
+    def generate_report(
+        self,
+        self_check: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> dict[str, (int | str)]:
         """
         Generates a report containing the total number of tasks, the number of completed tasks and the number of
         pending tasks. Additionally, if there is one or more completed tasks the report also includes the
         average completion time.
-        """
 
-        tasks = self.storage.get_all_tasks()
-        total_tasks = len(tasks)
-        completed_tasks = len([task for task in tasks if task.completed])
-        completion_times_list = [
-            task.completion_time for task in tasks if task.completed
-        ]
+        With since or until, the report only covers the tasks created in that range, and
+        also counts the tasks completed in it whenever they were created. Both come from
+        the time index of the storage when it has one (see time_index.TimeIndex), which
+        only looks at the tasks of the range, otherwise every task is scanned once. With
+        index_time_ranges, a Storage gets the index attached on the first range query.
 
-        if completed_tasks > 0:
-            total_completion_times = timedelta()
+        Parameters:
+            self_check: bool = False (default)
+                recomputes the aggregates from every task first and raises an
+                AssertionError if the ones maintained by the storage do not match
+            since: datetime | None = None (default)
+                the start of the range, included
+            until: datetime | None = None (default)
+                the end of the range, excluded
 
-            for completion_time in completion_times_list:
-                h, m, s = map(float, completion_time.split(":"))
-                total_completion_times += timedelta(hours=h, minutes=m, seconds=s)
+        Raises:
+            ValueError if since is not before until
+        """
+        if self_check:
+            self.storage.check_report_stats()
 
-            total_completion_seconds = total_completion_times.total_seconds()
+        completed_in_range = None
+        if since is not None or until is not None:
+            start, end = _range_us(since, until)
+            index = self._time_index()
+            if index is not None:
+                total_tasks, completed_tasks, avg_completion_seconds = (
+                    index.range_stats(start, end)
+                )
+                completed_in_range = index.count_completed(start, end)
+            elif isinstance(self.storage, Storage):
+                (
+                    total_tasks,
+                    completed_tasks,
+                    avg_completion_seconds,
+                    completed_in_range,
+                ) = self.storage.scan_time_range(start, end)
+            else:
+                (
+                    total_tasks,
+                    completed_tasks,
+                    avg_completion_seconds,
+                    completed_in_range,
+                ) = scan_range(self.storage.get_all_tasks(), start, end)
+        else:
+            # The storage computes the aggregates, so a database backed storage never
+            # has to hand over every task
+            total_tasks, completed_tasks, avg_completion_seconds = (
+                self.storage.get_report_stats()
+            )
 
-            avg_completion_seconds = total_completion_seconds / completed_tasks
+        report = {
+            "total": total_tasks,
+            "completed": completed_tasks,
+            "pending": total_tasks - completed_tasks,
+        }
+        if completed_in_range is not None:
+            report["completed in range"] = completed_in_range
+
+        if completed_tasks > 0:
             avg_hours = int(avg_completion_seconds // 3600)
             avg_minutes = int((avg_completion_seconds % 3600) // 60)
             avg_seconds = int(avg_completion_seconds % 60)
 
             avg_completion_time = f"{avg_hours:02} hours - {avg_minutes:02} minutes - {avg_seconds:02} seconds"
+            report["average completion time"] = avg_completion_time
+
+        return report
 
-            report = {
-                "total": total_tasks,
-                "completed": completed_tasks,
-                "pending": total_tasks - completed_tasks,
-                "average completion time": avg_completion_time,
-            }
+    def generate_detailed_report(self, period: str = "day", bins: int = 10) -> dict:
+        """
+        Generates a report for capacity planning with completion time percentiles, a
+        completion time histogram and the number of tasks completed per day or week.
+        Needs NumPy, see analytics.detailed_report.
+
+        Parameters:
+            period: str = "day" (default)
+                "day" or "week", the period the throughput is counted by
+            bins: int = 10 (default)
+                the number of buckets of the completion time histogram
+        """
+        # Imported here so NumPy is only loaded when a detailed report is asked for
+        import analytics
+
+        return analytics.detailed_report(self.storage, period, bins)
+
+    def _time_index(self) -> TimeIndex | None:
+        """
+        The time index of the storage, None when range queries should scan the tasks
+        instead. With index_time_ranges, a Storage gets one attached on the first range
+        query and keeps it up to date from then on. Building it costs more than a scan,
+        so it is not built for a single query.
+        """
+        index = getattr(self.storage, "time_index", None)
+        if (
+            index is None
+            and self.index_time_ranges
+            and isinstance(self.storage, Storage)
+        ):
+            index = self.storage.attach_time_index()
+        return index
+
+    def _iter_created(
+        self,
+        include_completed: bool,
+        after: str | None,
+        start: int | None,
+        end: int | None,
+    ):
+        """
+        Yields the tasks created in a range by creation time, the pending ones only
+        unless include_completed.
+        """
+        get_task = self.storage.get_task
+        cursor = None
+        if after is not None:
+            cursor = get_task(after)
+            if cursor is None:
+                raise ValueError(
+                    f"*** There is no task titled '{after}' to continue after. ***"
+                )
+        index = self._time_index()
+        if index is not None:
+            tasks = map(get_task, index.iter_created(start, end, cursor))
         else:
-            report = {
-                "total": total_tasks,
-                "completed": completed_tasks,
-                "pending": total_tasks - completed_tasks,
-            }
+            tasks = scan_created(self.storage.get_all_tasks(), start, end, cursor)
+        for task in tasks:
+            if include_completed or not task.completed:
+                yield task
 
-        return report
+
+def _range_us(
+    start: datetime | None, end: datetime | None
+) -> tuple[int | None, int | None]:
+    """
+    Converts the bounds of a time range into the timestamps of the time index, checking
+    they are in order.
+    """
+    if start is not None and end is not None and start >= end:
+        raise ValueError(
+            "*** The start of the time range has to be before its end. ***"
+        )
+    return (
+        None if start is None else to_epoch_us(start),
+        None if end is None else to_epoch_us(end),
+    )
+
+
+def _iter_list(storage, include_completed: bool, after: str | None) -> Iterator[Task]:
+    """Pages over the lists of a storage without iter_tasks."""
+    if after is None:
+        yield from (
+            storage.get_all_tasks()
+            if include_completed
+            else storage.get_pending_tasks()
+        )
+        return
+
+    tasks = iter(storage.get_all_tasks())
+    for task in tasks:
+        if task.title == after:
+            break
+    else:
+        raise ValueError(
+            f"*** There is no task titled '{after}' to continue after. ***"
+        )
+    for task in tasks:
+        if include_completed or not task.completed:
+            yield task
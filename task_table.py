@@ -0,0 +1,322 @@
+from array import array
+from datetime import timedelta
+from typing import Iterator
+
+from storage import detect_schema, iter_file_tasks, task_to_record, write_records
+from task import Task, completion_microseconds, from_epoch_us, to_epoch_us
+
+
+class TaskTable:
+    """
+    A columnar storage for large datasets. It has the same interface as storage.Storage,
+    so the TaskManager can use either of them.
+
+    Instead of one Task object per task, every field is kept in a column indexed by row:
+        - created_at: array of int64, microseconds since task.EPOCH
+        - completion: array of int64, completion time in microseconds (0 while pending)
+        - completed: a bitmap, one bit per row
+        - titles: the title strings, shared with the title -> row index
+        - descriptions: interned, every distinct description is stored once and rows
+          refer to it by id
+
+    Task objects are only built as views when a task is fetched or listed. Changing a
+    view has no effect on the table until it is passed to update_task.
+
+    Attributes:
+        - changed: bool
+            whether tasks were saved or updated since the table was loaded or last
+            written
+        - schema_version: int
+            the schema version dump writes, the one of the file last loaded (see
+            storage.SCHEMA_VERSIONS)
+    """
+
+    def __init__(self):
+        """Initializes an empty table."""
+        self._rows: dict[str, int] = {}
+        self._titles: list[str] = []
+
+        self._description_ids: dict[str, int] = {}
+        self._descriptions: list[str] = []
+        self._description_column = array("I")
+
+        self._created_at = array("q")
+        self._completion = array("q")
+        self._completed = bytearray()
+
+        self._completed_count = 0
+        self._total_completion = 0
+        self.changed = False
+        self.schema_version = 1
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def save_task(self, task: Task) -> bool:
+        """
+        Adds a new task to the table
+
+        Parameters:
+            - task: Task
+                the task to be added
+
+        Returns:
+            - True: bool
+                if the save was successful
+            - False: bool
+                if there is an existing task with matching titles
+        """
+        if task.title in self._rows:
+            return False
+
+        row = len(self._titles)
+        self._rows[task.title] = row
+        self._titles.append(task.title)
+        self._description_column.append(self._intern(task.description))
+        self._created_at.append(to_epoch_us(task.created_at))
+        self._completion.append(0)
+        if row % 8 == 0:
+            self._completed.append(0)
+
+        self._set_completion(row, task)
+        self.changed = True
+        return True
+
+    def update_task(self, updated_task: Task) -> None:
+        """
+        Updates an existing task in the table, or adds it if it does not exist.
+
+        Parameters:
+            - updated_task: Task
+                the task with the updated details
+
+        Returns:
+            - None
+        """
+        row = self._rows.get(updated_task.title)
+        if row is None:
+            self.save_task(updated_task)
+            return
+
+        self._description_column[row] = self._intern(updated_task.description)
+        self._created_at[row] = to_epoch_us(updated_task.created_at)
+        self._set_completion(row, updated_task)
+        self.changed = True
+
+    def get_task(self, title: str) -> Task | None:
+        """Builds a view of a task by its title
+
+        Parameters:
+            - title: str
+                title of the task to be fetched
+
+        Returns:
+            - Task | None
+                Task object if found else None
+        """
+        row = self._rows.get(title)
+        return self._view(row) if row is not None else None
+
+    def get_all_tasks(self) -> list[Task]:
+        """Returns views of all the tasks in the table.
+
+        Returns:
+            list[Tasks]
+        """
+        return [self._view(row) for row in range(len(self._titles))]
+
+    def get_pending_tasks(self) -> list[Task]:
+        """Returns views of the tasks that have not been completed yet.
+
+        Returns:
+            list[Tasks]
+        """
+        return [
+            self._view(row)
+            for row in range(len(self._titles))
+            if not self._is_completed(row)
+        ]
+
+    def iter_tasks(
+        self, include_completed: bool = True, after: str | None = None
+    ) -> Iterator[Task]:
+        """Yields views of the tasks one at a time in row order.
+
+        Parameters:
+            - include_completed: bool
+                False yields the pending tasks only
+            - after: str | None
+                the title of a task to start after, its row is found through the title
+                index
+
+        Returns:
+            - Iterator[Task]
+
+        Raises:
+            - ValueError
+                if there is no task titled after
+        """
+        start = 0
+        if after is not None:
+            row = self._rows.get(after)
+            if row is None:
+                raise ValueError(
+                    f"*** There is no task titled '{after}' to continue after. ***"
+                )
+            start = row + 1
+
+        for row in range(start, len(self._titles)):
+            if include_completed or not self._is_completed(row):
+                yield self._view(row)
+
+    def get_report_stats(self) -> tuple[int, int, float | None]:
+        """Returns the aggregates the report is built from, they are maintained as tasks
+        are saved and updated.
+
+        Returns:
+            - tuple[int, int, float | None]
+                the total number of tasks, the number of completed tasks and the average
+                completion time in seconds (None if no task has been completed)
+        """
+        completed = self._completed_count
+        average = self._total_completion / completed / 1e6 if completed else None
+        return len(self._titles), completed, average
+
+    def get_time_columns(self) -> tuple[array, array, bytearray]:
+        """Returns the columns the detailed report is computed from, as they are (no
+        copy).
+
+        Returns:
+            - tuple[array, array, bytearray]
+                created_at in microseconds since task.EPOCH (int64), completion times in
+                microseconds (int64, 0 while pending) and the bitmap of the completed
+                tasks
+        """
+        return self._created_at, self._completion, self._completed
+
+    def check_report_stats(self) -> None:
+        """Recomputes the aggregates of the report from the columns and compares them
+        with the running ones.
+
+        Raises:
+            - AssertionError
+                if the running aggregates have drifted from the columns
+        """
+        rows = range(len(self._titles))
+        completed = sum(1 for row in rows if self._is_completed(row))
+        total_completion = sum(
+            self._completion[row] for row in rows if self._is_completed(row)
+        )
+        if (completed, total_completion) != (
+            self._completed_count,
+            self._total_completion,
+        ):
+            raise AssertionError(
+                f"*** The report aggregates are out of sync with the tasks. ***"
+                f"\n -   Maintained: {self._completed_count} completed, "
+                f"{self._total_completion} microseconds"
+                f"\n -   Recomputed: {completed} completed, {total_completion} "
+                "microseconds"
+            )
+
+    def load_tasks(self, f) -> None:
+        """
+        Loads tasks from a file into the table, one record at a time.
+
+        Parameters:
+            - f: file object
+                the file to read tasks from in JSON format
+
+        Returns:
+            - None
+
+        Raises:
+            - ValueError
+                if the file is malformed or a task has logical issues
+        """
+        # The loaded tasks are what the file already holds, loading does not change the
+        # table
+        changed = self.changed
+        self.schema_version = detect_schema(f)
+        for task in iter_file_tasks(f, self.schema_version):
+            self.save_task(task)
+        self.changed = changed
+
+    def dump(self, f, indent: int | None = 4) -> None:
+        """Formats each task into JSON and dumps all of it into a JSON file, one task at
+        a time.
+
+        Parameters:
+            - f: file object
+                a file object to write the tasks in JSON format
+            - indent: int | None
+                the indentation of the JSON, None writes it without line breaks
+
+        Returns:
+            - None
+        """
+        rows = range(len(self._titles))
+        if self.schema_version == 1:
+            records = (task_to_record(self._view(row)) for row in rows)
+        else:
+            # The columns already hold the microseconds of schema version 2, no view is
+            # built
+            records = map(self._record_v2, rows)
+        write_records(records, f, self.schema_version, indent)
+
+    def _record_v2(self, row: int) -> dict:
+        """The record of a row in schema version 2, see storage.task_to_record_v2."""
+        completed = self._is_completed(row)
+        created_at = self._created_at[row]
+        completion = self._completion[row] if completed else None
+        return {
+            "title": self._titles[row],
+            "description": self._descriptions[self._description_column[row]],
+            "completed": completed,
+            "created_at": created_at,
+            "completed_at": created_at + completion if completed else None,
+            "completion_us": completion,
+        }
+
+    def _intern(self, description: str) -> int:
+        """
+        Returns the id of a description, storing it if it has not been seen before.
+        """
+        description_id = self._description_ids.get(description)
+        if description_id is None:
+            description_id = len(self._descriptions)
+            self._description_ids[description] = description_id
+            self._descriptions.append(description)
+        return description_id
+
+    def _is_completed(self, row: int) -> bool:
+        return bool(self._completed[row >> 3] & (1 << (row & 7)))
+
+    def _set_completion(self, row: int, task: Task) -> None:
+        """
+        Writes the completion columns of a row and keeps the report aggregates in sync.
+        """
+        if self._is_completed(row):
+            self._completed_count -= 1
+            self._total_completion -= self._completion[row]
+
+        if task.completed:
+            completion = completion_microseconds(task.completion_time)
+            self._completed[row >> 3] |= 1 << (row & 7)
+            self._completed_count += 1
+            self._total_completion += completion
+        else:
+            completion = 0
+            self._completed[row >> 3] &= ~(1 << (row & 7)) & 0xFF
+        self._completion[row] = completion
+
+    def _view(self, row: int) -> Task:
+        """Builds a Task from a row."""
+        completed = self._is_completed(row)
+        return Task(
+            self._titles[row],
+            self._descriptions[self._description_column[row]],
+            completed,
+            from_epoch_us(self._created_at[row]),
+            str(timedelta(microseconds=self._completion[row])) if completed else None,
+        )
@@ -0,0 +1,97 @@
+import os
+import subprocess
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+from storage import Storage
+from task import Task
+from task_manager import TaskManager
+from task_table import TaskTable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipUnless(numpy, "the detailed report needs NumPy")
+class TestDetailedReport(unittest.TestCase):
+    def setUp(self) -> None:
+        # A Wednesday
+        self.test_date = datetime.fromisoformat("2024-09-18T10:00:00")
+
+    def fill(self, storage) -> TaskManager:
+        for i in range(1, 101):
+            storage.save_task(
+                Task(
+                    f"Task {i}",
+                    "Description",
+                    True,
+                    self.test_date + timedelta(days=i % 7),
+                    str(timedelta(seconds=i)),
+                )
+            )
+        storage.save_task(
+            Task("Pending Task", "Description", created_at=self.test_date)
+        )
+        return TaskManager(storage)
+
+    def test_percentiles_histogram_and_counts(self) -> None:
+        for storage in (Storage(), TaskTable()):
+            report = self.fill(storage).generate_detailed_report(bins=4)
+
+            self.assertEqual(
+                (report["total"], report["completed"], report["pending"]), (101, 100, 1)
+            )
+            percentiles = report["completion time percentiles (seconds)"]
+            self.assertAlmostEqual(percentiles["p50"], 50.5)
+            self.assertAlmostEqual(percentiles["p99"], 99.01)
+
+            histogram = report["completion time histogram (seconds)"]
+            self.assertEqual(
+                [bucket["count"] for bucket in histogram], [25, 25, 25, 25]
+            )
+            self.assertEqual(histogram[0]["from"], 1.0)
+            self.assertEqual(histogram[-1]["to"], 100.0)
+
+    def test_throughput_per_day_and_week(self) -> None:
+        manager = self.fill(TaskTable())
+
+        per_day = manager.generate_detailed_report("day")["completed per day"]
+        self.assertEqual(len(per_day), 7)
+        self.assertEqual(sum(per_day.values()), 100)
+        self.assertEqual(per_day["2024-09-18"], 14)
+
+        # Wednesday to Sunday fall into the week of Monday the 16th, the rest into the
+        # next one
+        per_week = manager.generate_detailed_report("week")["completed per week"]
+        self.assertEqual(list(per_week), ["2024-09-16", "2024-09-23"])
+        self.assertEqual(sum(per_week.values()), 100)
+
+    def test_nothing_completed(self) -> None:
+        report = TaskManager(Storage()).generate_detailed_report()
+        self.assertEqual(report, {"total": 0, "completed": 0, "pending": 0})
+
+    def test_unknown_period(self) -> None:
+        with self.assertRaises(ValueError):
+            TaskManager(Storage()).generate_detailed_report("month")
+
+
+class TestLazyImport(unittest.TestCase):
+    def test_task_manager_does_not_load_numpy(self) -> None:
+        # In a fresh interpreter, since this one may have NumPy loaded already
+        code = "import sys, task_manager; print('numpy' in sys.modules)"
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from async_task_manager import AsyncTaskManager
+from benchmarks.bench_async import async_clients, blocking_clients, measure
+from benchmarks.datasets import write_dataset
+from sqlite_storage import SqliteStorage
+from storage import Storage
+
+
+class TestAsyncTaskManager(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.temp_dir.name, "tasks.json")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def read_titles(self) -> list[str]:
+        with open(self.data_file, "r") as f:
+            return [record["title"] for record in json.load(f)]
+
+    def test_commands(self) -> None:
+        async def scenario() -> None:
+            async with AsyncTaskManager(self.data_file, Storage()) as manager:
+                self.assertTrue(await manager.add_task("Task 1", "Description 1"))
+                self.assertFalse(await manager.add_task("Task 1", "Description 1"))
+                self.assertEqual(self.read_titles(), ["Task 1"])
+                self.assertEqual(await manager.complete_task("Task 1"), (True, 1))
+                self.assertEqual(await manager.complete_task("Missing"), (False, -1))
+                self.assertEqual(await manager.list_tasks(), [])
+                self.assertEqual(
+                    len(await manager.list_tasks(include_completed=True)), 1
+                )
+                report = await manager.generate_report(self_check=True)
+                self.assertEqual((report["total"], report["completed"]), (1, 1))
+                # Only the add and the completion changed anything
+                self.assertEqual(manager.writes, 2)
+
+        asyncio.run(scenario())
+
+    def test_concurrent_writes_are_coalesced(self) -> None:
+        async def scenario() -> AsyncTaskManager:
+            async with AsyncTaskManager(self.data_file, Storage()) as manager:
+                added = await asyncio.gather(
+                    *(manager.add_task(f"Task {i}", "Description") for i in range(50))
+                )
+                self.assertTrue(all(added))
+                self.assertEqual(len(self.read_titles()), 50)
+            return manager
+
+        manager = asyncio.run(scenario())
+        self.assertLess(manager.writes, 50)
+
+    def test_without_autoflush(self) -> None:
+        async def scenario() -> None:
+            async with AsyncTaskManager(
+                self.data_file, Storage(), autoflush=False
+            ) as manager:
+                await manager.add_task("Task 1", "Description 1")
+                self.assertEqual(self.read_titles(), [])
+                await manager.flush()
+                self.assertEqual(self.read_titles(), ["Task 1"])
+                await manager.add_task("Task 2", "Description 2")
+            self.assertEqual(self.read_titles(), ["Task 1", "Task 2"])
+
+        asyncio.run(scenario())
+
+    def test_sqlite_storage_stays_on_one_thread(self) -> None:
+        database = os.path.join(self.temp_dir.name, "tasks.sqlite3")
+
+        async def scenario() -> None:
+            async with AsyncTaskManager(database, SqliteStorage()) as manager:
+                await asyncio.gather(
+                    *(manager.add_task(f"Task {i}", "Description") for i in range(10))
+                )
+                self.assertEqual((await manager.generate_report())["total"], 10)
+
+        asyncio.run(scenario())
+
+    def test_event_loop_stalls_less_than_with_blocking_calls(self) -> None:
+        write_dataset(self.data_file, 10_000)
+        copy = os.path.join(self.temp_dir.name, "copy.json")
+        shutil.copy(self.data_file, copy)
+
+        _, blocking_stalls, _ = asyncio.run(
+            measure(blocking_clients, self.data_file, 5)
+        )
+        _, async_stalls, writes = asyncio.run(measure(async_clients, copy, 5))
+        self.assertLess(max(async_stalls), max(blocking_stalls) / 2)
+        self.assertLess(writes, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
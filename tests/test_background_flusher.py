@@ -0,0 +1,196 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from background_flusher import BackgroundFlusher
+from journal_storage import JournalStorage
+from lazy_storage import LazyStorage
+from storage import Storage
+from task_manager import TaskManager
+from utils import create_data_file, update_data_file
+
+
+class TestBackgroundFlusher(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.temp_dir.name, "tasks.json")
+        self.storage = Storage()
+        create_data_file(self.data_file, self.storage)
+
+    def tearDown(self) -> None:
+        if self.storage.flusher is not None:
+            self.storage.flusher.close()
+        self.temp_dir.cleanup()
+
+    def read_records(self, data_file: str | None = None) -> list[dict]:
+        with open(data_file or self.data_file, "r") as f:
+            return json.load(f)
+
+    def test_flush_every(self) -> None:
+        flusher = BackgroundFlusher(
+            self.data_file, self.storage, flush_interval=60, flush_every=10
+        )
+        manager = TaskManager(self.storage)
+        for i in range(10):
+            manager.add_task(f"Task {i}", "Description")
+
+        deadline = time.monotonic() + 5
+        while flusher.commits == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(flusher.stats()["commits"], 1)
+        self.assertEqual(flusher.stats()["mutations_per_commit"], 10)
+        self.assertEqual(len(self.read_records()), 10)
+
+    def test_flush_interval(self) -> None:
+        flusher = BackgroundFlusher(
+            self.data_file, self.storage, flush_interval=0.05, flush_every=1000
+        )
+        TaskManager(self.storage).add_task("Task 1", "Description")
+        self.assertEqual(self.read_records(), [])
+
+        deadline = time.monotonic() + 5
+        while flusher.commits == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(
+            [record["title"] for record in self.read_records()], ["Task 1"]
+        )
+        self.assertFalse(self.storage.changed)
+
+    def test_explicit_flush_and_close(self) -> None:
+        flusher = BackgroundFlusher(
+            self.data_file, self.storage, flush_interval=60, flush_every=1000
+        )
+        manager = TaskManager(self.storage)
+        manager.add_task("Task 1", "Description")
+        manager.complete_task("Task 1")
+        flusher.flush()
+        self.assertEqual(flusher.recent_batches[-1], 2)
+        self.assertTrue(self.read_records()[0]["completed"])
+
+        manager.add_task("Task 2", "Description")
+        flusher.close()
+        flusher.close()
+        self.assertEqual(len(self.read_records()), 2)
+        self.assertIsNone(self.storage.flusher)
+        self.assertEqual((flusher.commits, flusher.mutations), (2, 3))
+
+    def test_later_writes_reuse_the_kept_text(self) -> None:
+        # Tasks written by an earlier commit are written again from the text kept for
+        # them
+        flusher = BackgroundFlusher(
+            self.data_file,
+            self.storage,
+            flush_interval=60,
+            flush_every=1000,
+            compact=True,
+        )
+        manager = TaskManager(self.storage)
+        manager.add_tasks((f"Task {i}", "Description") for i in range(20))
+        flusher.flush()
+        manager.complete_tasks(["Task 3", "Task 7"])
+        manager.add_task("Task 20", "Description")
+        flusher.close()
+
+        with open(self.data_file, "r") as f:
+            content = f.read()
+        self.assertNotIn("\n", content)
+        reloaded = Storage()
+        create_data_file(self.data_file, reloaded)
+        self.assertEqual(len(reloaded.tasks), 21)
+        self.assertEqual(reloaded.get_report_stats()[1], 2)
+
+    def test_writes_the_same_file_as_update_data_file(self) -> None:
+        for version, compact in ((1, False), (1, True), (2, False)):
+            with self.subTest(version=version, compact=compact):
+                storage = Storage()
+                storage.schema_version = version
+                data_file = os.path.join(
+                    self.temp_dir.name, f"v{version}-{compact}.json"
+                )
+                flusher = BackgroundFlusher(
+                    data_file,
+                    storage,
+                    flush_interval=60,
+                    flush_every=1000,
+                    compact=compact,
+                )
+                manager = TaskManager(storage)
+                manager.add_tasks((f"Task {i}", "Description") for i in range(5))
+                flusher.flush()
+                manager.complete_task("Task 2")
+                flusher.close()
+                with open(data_file, "r") as f:
+                    flushed = f.read()
+
+                storage.changed = True
+                update_data_file(data_file, storage, compact=compact)
+                with open(data_file, "r") as f:
+                    self.assertEqual(f.read(), flushed)
+
+    def test_concurrent_commands(self) -> None:
+        flusher = BackgroundFlusher(
+            self.data_file, self.storage, flush_interval=0.001, flush_every=50
+        )
+        manager = TaskManager(self.storage)
+
+        def add(start: int) -> None:
+            for i in range(start, start + 500):
+                manager.add_task(f"Task {i}", "Description")
+                if i % 3 == 0:
+                    manager.complete_task(f"Task {i}")
+
+        threads = [
+            threading.Thread(target=add, args=(start,)) for start in (0, 500, 1000)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        flusher.close()
+
+        self.assertEqual(flusher.mutations, 2000)
+        self.assertEqual(flusher.errors, 0)
+        reloaded = Storage()
+        create_data_file(self.data_file, reloaded)
+        self.assertEqual(len(reloaded.tasks), 1500)
+        self.assertEqual(reloaded.get_report_stats()[1], 500)
+
+    def test_max_unwritten_bounds_the_batches(self) -> None:
+        flusher = BackgroundFlusher(
+            self.data_file,
+            self.storage,
+            flush_interval=60,
+            flush_every=10,
+            max_unwritten=20,
+        )
+        manager = TaskManager(self.storage)
+        for i in range(2000):
+            manager.add_task(f"Task {i}", "Description")
+        flusher.close()
+
+        self.assertLessEqual(flusher.max_batch, 21)
+        self.assertEqual(flusher.mutations, 2000)
+        self.assertEqual(len(self.read_records()), 2000)
+
+    def test_other_storages(self) -> None:
+        self.storage = JournalStorage(self.data_file)
+        create_data_file(self.data_file, self.storage)
+        flusher = BackgroundFlusher(self.data_file, self.storage)
+        TaskManager(self.storage).add_task("Task 1", "Description")
+        flusher.close()
+        self.storage.close()
+
+        reloaded = JournalStorage(self.data_file)
+        create_data_file(self.data_file, reloaded)
+        self.assertEqual(len(reloaded.get_all_tasks()), 1)
+        reloaded.close()
+
+        with self.assertRaises(ValueError):
+            BackgroundFlusher(self.data_file, LazyStorage())
+
+
+if __name__ == "__main__":
+    unittest.main()
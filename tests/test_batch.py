@@ -0,0 +1,178 @@
+import io
+import json
+import unittest
+
+from batch import apply_operation, run_batch, write_results, write_tasks
+from storage import Storage
+from task_manager import TaskManager
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.manager = TaskManager(Storage())
+
+    def test_operations(self) -> None:
+        add = {"op": "add", "title": "Task 1", "description": "Description 1"}
+        self.assertEqual(
+            apply_operation(self.manager, add),
+            {"ok": True, "status": "added", "title": "Task 1"},
+        )
+        self.assertEqual(apply_operation(self.manager, add)["status"], "exists")
+
+        complete = {"op": "complete", "title": "Task 1"}
+        self.assertEqual(apply_operation(self.manager, complete)["status"], "completed")
+        self.assertEqual(
+            apply_operation(self.manager, complete)["status"], "already_completed"
+        )
+        self.assertEqual(
+            apply_operation(self.manager, {"op": "complete", "title": "Ghost"})[
+                "status"
+            ],
+            "not_found",
+        )
+
+        self.assertEqual(apply_operation(self.manager, {"op": "list"})["tasks"], [])
+        self.assertEqual(
+            apply_operation(self.manager, {"op": "list", "all": True})["tasks"],
+            [{"title": "Task 1", "completed": True}],
+        )
+        report = apply_operation(self.manager, {"op": "report", "check": True})[
+            "report"
+        ]
+        self.assertEqual((report["total"], report["completed"]), (1, 1))
+
+    def test_invalid_operations(self) -> None:
+        for op in ({"op": "delete"}, ["add"], {"op": "add", "title": "No description"}):
+            with self.assertRaises(ValueError):
+                apply_operation(self.manager, op)
+
+    def test_integer_fields_are_checked(self) -> None:
+        self.manager.add_task("Task 1", "Description")
+        ops = [
+            {"op": "list", "limit": "10"},
+            {"op": "list", "offset": [1]},
+            {"op": "list", "offset": -1},
+            {"op": "list", "limit": True},
+            {"op": "search", "query": "task", "limit": 2.5},
+            {"op": "report", "detailed": True, "bins": 0},
+        ]
+        for op in ops:
+            with self.subTest(op=op), self.assertRaises(ValueError):
+                apply_operation(self.manager, op)
+
+        # Null is the default, a list without a limit lists everything
+        listed = apply_operation(
+            self.manager, {"op": "list", "limit": None, "offset": None}
+        )
+        self.assertEqual(listed["tasks"], [{"title": "Task 1", "completed": False}])
+        results = list(run_batch(self.manager, ['{"op": "list", "limit": "all"}']))
+        self.assertEqual(results[0]["status"], "error")
+
+    def test_boolean_and_string_fields_are_checked(self) -> None:
+        self.manager.add_task("Task 1", "Description")
+        self.manager.complete_task("Task 1")
+        ops = [
+            {"op": "list", "after": ["x"]},
+            {"op": "list", "after": 1},
+            {"op": "list", "all": "no"},
+            {"op": "list", "records": 1},
+            {"op": "report", "check": "no"},
+            {"op": "report", "detailed": "no"},
+            {"op": "report", "detailed": True, "period": ["day"]},
+        ]
+        for op in ops:
+            with self.subTest(op=op), self.assertRaises(ValueError):
+                apply_operation(self.manager, op)
+
+        # Null is the default, a list without "all" lists the pending tasks only
+        listed = apply_operation(
+            self.manager, {"op": "list", "all": None, "after": None}
+        )
+        self.assertEqual(listed["tasks"], [])
+        listed = apply_operation(self.manager, {"op": "list", "all": True})
+        self.assertEqual(listed["tasks"], [{"title": "Task 1", "completed": True}])
+
+    def test_errors_do_not_stop_the_batch(self) -> None:
+        lines = [
+            '{"op": "add", "title": "Task 1", "description": "Description 1"}\n',
+            "\n",
+            "not json\n",
+            '{"op": "complete", "title": "Task 1"}\n',
+        ]
+        out = io.StringIO()
+        count, _ = write_results(run_batch(self.manager, lines), out)
+
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(count, 3)
+        self.assertEqual([r["line"] for r in results], [1, 3, 4])
+        self.assertEqual(
+            [r["status"] for r in results], ["added", "error", "completed"]
+        )
+
+    def test_tasks_of_a_batch_get_their_own_creation_time(self) -> None:
+        run = run_batch(
+            self.manager,
+            [
+                f'{{"op": "add", "title": "Task {i}", "description": "D"}}'
+                for i in range(2)
+            ],
+        )
+        list(run)
+        first, second = self.manager.list_tasks()
+        self.assertLessEqual(first.created_at, second.created_at)
+        self.assertIsNot(first.created_at, second.created_at)
+
+    def test_paged_list_operation(self) -> None:
+        for i in range(4):
+            self.manager.add_task(f"Task {i}", "Description")
+        result = apply_operation(
+            self.manager, {"op": "list", "after": "Task 0", "limit": 2, "records": True}
+        )
+        self.assertEqual(
+            [task["title"] for task in result["tasks"]], ["Task 1", "Task 2"]
+        )
+        self.assertEqual(result["tasks"][0]["description"], "Description")
+
+    def test_write_tasks_formats(self) -> None:
+        records = [
+            {
+                "title": "Task 1",
+                "description": "Tab\there\nnewline",
+                "completed": False,
+                "created_at": "2024-09-15T17:26:07",
+                "completion_time": None,
+            },
+            {
+                "title": "Task 2",
+                "description": "Back\\slash",
+                "completed": True,
+                "created_at": "2024-09-15T17:26:08",
+                "completion_time": "0:01:00",
+            },
+        ]
+        outputs = {}
+        for fmt in ("text", "ndjson", "tsv"):
+            out = io.StringIO()
+            # A chunk size of 1 writes every line on its own, the output has to be the
+            # same
+            self.assertEqual(write_tasks(iter(records), fmt, out, chunk_size=1), 2)
+            outputs[fmt] = out.getvalue()
+
+        self.assertEqual(outputs["text"], "Task 1 - Pending\nTask 2 - Completed\n")
+        self.assertEqual(
+            [json.loads(line) for line in outputs["ndjson"].splitlines()], records
+        )
+        self.assertEqual(
+            outputs["tsv"].splitlines(),
+            [
+                "title\tdescription\tcompleted\tcreated_at\tcompletion_time",
+                "Task 1\tTab\\there\\nnewline\tfalse\t2024-09-15T17:26:07\t",
+                "Task 2\tBack\\\\slash\ttrue\t2024-09-15T17:26:08\t0:01:00",
+            ],
+        )
+        with self.assertRaises(ValueError):
+            write_tasks(records, "xml", io.StringIO())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from benchmarks.compare import compare
+from benchmarks.datasets import generate_records, parse_size
+from benchmarks.suite import run_suite
+from storage import record_to_task
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_parse_size(self) -> None:
+        self.assertEqual(
+            [parse_size(size) for size in ("500", "10k", "10M", "2.5k")],
+            [500, 10_000, 10_000_000, 2500],
+        )
+        with self.assertRaises(ValueError):
+            parse_size("lots")
+
+    def test_datasets_are_deterministic_and_valid(self) -> None:
+        records = list(generate_records(1000, completed_ratio=0.3, seed=7))
+        self.assertEqual(
+            records, list(generate_records(1000, completed_ratio=0.3, seed=7))
+        )
+        self.assertNotEqual(
+            records, list(generate_records(1000, completed_ratio=0.3, seed=8))
+        )
+        self.assertEqual(sum(record["completed"] for record in records), 300)
+        for record in records:
+            record_to_task(record)
+
+    def test_compare_flags_regressions(self) -> None:
+        def results(*rows):
+            return {
+                "results": [
+                    dict(
+                        zip(
+                            ("benchmark", "size", "seconds", "peak_bytes"),
+                            row,
+                            strict=True,
+                        )
+                    )
+                    for row in rows
+                ]
+            }
+
+        baseline = results(
+            ("load_tasks", 1000, 0.100, 1000),
+            ("dump", 1000, 0.100, 1000),
+            ("list_tasks", 1000, 1e-5, 10),
+        )
+        current = results(
+            ("load_tasks", 1000, 0.105, 1000),
+            ("dump", 1000, 0.150, 1000),
+            # Three times slower, but by less than the timer noise
+            ("list_tasks", 1000, 3e-5, 20),
+            ("add_task", 1000, 0.1, None),
+        )
+        rows = compare(baseline, current, threshold=0.1)
+        self.assertEqual(
+            [(row["benchmark"], row["regression"]) for row in rows],
+            [("load_tasks", False), ("dump", True), ("list_tasks", True)],
+        )
+        self.assertAlmostEqual(rows[1]["time_ratio"], 1.5)
+        self.assertEqual(rows[2]["memory_ratio"], 2.0)
+
+    def test_run_suite(self) -> None:
+        results = run_suite(sizes=[50], repeat=1, operations=10, memory=False)
+        names = [row["benchmark"] for row in results["results"]]
+        self.assertIn("load_tasks", names)
+        self.assertIn("generate_report", names)
+        self.assertEqual(len(names), 10)
+        self.assertTrue(
+            all(row["seconds"] >= 0 and row["size"] == 50 for row in results["results"])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
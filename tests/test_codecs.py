@@ -0,0 +1,141 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks.datasets import generate_records
+from data_codecs import CODECS, codec_of, open_text
+from journal_storage import JournalStorage
+from lazy_storage import LazyStorage
+from storage import Storage, task_to_record
+from task import Task
+from task_table import TaskTable
+from utils import create_data_file, update_data_file
+
+
+class TestCodecs(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.records = list(generate_records(50, completed_ratio=0.4))
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory.name, name)
+
+    def write(self, data_file: str, records) -> None:
+        with open_text(data_file, "w") as f:
+            json.dump(records, f, indent=4)
+
+    def test_codec_of(self) -> None:
+        self.assertEqual(codec_of("tasks.json.gz"), "gz")
+        self.assertEqual(codec_of("./data/tasks.json.xz"), "xz")
+        self.assertEqual(codec_of("tasks.json.bz2"), "bz2")
+        self.assertIsNone(codec_of("tasks.json"))
+        self.assertIsNone(codec_of("tasks.gz"))
+        self.assertIsNone(codec_of("tasks.txt.gz"))
+
+    def test_round_trip(self) -> None:
+        for codec in CODECS:
+            for store_class in (Storage, TaskTable, LazyStorage):
+                with self.subTest(codec=codec, store=store_class.__name__):
+                    data_file = self.path(f"{store_class.__name__}.json.{codec}")
+                    self.write(data_file, self.records)
+
+                    store = store_class()
+                    create_data_file(data_file, store)
+                    self.assertEqual(
+                        [task_to_record(task) for task in store.get_all_tasks()],
+                        self.records,
+                    )
+
+                    store.update_task(store.get_task(self.records[0]["title"]))
+                    update_data_file(data_file, store)
+                    self.assertFalse(os.path.exists(data_file + ".tmp"))
+                    with CODECS[codec].open(data_file, "rt", encoding="utf-8") as f:
+                        self.assertEqual(json.load(f), self.records)
+
+    def test_compact(self) -> None:
+        for name in ("tasks.json", "tasks.json.gz"):
+            with self.subTest(name=name):
+                data_file = self.path(name)
+                self.write(data_file, self.records)
+                store = Storage()
+                create_data_file(data_file, store)
+                store.changed = True
+                update_data_file(data_file, store, compact=True)
+
+                with open_text(data_file, "r") as f:
+                    content = f.read()
+                self.assertNotIn("\n", content)
+                self.assertEqual(json.loads(content), self.records)
+
+    def test_missing_and_empty_files(self) -> None:
+        for codec in CODECS:
+            with self.subTest(codec=codec):
+                missing, empty = self.path(f"missing.json.{codec}"), self.path(
+                    f"empty.json.{codec}"
+                )
+                open(empty, "w").close()
+                for data_file in (missing, empty):
+                    store = Storage()
+                    create_data_file(data_file, store)
+                    self.assertEqual(store.get_all_tasks(), [])
+                    with CODECS[codec].open(data_file, "rt", encoding="utf-8") as f:
+                        self.assertEqual(f.read(), "[]")
+
+    def test_malformed_files(self) -> None:
+        # Data that is not compressed at all, and a task with logical issues inside a
+        # valid stream
+        data_file = self.path("tasks.json.gz")
+        with open(data_file, "w") as f:
+            json.dump(self.records, f)
+        with self.assertRaises(ValueError) as context:
+            create_data_file(data_file, Storage())
+        self.assertIn("not a valid .gz file", str(context.exception))
+
+        self.write(data_file, [dict(self.records[0], completed="yes")])
+        with self.assertRaises(ValueError):
+            create_data_file(data_file, Storage())
+
+    def test_unsupported_extensions(self) -> None:
+        for name in ("tasks.txt", "tasks.gz", "tasks.csv.gz"):
+            with self.subTest(name=name), self.assertRaises(ValueError):
+                create_data_file(self.path(name), Storage())
+
+    def test_identical_content_compresses_identically(self) -> None:
+        data_file = self.path("tasks.json.gz")
+        self.write(data_file, self.records)
+        store = Storage()
+        create_data_file(data_file, store)
+
+        outputs = []
+        for _ in range(2):
+            store.changed = True
+            update_data_file(data_file, store)
+            with open(data_file, "rb") as f:
+                outputs.append(f.read())
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(json.loads(gzip.decompress(outputs[0])), self.records)
+
+    def test_journal_merges_into_a_compressed_snapshot(self) -> None:
+        data_file = self.path("tasks.json.xz")
+        self.write(data_file, self.records[:10])
+        store = JournalStorage(data_file)
+        create_data_file(data_file, store)
+        store.save_task(Task("Journaled", "Description"))
+        store.compact(wait=True)
+        store.close()
+        with CODECS["xz"].open(data_file, "rt", encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)), 11)
+
+        reloaded = JournalStorage(data_file)
+        create_data_file(data_file, reloaded)
+        self.assertEqual(len(reloaded.get_all_tasks()), 11)
+        reloaded.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
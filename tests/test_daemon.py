@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from batch import apply_operation
+from daemon import TaskDaemon
+from daemon_client import DaemonClient
+from storage import Storage
+from utils import update_data_file
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs Unix domain sockets")
+class TestDaemon(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.temp_dir.name, "tasks.json")
+        self.socket_path = os.path.join(self.temp_dir.name, "tasks.sock")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def read_titles(self) -> list[str]:
+        with open(self.data_file, "r") as f:
+            return [record["title"] for record in json.load(f)]
+
+    def run_daemon(self, scenario, **policy) -> TaskDaemon:
+        """
+        Serves the data file while scenario(client) runs in a thread, then shuts the
+        daemon down.
+        """
+        daemon = TaskDaemon(self.data_file, Storage(), self.socket_path, **policy)
+
+        def client_side() -> None:
+            client = DaemonClient.connect(self.socket_path)
+            try:
+                scenario(client)
+                self.assertEqual(
+                    client.request({"op": "shutdown"})["status"], "stopping"
+                )
+            finally:
+                client.close()
+
+        async def serve_and_run() -> None:
+            server = asyncio.create_task(daemon.serve())
+            while not os.path.exists(self.socket_path):
+                await asyncio.sleep(0.01)
+            await asyncio.to_thread(client_side)
+            await server
+
+        asyncio.run(serve_and_run())
+        return daemon
+
+    def test_operations_and_flush_on_shutdown(self) -> None:
+        def scenario(client: DaemonClient) -> None:
+            add = {"op": "add", "title": "Task 1", "description": "Description 1"}
+            self.assertEqual(client.request(add)["status"], "added")
+            self.assertEqual(client.request(add)["status"], "exists")
+            self.assertEqual(
+                client.request({"op": "complete", "title": "Task 1"})["status"],
+                "completed",
+            )
+            self.assertEqual(client.request_line("not json")["status"], "error")
+            report = client.request({"op": "report", "check": True})["report"]
+            self.assertEqual((report["total"], report["completed"]), (1, 1))
+            # Nothing has been written yet with the default policy
+            self.assertEqual(self.read_titles(), [])
+
+        self.run_daemon(scenario)
+        self.assertEqual(self.read_titles(), ["Task 1"])
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_flush_every(self) -> None:
+        def scenario(client: DaemonClient) -> None:
+            client.request({"op": "add", "title": "Task 1", "description": "D"})
+            self.assertEqual(self.read_titles(), [])
+            client.request({"op": "add", "title": "Task 2", "description": "D"})
+            self.assertEqual(self.read_titles(), ["Task 1", "Task 2"])
+
+        self.run_daemon(scenario, flush_every=2, flush_interval=60)
+
+    def test_operation_failing_unexpectedly_still_gets_flushed(self) -> None:
+        daemon = TaskDaemon(self.data_file, Storage(), self.socket_path, flush_every=1)
+
+        def add_then_fail(manager, op):
+            apply_operation(manager, op)
+            raise RuntimeError("unexpected")
+
+        with patch("daemon.apply_operation", add_then_fail), self.assertRaises(
+            RuntimeError
+        ):
+            asyncio.run(
+                daemon.apply({"op": "add", "title": "Task 1", "description": "D"})
+            )
+        self.assertEqual(self.read_titles(), ["Task 1"])
+
+    def test_flush_interval_and_explicit_flush(self) -> None:
+        def scenario(client: DaemonClient) -> None:
+            client.request({"op": "add", "title": "Task 1", "description": "D"})
+            for _ in range(100):
+                time.sleep(0.01)
+                if os.path.getsize(self.data_file) > 2:
+                    break
+            # Give the write that was just noticed time to finish
+            time.sleep(0.05)
+            self.assertEqual(self.read_titles(), ["Task 1"])
+
+            client.request({"op": "add", "title": "Task 2", "description": "D"})
+            self.assertEqual(client.request({"op": "flush"})["status"], "flushed")
+            self.assertEqual(self.read_titles(), ["Task 1", "Task 2"])
+
+        self.run_daemon(scenario, flush_interval=0.05)
+
+    def test_listing_is_written_in_pages(self) -> None:
+        def scenario(client: DaemonClient) -> None:
+            for i in range(5):
+                client.request({"op": "add", "title": f"Task {i}", "description": "D"})
+            titles = [f"Task {i}" for i in range(5)]
+
+            client.connection.sendall(b'{"op": "list"}\n')
+            pages = [json.loads(client.reader.readline()) for _ in range(3)]
+            self.assertEqual([page["more"] for page in pages], [True, True, False])
+            self.assertEqual([len(page["tasks"]) for page in pages], [2, 2, 1])
+
+            self.assertEqual(
+                [task["title"] for task in client.request({"op": "list"})["tasks"]],
+                titles,
+            )
+            self.assertEqual(
+                [task["title"] for task in client.iter_tasks({"op": "list"})], titles
+            )
+            with self.assertRaises(ValueError):
+                list(client.iter_tasks({"op": "list", "after": "Task 9"}))
+            # The connection is still in step after an error
+            self.assertEqual(
+                client.request({"op": "list", "limit": 1})["tasks"][0]["title"],
+                "Task 0",
+            )
+
+        with patch("daemon.LIST_PAGE_SIZE", 2):
+            self.run_daemon(scenario)
+
+    def test_flush_runs_off_the_event_loop(self) -> None:
+        threads = []
+
+        def record_thread(*args, **kwargs) -> None:
+            threads.append(threading.get_ident())
+            update_data_file(*args, **kwargs)
+
+        def scenario(client: DaemonClient) -> None:
+            client.request({"op": "add", "title": "Task 1", "description": "D"})
+            self.assertEqual(client.request({"op": "flush"})["status"], "flushed")
+            self.assertEqual(self.read_titles(), ["Task 1"])
+
+        with patch("daemon.update_data_file", record_thread):
+            self.run_daemon(scenario)
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    def test_no_daemon(self) -> None:
+        self.assertIsNone(DaemonClient.connect(self.socket_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
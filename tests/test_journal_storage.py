@@ -0,0 +1,152 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from journal_storage import JournalStorage, _merge_into_snapshot
+from storage import Storage
+from task import Task
+from utils import create_data_file, update_data_file
+
+
+class TestJournalStorage(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.temp_dir.name, "tasks.json")
+        self.test_date = datetime.fromisoformat("2024-09-16T17:19:22.056316")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def open_storage(self, **kwargs) -> JournalStorage:
+        storage = JournalStorage(self.data_file, **kwargs)
+        create_data_file(self.data_file, storage)
+        return storage
+
+    def test_mutations_are_appended_not_rewritten(self) -> None:
+        storage = self.open_storage()
+        storage.save_task(Task("Task 1", "Description 1", created_at=self.test_date))
+        update_data_file(self.data_file, storage)
+        storage.close()
+
+        # The snapshot stays untouched, the change only lives in the journal
+        with open(self.data_file, "r") as f:
+            self.assertEqual(json.load(f), [])
+        with open(self.data_file + ".journal", "r") as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]["op"], "save")
+        self.assertEqual(entries[0]["task"]["title"], "Task 1")
+
+    def test_journal_is_replayed_on_load(self) -> None:
+        storage = self.open_storage()
+        task = Task("Task 1", "Description 1", created_at=self.test_date)
+        storage.save_task(task)
+        task.completed = True
+        task.completion_time = "0:03:12.057624"
+        storage.update_task(task)
+        storage.save_task(Task("Task 2", "Description 2", created_at=self.test_date))
+        storage.close()
+
+        reloaded = self.open_storage()
+        self.assertEqual(list(reloaded.tasks.keys()), ["Task 1", "Task 2"])
+        self.assertTrue(reloaded.get_task("Task 1").completed)
+        self.assertEqual(reloaded.get_task("Task 1").completion_time, "0:03:12.057624")
+        reloaded.close()
+
+    def test_duplicate_save_is_not_journaled(self) -> None:
+        storage = self.open_storage()
+        self.assertTrue(storage.save_task(Task("Task 1", "Description 1")))
+        self.assertFalse(storage.save_task(Task("Task 1", "Other Description")))
+        storage.close()
+
+        with open(self.data_file + ".journal", "r") as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_compaction_merges_journal_into_snapshot(self) -> None:
+        storage = self.open_storage()
+        for i in range(20):
+            storage.save_task(
+                Task(f"Task {i}", "Description", created_at=self.test_date)
+            )
+        self.assertTrue(storage.compact(wait=True))
+        storage.save_task(Task("Task 20", "Description", created_at=self.test_date))
+        storage.close()
+
+        with open(self.data_file, "r") as f:
+            self.assertEqual(len(json.load(f)), 20)
+        self.assertFalse(os.path.exists(self.data_file + ".journal.compacting"))
+
+        reloaded = self.open_storage()
+        self.assertEqual(len(reloaded.tasks), 21)
+        reloaded.close()
+
+    def test_failed_merge_keeps_the_snapshot_and_the_journal(self) -> None:
+        storage = self.open_storage()
+        storage.save_task(Task("Task 1", "Description 1", created_at=self.test_date))
+        storage.close()
+        rotated = self.data_file + ".journal.compacting"
+        os.replace(self.data_file + ".journal", rotated)
+
+        with patch.object(
+            Storage, "dump", side_effect=TypeError("unexpected")
+        ), self.assertRaises(TypeError):
+            _merge_into_snapshot(self.data_file, rotated)
+        with open(self.data_file, "r") as f:
+            self.assertEqual(json.load(f), [])
+        self.assertEqual(
+            sorted(os.listdir(self.temp_dir.name)),
+            ["tasks.json", "tasks.json.journal.compacting"],
+        )
+
+        # The next compaction merges them
+        _merge_into_snapshot(self.data_file, rotated)
+        with open(self.data_file, "r") as f:
+            self.assertEqual([record["title"] for record in json.load(f)], ["Task 1"])
+        self.assertFalse(os.path.exists(rotated))
+
+    def test_threshold_triggers_compaction(self) -> None:
+        storage = self.open_storage(compact_threshold=512)
+        for i in range(10):
+            storage.save_task(
+                Task(f"Task {i}", "Description", created_at=self.test_date)
+            )
+        storage.close()
+
+        reloaded = self.open_storage()
+        self.assertEqual(len(reloaded.tasks), 10)
+        with open(self.data_file, "r") as f:
+            self.assertGreater(len(json.load(f)), 0)
+        reloaded.close()
+
+    def test_torn_last_line_is_ignored(self) -> None:
+        storage = self.open_storage()
+        storage.save_task(Task("Task 1", "Description 1", created_at=self.test_date))
+        storage.close()
+        with open(self.data_file + ".journal", "a") as f:
+            f.write('{"op": "save", "task": {"title": "Task')
+
+        reloaded = self.open_storage()
+        self.assertEqual(list(reloaded.tasks.keys()), ["Task 1"])
+        reloaded.save_task(Task("Task 2", "Description 2", created_at=self.test_date))
+        reloaded.close()
+
+        # The torn record is cut off on replay so later appends start on a fresh line
+        reloaded = self.open_storage()
+        self.assertEqual(list(reloaded.tasks.keys()), ["Task 1", "Task 2"])
+        reloaded.close()
+
+    def test_corrupted_lines_are_reported(self) -> None:
+        for line in ("not json", '{"op": "save"}', "[1, 2]"):
+            with self.subTest(line=line):
+                with open(self.data_file + ".journal", "w") as f:
+                    f.write(line + "\n")
+                with self.assertRaises(ValueError) as raised:
+                    self.open_storage()
+                self.assertIn("corrupted at line 1", str(raised.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import io
+import json
+import os
+import unittest
+
+from json_stream import iter_json_array, write_json_array
+from storage import Storage
+
+
+class TestJsonStream(unittest.TestCase):
+    def setUp(self) -> None:
+        self.records = [
+            {"title": f"Task {i}", "description": "Désc ✓ " * i, "completed": False}
+            for i in range(50)
+        ]
+
+    def test_matches_json_load_for_any_chunk_size(self) -> None:
+        text = json.dumps(self.records, indent=4)
+        for chunk_size in (1, 7, 64, 1 << 16):
+            parsed = [
+                record for _, record in iter_json_array(io.StringIO(text), chunk_size)
+            ]
+            self.assertEqual(parsed, self.records)
+
+    def test_values_cut_by_any_chunk_boundary(self) -> None:
+        records = [
+            {
+                "completed": True,
+                "n": -12.5e-3,
+                "none": None,
+                "text": '\\ " é 😀 ' * 3,
+                "list": [False],
+            },
+            {
+                "completed": False,
+                "n": 1234567890123456789,
+                "nested": {"a": [1, 2, {"b": "c"}]},
+            },
+        ] * 3
+        text = json.dumps(records, separators=(",", ":"))
+        for chunk_size in range(1, 40):
+            parsed = [
+                record for _, record in iter_json_array(io.StringIO(text), chunk_size)
+            ]
+            self.assertEqual(parsed, records)
+
+    def test_malformed_record_fails_without_reading_on(self) -> None:
+        class CountingReader(io.StringIO):
+            read_chars = 0
+
+            def read(self, size: int = -1) -> str:
+                text = super().read(size)
+                self.read_chars += len(text)
+                return text
+
+        records = [
+            json.dumps({"title": f"Task {i}", "description": "Description"})
+            for i in range(100_000)
+        ]
+        records[50] = '{"title": "Task 50", "description": 12 34}'
+        f = CountingReader("[" + ",".join(records) + "]")
+        with self.assertRaises(ValueError) as context:
+            list(iter_json_array(f, chunk_size=1024))
+        self.assertIn(
+            f"byte offset {len('[' + ','.join(records[:50]) + ',')}",
+            str(context.exception),
+        )
+        self.assertLess(f.read_chars, 10_000)
+
+    def test_offsets_are_byte_offsets_of_each_record(self) -> None:
+        data = json.dumps(self.records, ensure_ascii=False).encode("utf-8")
+        f = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8")
+
+        for offset, record in iter_json_array(f, chunk_size=16):
+            end = offset + len(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+            self.assertEqual(json.loads(data[offset:end]), record)
+
+    def test_empty_array(self) -> None:
+        self.assertEqual(list(iter_json_array(io.StringIO(" [ ]\n"))), [])
+
+    def test_malformed_record_reports_offset(self) -> None:
+        text = '[{"title": "a"}, {"title": }]'
+        with self.assertRaises(ValueError) as context:
+            list(iter_json_array(io.StringIO(text), chunk_size=4))
+        self.assertIn("byte offset 17", str(context.exception))
+
+    def test_not_an_array(self) -> None:
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('{"title": "a"}')))
+
+    def test_trailing_data(self) -> None:
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO("[] []")))
+
+    def test_writer_matches_json_dump(self) -> None:
+        for records in ([], self.records[:1], self.records):
+            for indent in (None, 4):
+                f = io.StringIO()
+                write_json_array(iter(records), f, indent=indent)
+                self.assertEqual(f.getvalue(), json.dumps(records, indent=indent))
+
+    def test_storage_reports_offset_of_illogical_task(self) -> None:
+        tests_directory = os.path.dirname(os.path.abspath(__file__))
+        test_file_name = os.path.join(tests_directory, "load_test_3.json")
+
+        with open(test_file_name, "r") as f, self.assertRaises(ValueError) as context:
+            Storage().load_tasks(f)
+        self.assertIn("byte offset 6", str(context.exception))
+
+    def test_storage_reports_offset_of_wrongly_typed_fields(self) -> None:
+        valid = {
+            "title": "Task",
+            "description": "Description",
+            "completed": False,
+            "created_at": "2024-09-16T17:19:22",
+            "completion_time": None,
+        }
+        changes = [
+            {"created_at": 5},
+            {"title": 1},
+            {"completed": "no"},
+            {"completed": True, "completion_time": 3},
+        ]
+        for change in changes:
+            with self.subTest(change=change):
+                record = {**valid, **change}
+                data = "[" + json.dumps(valid) + ", " + json.dumps(record) + "]"
+                with self.assertRaises(ValueError) as context:
+                    Storage().load_tasks(io.StringIO(data))
+                self.assertIn(
+                    f"byte offset {len(json.dumps(valid)) + 3}", str(context.exception)
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
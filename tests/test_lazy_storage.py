@@ -0,0 +1,144 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from lazy_storage import LazyStorage
+from storage import Storage
+from task_manager import TaskManager
+from utils import create_data_file, update_data_file
+
+
+class TestLazyStorage(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.temp_dir.name, "tasks.json")
+        self.test_date = datetime.fromisoformat("2024-09-16T17:19:22.056316")
+        self.records = [
+            {
+                "title": "Task 1",
+                "description": "Description 1",
+                "completed": True,
+                "created_at": "2024-09-16T17:19:22.056316",
+                "completion_time": "1 day, 0:00:00",
+            },
+            {
+                "title": "Ünïcode Task",
+                "description": "Description ✓",
+                "completed": False,
+                "created_at": "2024-09-16T17:19:22.056316",
+                "completion_time": None,
+            },
+            {
+                "title": "Task 3",
+                "description": "Description 3",
+                "completed": True,
+                "created_at": "2024-09-16T17:19:22.056316",
+                "completion_time": "0:03:12.057624",
+            },
+        ]
+        # Not how json.dump would format it, so re-serialized records are easy to tell
+        # apart
+        self.text = (
+            "[\n    "
+            + ",\n    ".join(json.dumps(r, ensure_ascii=False) for r in self.records)
+            + "\n]"
+        )
+        with open(self.data_file, "w") as f:
+            f.write(self.text)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def open_storage(self) -> LazyStorage:
+        storage = LazyStorage()
+        create_data_file(self.data_file, storage)
+        return storage
+
+    def read_data_file(self) -> str:
+        with open(self.data_file, "r") as f:
+            return f.read()
+
+    def test_loading_builds_no_task(self) -> None:
+        storage = self.open_storage()
+        self.assertEqual(len(storage), 3)
+        self.assertEqual(storage._materialized, {})
+        total, completed, average = storage.get_report_stats()
+        self.assertEqual((total, completed), (3, 2))
+        self.assertAlmostEqual(average, (86400 + 192.057624) / 2)
+
+    def test_tasks_are_built_once_on_demand(self) -> None:
+        storage = self.open_storage()
+        task = storage.get_task("Task 3")
+        self.assertEqual(list(storage._materialized), ["Task 3"])
+        self.assertIs(storage.get_task("Task 3"), task)
+        self.assertEqual(task.created_at, self.test_date)
+        self.assertEqual(task.completion_time, "0:03:12.057624")
+        self.assertIsNone(storage.get_task("Ghost Task"))
+
+        self.assertEqual(
+            [t.title for t in storage.get_pending_tasks()], ["Ünïcode Task"]
+        )
+        self.assertEqual(sorted(storage._materialized), ["Task 3", "Ünïcode Task"])
+
+    def test_untouched_records_are_written_verbatim(self) -> None:
+        storage = self.open_storage()
+        storage.get_all_tasks()
+        update_data_file(self.data_file, storage)
+        self.assertEqual(self.read_data_file(), self.text)
+
+    def test_changes_are_written_back(self) -> None:
+        storage = self.open_storage()
+        manager = TaskManager(storage)
+        self.assertFalse(manager.add_task("Task 1", "Duplicate"))
+        self.assertTrue(manager.add_task("Task 4", "Description 4"))
+        self.assertEqual(manager.complete_task("Ünïcode Task"), (True, 1))
+        self.assertEqual(manager.complete_task("Task 1"), (False, 1))
+        manager.generate_report(self_check=True)
+        update_data_file(self.data_file, storage)
+
+        written = self.read_data_file()
+        self.assertIn(json.dumps(self.records[0], ensure_ascii=False), written)
+        reloaded = Storage()
+        with open(self.data_file, "r") as f:
+            reloaded.load_tasks(f)
+        self.assertEqual(
+            [(t.title, t.completed) for t in reloaded.get_all_tasks()],
+            [
+                ("Task 1", True),
+                ("Ünïcode Task", True),
+                ("Task 3", True),
+                ("Task 4", False),
+            ],
+        )
+        self.assertEqual(
+            reloaded.get_report_stats()[:2], storage.get_report_stats()[:2]
+        )
+
+    def test_update_of_untouched_record_takes_back_its_contribution(self) -> None:
+        storage = self.open_storage()
+        task = storage.get_task("Task 1")
+        task.completion_time = "0:00:10"
+        storage.update_task(task)
+        total, completed, average = storage.get_report_stats()
+        self.assertEqual((total, completed), (3, 2))
+        self.assertAlmostEqual(average, (10 + 192.057624) / 2)
+        storage.check_report_stats()
+
+    def test_malformed_records(self) -> None:
+        storage = LazyStorage()
+        with self.assertRaises(ValueError) as context:
+            storage.load_tasks(io.StringIO('[{"title": "a"}, {"description": "b"}]'))
+        self.assertIn("byte offset 17", str(context.exception))
+
+        storage = LazyStorage()
+        storage.load_tasks(io.StringIO('[{"title": "a", "completed": true}]'))
+        with self.assertRaises(ValueError) as context:
+            storage.get_task("a")
+        self.assertIn("'a'", str(context.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import argparse
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import batch
+import main
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.temp_dir.name, "tasks.json")
+        patcher = patch.multiple(
+            main, DATA_FILE=self.data_file, USE_CACHE=False, WORKERS=1
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_subcommand_flags_parse_next_to_the_profile_flags(self) -> None:
+        parser = main.build_parser()
+        for profile in (
+            [],
+            ["--profile"],
+            ["--profile-memory"],
+            ["--profile-dump", "stats.prof"],
+        ):
+            with self.subTest(profile=profile):
+                args = parser.parse_args(
+                    [*profile, "list", "--p", "--limit", "5", "--format", "tsv"]
+                )
+                self.assertEqual(
+                    (args.command, args.p, args.limit, args.format),
+                    ("list", False, 5, "tsv"),
+                )
+                args = parser.parse_args(
+                    [*profile, "report", "--check", "--detailed", "--period", "week"]
+                )
+                self.assertEqual(
+                    (args.check, args.detailed, args.period), (True, True, "week")
+                )
+                self.assertEqual(
+                    parser.parse_args(
+                        [*profile, "search", "query", "--limit", "3"]
+                    ).limit,
+                    3,
+                )
+                self.assertEqual(
+                    bool(profile) and profile[0] == "--profile", args.profile
+                )
+
+    def test_batch_aborted_by_an_unexpected_error_keeps_what_it_applied(self) -> None:
+        source = os.path.join(self.temp_dir.name, "ops.jsonl")
+        with open(source, "w") as f:
+            for i in range(3):
+                f.write(
+                    json.dumps(
+                        {
+                            "op": "add",
+                            "title": f"Task {i}",
+                            "description": "Description",
+                        }
+                    )
+                    + "\n"
+                )
+
+        apply_operation = batch.apply_operation
+
+        def fail_on_the_last_task(manager, op):
+            if op["title"] == "Task 2":
+                raise RuntimeError("unexpected")
+            return apply_operation(manager, op)
+
+        with (
+            patch("batch.apply_operation", fail_on_the_last_task),
+            patch("sys.stdout", io.StringIO()) as out,
+            self.assertRaises(RuntimeError),
+        ):
+            main.run_batch_command(argparse.Namespace(source=source), None)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+        with open(self.data_file, "r") as f:
+            self.assertEqual(
+                [record["title"] for record in json.load(f)], ["Task 0", "Task 1"]
+            )
+
+    def test_search_index_is_saved_by_a_search_and_removed_by_a_change(self) -> None:
+        index_file = self.data_file + ".search"
+        add = {"op": "add", "title": "Weekly report", "description": "Description"}
+        search = {"op": "search", "query": "report", "limit": 10}
+        main.run_operation(add)
+        main.run_operation(search)
+        # A pickle, only written when the caches are turned on
+        self.assertFalse(os.path.exists(index_file))
+
+        with patch.object(main, "USE_CACHE", True):
+            main.run_operation(search)
+            self.assertTrue(os.path.exists(index_file))
+            with patch("search_index.save_search_index") as save_search_index:
+                self.assertEqual(len(main.run_operation(search)["tasks"]), 1)
+            save_search_index.assert_not_called()
+
+            main.run_operation({"op": "complete", "title": "Weekly report"})
+            self.assertFalse(os.path.exists(index_file))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks.datasets import generate_records
+from parallel_load import load_tasks_parallel, split_records
+from storage import Storage
+from task_table import TaskTable
+
+
+class TestParallelLoad(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.directory.name, "tasks.json")
+        self.records = list(generate_records(200, completed_ratio=0.4))
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def write(self, records, indent: int | None = 4) -> None:
+        with open(self.data_file, "w") as f:
+            json.dump(records, f, indent=indent)
+
+    def load_sequentially(self, store):
+        with open(self.data_file, "r") as f:
+            store.load_tasks(f)
+        return store
+
+    def test_chunks_hold_whole_records(self) -> None:
+        self.write(self.records)
+        ranges = split_records(self.data_file, 8)
+        self.assertEqual(len(ranges), 8)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], os.path.getsize(self.data_file))
+        with open(self.data_file, "rb") as f:
+            data = f.read()
+        for start, _ in ranges[1:]:
+            self.assertEqual(data[start : start + 1], b"{")
+
+    def test_matches_the_sequential_load(self) -> None:
+        # The duplicate keeps the first task, like a sequential load
+        self.write(self.records + [dict(self.records[5], description="Duplicate")])
+        for store_class in (Storage, TaskTable):
+            expected = self.load_sequentially(store_class())
+            store = store_class()
+            load_tasks_parallel(store, self.data_file, workers=3)
+            self.assertEqual(
+                [
+                    (task.title, task.description, task.completed)
+                    for task in store.get_all_tasks()
+                ],
+                [
+                    (task.title, task.description, task.completed)
+                    for task in expected.get_all_tasks()
+                ],
+            )
+            self.assertEqual(store.get_report_stats(), expected.get_report_stats())
+            self.assertFalse(store.changed)
+
+    def test_single_line_file(self) -> None:
+        self.write(self.records, indent=None)
+        store = Storage()
+        load_tasks_parallel(store, self.data_file, workers=2)
+        self.assertEqual(len(store.tasks), 200)
+
+    def test_errors_match_the_sequential_load(self) -> None:
+        records = list(self.records)
+        records[150] = dict(records[150], completed="yes")
+        records[170] = dict(records[170], created_at="not a date")
+        self.write(records)
+        with self.assertRaises(ValueError) as sequential:
+            self.load_sequentially(Storage())
+        with self.assertRaises(ValueError) as parallel:
+            load_tasks_parallel(Storage(), self.data_file, workers=4)
+        self.assertEqual(str(parallel.exception), str(sequential.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
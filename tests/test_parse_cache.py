@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import parse_cache
+from parse_cache import cache_file, load_cached_tasks, save_cached_tasks
+from storage import Storage
+from task import Task
+from task_manager import TaskManager
+from utils import create_data_file, update_data_file
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.temp_dir.name, "tasks.json")
+        self.records = [
+            {
+                "title": "Task 1",
+                "description": "Description 1",
+                "completed": True,
+                "created_at": "2024-09-16T17:19:22.056316",
+                "completion_time": "1 day, 0:00:00",
+            },
+            {
+                "title": "Task 2",
+                "description": "Description 2",
+                "completed": False,
+                "created_at": "2024-09-16T17:19:22.056316",
+                "completion_time": None,
+            },
+        ]
+        with open(self.data_file, "w") as f:
+            json.dump(self.records, f, indent=4)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def load(self) -> Storage:
+        storage = Storage()
+        create_data_file(self.data_file, storage, cache=True)
+        return storage
+
+    def test_second_load_skips_parsing(self) -> None:
+        self.assertFalse(os.path.exists(cache_file(self.data_file)))
+        first = self.load()
+        self.assertTrue(os.path.exists(cache_file(self.data_file)))
+
+        with patch.object(Storage, "load_tasks") as load_tasks:
+            second = self.load()
+        load_tasks.assert_not_called()
+
+        for expected, task in zip(
+            first.get_all_tasks(), second.get_all_tasks(), strict=True
+        ):
+            self.assertEqual(vars(task), vars(expected))
+        self.assertEqual(second.get_report_stats(), first.get_report_stats())
+
+    def test_edit_by_hand_invalidates_the_cache(self) -> None:
+        self.load()
+        stat = os.stat(self.data_file)
+        with open(self.data_file, "r") as f:
+            text = f.read()
+        # Same size and same modification time, only the content hash can tell
+        with open(self.data_file, "w") as f:
+            f.write(text.replace("Description 2", "Description 3"))
+        os.utime(self.data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        self.assertIsNone(load_cached_tasks(self.data_file))
+        self.assertEqual(self.load().get_task("Task 2").description, "Description 3")
+        self.assertIsNotNone(load_cached_tasks(self.data_file))
+
+    def test_file_is_only_hashed_when_its_stat_matches(self) -> None:
+        self.load()
+        with patch(
+            "parse_cache._content_hash", wraps=parse_cache._content_hash
+        ) as content_hash:
+            self.assertIsNotNone(load_cached_tasks(self.data_file))
+            self.assertEqual(content_hash.call_count, 1)
+
+            # A different size is enough to tell the file changed
+            with open(self.data_file, "a") as f:
+                f.write("\n")
+            self.assertIsNone(load_cached_tasks(self.data_file))
+            self.assertEqual(content_hash.call_count, 1)
+
+    def test_corrupt_cache_is_ignored(self) -> None:
+        with open(cache_file(self.data_file), "wb") as f:
+            f.write(b"not a pickle")
+        self.assertIsNone(load_cached_tasks(self.data_file))
+        self.assertEqual(len(self.load().get_all_tasks()), 2)
+
+    def test_cache_is_refreshed_with_the_data_file(self) -> None:
+        storage = self.load()
+        manager = TaskManager(storage)
+        manager.add_task("Task 3", "Description 3")
+        manager.complete_task("Task 2")
+        update_data_file(self.data_file, storage, cache=True)
+
+        tasks = load_cached_tasks(self.data_file)
+        self.assertEqual([task.title for task in tasks], ["Task 1", "Task 2", "Task 3"])
+        # Stored the way the data file holds it, not as the timedelta the manager set
+        self.assertIsInstance(tasks[1].completion_time, str)
+
+    def test_saved_tasks_round_trip(self) -> None:
+        created_at = datetime(2024, 9, 16, 17, 19, 22, 56316)
+        save_cached_tasks(
+            self.data_file, [Task("A", "B", True, created_at, timedelta(seconds=5))]
+        )
+        (task,) = load_cached_tasks(self.data_file)
+        self.assertEqual(
+            (
+                task.title,
+                task.description,
+                task.completed,
+                task.created_at,
+                task.completion_time,
+            ),
+            ("A", "B", True, created_at, "0:00:05"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import io
+import json
+import os
+import pstats
+import tempfile
+import unittest
+
+import profiler
+import storage
+from storage import Storage
+from task import Task
+
+
+class TestProfiler(unittest.TestCase):
+    def tearDown(self) -> None:
+        profiler.finish(out=io.StringIO())
+
+    def test_phases_are_free_when_off(self) -> None:
+        self.assertIs(profiler.phase("load"), profiler.phase("write"))
+        profiler.instrument()
+        self.assertFalse(hasattr(storage.record_to_task, "__wrapped__"))
+        self.assertIsNone(profiler.finish())
+
+    def test_phases_count_records(self) -> None:
+        source = Storage()
+        for i in range(20):
+            source.save_task(Task(f"Task {i}", "Description"))
+        data = io.StringIO()
+        source.dump(data)
+
+        profiler.start()
+        profiler.instrument()
+        with profiler.phase("load"):
+            Storage().load_tasks(data)
+        with profiler.phase("write"):
+            source.dump(io.StringIO())
+        with profiler.phase("command"):
+            pass
+
+        out = io.StringIO()
+        profile = profiler.finish(out=out, command="test")
+        self.assertEqual(json.loads(out.getvalue()), profile)
+        self.assertFalse(hasattr(storage.record_to_task, "__wrapped__"))
+
+        load, write, command = profile["phases"]
+        self.assertEqual(profile["command"], "test")
+        self.assertEqual((load["name"], load["records"]), ("load", 20))
+        self.assertGreater(load["validate_s"], 0)
+        self.assertEqual((write["records"], write["validate_s"]), (20, 0))
+        self.assertGreater(write["serialize_s"], 0)
+        self.assertIn("per_record_us", load)
+        self.assertNotIn("per_record_us", command)
+        self.assertIn(profile["hot_phase"], ("load", "write"))
+        self.assertNotIn("peak_bytes", load)
+
+    def test_memory_and_cprofile_dump(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            dump_file = os.path.join(directory, "hot.prof")
+            profiler.start(memory=True, dump_file=dump_file)
+            with profiler.phase("command"):
+                tasks = [Task(f"Task {i}", "Description") for i in range(100)]
+            profile = profiler.finish(out=io.StringIO())
+
+            self.assertEqual(profile["mode"], "memory")
+            self.assertGreater(profile["phases"][0]["peak_bytes"], 0)
+            self.assertEqual(profile["cprofile"], dump_file)
+            self.assertTrue(pstats.Stats(dump_file).total_calls > 0)
+            del tasks
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+
+from background_flusher import BackgroundFlusher
+from benchmarks.datasets import generate_records
+from lazy_storage import LazyStorage
+from storage import (
+    Storage,
+    detect_schema,
+    record_to_task_v2,
+    schema_header,
+    task_to_record_v2,
+)
+from task import Task
+from task_manager import TaskManager
+from task_table import TaskTable
+from utils import create_data_file, migrate_data_file, update_data_file
+
+
+class TestSchema(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.directory.name, "tasks.json")
+        with open(self.data_file, "w") as f:
+            json.dump(list(generate_records(60, completed_ratio=0.5)), f, indent=4)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def load(self, store=None):
+        store = store if store is not None else Storage()
+        create_data_file(self.data_file, store)
+        return store
+
+    def read_lines(self) -> list[dict]:
+        with open(self.data_file, "r") as f:
+            return [json.loads(line) for line in f]
+
+    def test_migrate_keeps_tasks_and_report(self) -> None:
+        before = self.load()
+        self.assertEqual(migrate_data_file(self.data_file), 60)
+        self.assertIsNone(migrate_data_file(self.data_file))
+
+        lines = self.read_lines()
+        self.assertEqual(lines[0], schema_header(2))
+        self.assertEqual(len(lines), 61)
+        self.assertIsInstance(lines[1]["created_at"], int)
+
+        after = self.load()
+        self.assertEqual(after.schema_version, 2)
+        self.assertEqual(after.get_report_stats(), before.get_report_stats())
+        self.assertEqual(
+            [task_to_record_v2(task) for task in after.get_all_tasks()],
+            [task_to_record_v2(task) for task in before.get_all_tasks()],
+        )
+
+        # And back, as the original file
+        self.assertEqual(migrate_data_file(self.data_file, 1), 60)
+        self.assertEqual(self.load().get_report_stats(), before.get_report_stats())
+        with open(self.data_file, "r") as f:
+            self.assertEqual(detect_schema(f), 1)
+
+    def test_storages_keep_the_version(self) -> None:
+        migrate_data_file(self.data_file)
+        expected = self.load().get_report_stats()
+        for store_class in (Storage, TaskTable, LazyStorage):
+            with self.subTest(store=store_class.__name__):
+                store = self.load(store_class())
+                manager = TaskManager(store)
+                manager.add_task(f"Added by {store_class.__name__}", "Description")
+                manager.complete_task(f"Added by {store_class.__name__}")
+                update_data_file(self.data_file, store)
+
+                lines = self.read_lines()
+                self.assertEqual(lines[0], schema_header(2))
+                reloaded = self.load()
+                self.assertEqual(
+                    reloaded.get_report_stats()[:2], (expected[0] + 1, expected[1] + 1)
+                )
+                expected = reloaded.get_report_stats()
+
+    def test_background_flusher_keeps_the_version(self) -> None:
+        migrate_data_file(self.data_file)
+        store = self.load()
+        with BackgroundFlusher(self.data_file, store, flush_interval=60):
+            TaskManager(store).add_task("Added", "Description")
+        self.assertEqual(self.read_lines()[0], schema_header(2))
+        self.assertEqual(len(self.load().tasks), 61)
+
+    def test_parse_cache_keeps_the_version(self) -> None:
+        migrate_data_file(self.data_file)
+        create_data_file(self.data_file, Storage(), cache=True)
+        store = Storage()
+        create_data_file(self.data_file, store, cache=True)
+        self.assertEqual(store.schema_version, 2)
+
+    def test_long_completion_times(self) -> None:
+        store = Storage()
+        task = Task("Task", "Description")
+        task.completed = True
+        task.completion_time = timedelta(days=3, hours=2, microseconds=7)
+        store.save_task(task)
+        store.schema_version = 2
+        update_data_file(self.data_file, store)
+
+        reloaded = self.load()
+        self.assertEqual(
+            reloaded.get_task("Task").completion_time, task.completion_time
+        )
+        self.assertEqual(self.read_lines()[1]["completion_us"], 266_400_000_007)
+
+    def test_malformed_records(self) -> None:
+        migrate_data_file(self.data_file)
+        with open(self.data_file, "r") as f:
+            lines = f.readlines()
+        record = json.loads(lines[3])
+        record["completion_us"] = "1:00:00" if record["completed"] else 5
+        lines[3] = json.dumps(record) + "\n"
+        with open(self.data_file, "w") as f:
+            f.writelines(lines)
+
+        offset = len("".join(lines[:3]).encode("utf-8"))
+        for store_class in (Storage, TaskTable):
+            with self.subTest(store=store_class.__name__):
+                with self.assertRaises(ValueError) as raised, open(
+                    self.data_file, "r"
+                ) as f:
+                    store_class().load_tasks(f)
+                self.assertIn(f"byte offset {offset}", str(raised.exception))
+        # A malformed file is not migrated
+        with self.assertRaises(ValueError):
+            migrate_data_file(self.data_file, 1)
+        with open(self.data_file, "r") as f:
+            self.assertEqual(f.readlines(), lines)
+
+    def test_times_out_of_range(self) -> None:
+        record = task_to_record_v2(
+            Task("Task", "Description", True, completion_time=timedelta(hours=1))
+        )
+        changes = [
+            {"created_at": 10**20},
+            {"created_at": -(10**20)},
+            {"completion_us": 10**20},
+            {"completion_us": -1},
+        ]
+        for change in changes:
+            with self.subTest(change=change), self.assertRaises(ValueError):
+                record_to_task_v2({**record, **change})
+
+    def test_unknown_versions(self) -> None:
+        with open(self.data_file, "w") as f:
+            f.write(json.dumps({"schema": "tasks", "version": 3}) + "\n")
+        with self.assertRaises(ValueError) as raised:
+            self.load()
+        self.assertIn("schema version 3", str(raised.exception))
+        with self.assertRaises(ValueError):
+            migrate_data_file(self.data_file, 3)
+        with self.assertRaises(ValueError):
+            migrate_data_file(os.path.join(self.directory.name, "missing.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
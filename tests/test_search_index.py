@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from search_index import SearchIndex, load_search_index, save_search_index, tokenize
+from storage import Storage
+from task import Task
+from task_manager import TaskManager
+from task_table import TaskTable
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tasks = [
+            Task("Weekly report", "Send the weekly report to the team"),
+            Task("Fix login bug", "Users report that the login page hangs"),
+            Task("Report template", "Design a template"),
+            Task("Refactor storage", "Split the storage module, weekly sync"),
+        ]
+        self.index = SearchIndex.build(self.tasks)
+        self.get_task = {task.title: task for task in self.tasks}.get
+
+    def titles(self, query: str, limit: int = 10) -> list[str]:
+        return [title for title, _ in self.index.search(query, self.get_task, limit)]
+
+    def test_tokenize(self) -> None:
+        self.assertEqual(
+            tokenize("Fix the LOGIN-bug, now!"), ["fix", "the", "login", "bug", "now"]
+        )
+
+    def test_token_query_ranks_title_matches_first(self) -> None:
+        self.assertEqual(
+            self.titles("report"), ["Weekly report", "Report template", "Fix login bug"]
+        )
+        self.assertEqual(self.titles("report", limit=1), ["Weekly report"])
+        self.assertEqual(self.titles("report login"), ["Fix login bug"])
+        self.assertEqual(self.titles("nothing"), [])
+
+    def test_prefix_query(self) -> None:
+        self.assertEqual(
+            sorted(self.titles("re*")), sorted(task.title for task in self.tasks)
+        )
+        self.assertEqual(self.titles("templ*"), ["Report template"])
+        self.assertEqual(self.titles("stor* refac*"), ["Refactor storage"])
+
+    def test_phrase_query(self) -> None:
+        self.assertEqual(self.titles('"weekly report"'), ["Weekly report"])
+        # Both words are in the task, but not next to each other
+        self.assertEqual(self.titles('"weekly storage"'), [])
+        self.assertEqual(self.titles('"login page" users'), ["Fix login bug"])
+
+    def test_empty_query(self) -> None:
+        with self.assertRaises(ValueError):
+            self.index.search(" -- ", self.get_task)
+
+    def test_storage_keeps_an_attached_index_up_to_date(self) -> None:
+        storage = Storage()
+        for task in self.tasks:
+            storage.save_task(task)
+        index = storage.attach_search_index()
+
+        storage.save_task(Task("Plan sprint", "Weekly planning"))
+        task = storage.get_task("Report template")
+        task.description = "Design a layout"
+        storage.update_task(task)
+
+        def titles(query: str) -> list[str]:
+            return [title for title, _ in index.search(query, storage.get_task)]
+
+        self.assertEqual(titles("plan*"), ["Plan sprint"])
+        self.assertEqual(titles("design layout"), ["Report template"])
+        self.assertEqual(titles("template"), ["Report template"])
+        self.assertEqual(titles('"a template"'), [])
+
+    def test_persisted_index_follows_the_data_file(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            data_file = os.path.join(directory, "tasks.json")
+            with open(data_file, "w") as f:
+                f.write("[]")
+            self.index.remove("Fix login bug")
+            save_search_index(data_file, self.index)
+            loaded = load_search_index(data_file)
+            self.assertEqual(len(loaded), 3)
+            self.assertEqual(
+                [title for title, _ in loaded.search("report", self.get_task)],
+                ["Weekly report", "Report template"],
+            )
+
+            with open(data_file, "w") as f:
+                f.write("[ ]")
+            # A different size is noticed without hashing the file
+            with patch("parse_cache._content_hash") as content_hash:
+                self.assertIsNone(load_search_index(data_file))
+            content_hash.assert_not_called()
+
+    def test_manager_searches_any_storage(self) -> None:
+        for storage in (Storage(), TaskTable()):
+            manager = TaskManager(storage)
+            for task in self.tasks:
+                manager.add_task(task.title, task.description)
+            results = manager.search_tasks("weekly", limit=2)
+            self.assertEqual(
+                [task.title for task, _ in results],
+                ["Weekly report", "Refactor storage"],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from sharded_storage import ShardedStorage, shard_of
+from task import Task
+from task_manager import TaskManager
+from utils import create_data_file, update_data_file
+
+
+class TestShardedStorage(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.directory.name, "tasks.shards")
+        self.storage = ShardedStorage(4)
+        create_data_file(self.data_file, self.storage)
+        self.manager = TaskManager(self.storage)
+        for i in range(20):
+            self.manager.add_task(f"Task {i}", f"Description {i}")
+        update_data_file(self.data_file, self.storage)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def reload(self, **kwargs) -> ShardedStorage:
+        storage = ShardedStorage()
+        storage.open(self.data_file, **kwargs)
+        return storage
+
+    def test_round_trip_keeps_the_order_of_creation(self) -> None:
+        self.manager.complete_task("Task 7")
+        update_data_file(self.data_file, self.storage)
+
+        loaded = self.reload()
+        self.assertEqual(loaded.shards, 4)
+        self.assertEqual(
+            [task.title for task in loaded.get_all_tasks()],
+            [f"Task {i}" for i in range(20)],
+        )
+        self.assertTrue(loaded.get_task("Task 7").completed)
+        self.assertEqual(loaded.get_report_stats()[:2], (20, 1))
+        self.assertFalse(loaded.dirty_shards)
+
+    def test_round_trip_keeps_the_order_of_insertion(self) -> None:
+        # Tasks added with creation times out of order, e.g. imported, keep the order
+        # they were added in
+        storage = ShardedStorage(4)
+        data_file = os.path.join(self.directory.name, "imported.shards")
+        create_data_file(data_file, storage)
+        titles = [f"Imported {i}" for i in range(12)]
+        for i, title in enumerate(titles):
+            storage.save_task(
+                Task(
+                    title,
+                    "Description",
+                    created_at=datetime(2024, 1, 1) - timedelta(days=i),
+                )
+            )
+        update_data_file(data_file, storage)
+
+        loaded = ShardedStorage()
+        loaded.open(data_file)
+        self.assertEqual([task.title for task in loaded.get_all_tasks()], titles)
+
+        # Sequence numbers go on from the last one, whichever shards get rewritten
+        loaded.save_task(
+            Task("Imported 12", "Description", created_at=datetime(2000, 1, 1))
+        )
+        TaskManager(loaded).complete_task("Imported 0")
+        update_data_file(data_file, loaded)
+        reloaded = ShardedStorage()
+        reloaded.open(data_file)
+        self.assertEqual(
+            [task.title for task in reloaded.get_all_tasks()], titles + ["Imported 12"]
+        )
+
+    def test_shards_without_sequence_numbers(self) -> None:
+        for shard in range(4):
+            with open(self.storage.shard_file(shard)) as f:
+                records = json.load(f)
+            with open(self.storage.shard_file(shard), "w") as f:
+                json.dump(
+                    [
+                        {k: v for k, v in record.items() if k != "seq"}
+                        for record in records
+                    ],
+                    f,
+                )
+
+        loaded = self.reload()
+        self.assertEqual(
+            [task.title for task in loaded.get_all_tasks()],
+            [f"Task {i}" for i in range(20)],
+        )
+        # They are all rewritten with sequence numbers by the next write
+        self.assertEqual(loaded.dirty_shards, set(range(4)))
+
+    def test_only_dirty_shards_are_written(self) -> None:
+        written = []
+        dump_shard = self.storage.dump_shard
+        self.storage.dump_shard = lambda shard, f: (
+            written.append(shard),
+            dump_shard(shard, f),
+        )
+
+        update_data_file(self.data_file, self.storage)
+        self.assertEqual(written, [])
+
+        self.manager.complete_task("Task 3")
+        self.manager.add_task("Task 20", "Description 20")
+        update_data_file(self.data_file, self.storage)
+        self.assertEqual(
+            sorted(written), sorted({shard_of("Task 3", 4), shard_of("Task 20", 4)})
+        )
+
+    def test_reshard(self) -> None:
+        self.storage.reshard(7)
+        update_data_file(self.data_file, self.storage)
+
+        files = sorted(os.listdir(self.data_file))
+        self.assertEqual(
+            files,
+            ["manifest.json"] + [f"shard-0001-{shard:04d}.json" for shard in range(7)],
+        )
+        loaded = self.reload()
+        self.assertEqual((loaded.shards, loaded.generation), (7, 1))
+        self.assertEqual(len(loaded.get_all_tasks()), 20)
+        for shard in range(7):
+            with open(loaded.shard_file(shard)) as f:
+                self.assertTrue(
+                    all(
+                        shard_of(record["title"], 7) == shard for record in json.load(f)
+                    )
+                )
+
+        with self.assertRaises(ValueError):
+            self.storage.reshard(0)
+
+    def test_parallel_load_matches(self) -> None:
+        titles = [task.title for task in self.reload(workers=1).get_all_tasks()]
+        self.assertEqual(
+            [task.title for task in self.reload(workers=2).get_all_tasks()], titles
+        )
+
+    def test_malformed_shard(self) -> None:
+        with open(self.storage.shard_file(2), "w") as f:
+            f.write('[{"title": "Broken"}]')
+        with self.assertRaises(ValueError) as context:
+            self.reload()
+        self.assertIn("shard-0000-0002.json", str(context.exception))
+
+        with open(self.storage.manifest_file(), "w") as f:
+            f.write("{}")
+        with self.assertRaises(ValueError):
+            self.reload()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from snapshot import Snapshot, SnapshotStorage, write_snapshot
+from storage import Storage
+from task import Task
+from task_manager import TaskManager
+from utils import create_data_file, update_data_file
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.snapshot_file = os.path.join(self.temp_dir.name, "tasks.snap")
+        self.test_date = datetime.fromisoformat("2024-09-16T17:19:22.056316")
+        self.tasks = [
+            Task("Ünïcode Task", "Description ✓", False, self.test_date, None),
+            Task("Task 2", "Description 2", True, self.test_date, "0:03:12.057624"),
+            Task("Task 1", "Description 1", True, self.test_date, "1 day, 0:00:00"),
+        ]
+        write_snapshot(self.snapshot_file, self.tasks)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def open_storage(self) -> SnapshotStorage:
+        storage = SnapshotStorage()
+        create_data_file(self.snapshot_file, storage)
+        return storage
+
+    def test_records_round_trip(self) -> None:
+        snapshot = Snapshot(self.snapshot_file)
+        self.assertEqual(len(snapshot), 3)
+        for row, expected in enumerate(self.tasks):
+            task = snapshot.task(row)
+            self.assertEqual(task.title, expected.title)
+            self.assertEqual(task.description, expected.description)
+            self.assertEqual(task.completed, expected.completed)
+            self.assertEqual(task.created_at, expected.created_at)
+            self.assertEqual(task.completion_time, expected.completion_time)
+        self.assertEqual(snapshot.find("Task 1"), 2)
+        self.assertEqual(snapshot.find("Ünïcode Task"), 0)
+        self.assertIsNone(snapshot.find("Ghost Task"))
+        snapshot.close()
+
+    def test_report_comes_from_the_header(self) -> None:
+        storage = self.open_storage()
+        total, completed, average = storage.get_report_stats()
+        self.assertEqual((total, completed), (3, 2))
+        self.assertAlmostEqual(average, (86400 + 192.057624) / 2)
+        storage.check_report_stats()
+        storage.close()
+
+    def test_changes_are_written_back(self) -> None:
+        storage = self.open_storage()
+        manager = TaskManager(storage)
+        self.assertFalse(manager.add_task("Task 1", "Duplicate"))
+        self.assertTrue(manager.add_task("Task 4", "Description 4"))
+        self.assertEqual(manager.complete_task("Ünïcode Task"), (True, 1))
+        self.assertEqual(manager.complete_task("Task 2"), (False, 1))
+        self.assertEqual(manager.list_tasks(), [storage.get_task("Task 4")])
+        storage.check_report_stats()
+
+        update_data_file(self.snapshot_file, storage)
+        storage.close()
+
+        reloaded = self.open_storage()
+        titles = [task.title for task in reloaded.get_all_tasks()]
+        self.assertEqual(titles, ["Ünïcode Task", "Task 2", "Task 1", "Task 4"])
+        self.assertTrue(reloaded.get_task("Ünïcode Task").completed)
+        self.assertEqual(reloaded.get_report_stats()[:2], (4, 3))
+        reloaded.close()
+
+    def test_unchanged_snapshot_is_not_rewritten(self) -> None:
+        storage = self.open_storage()
+        storage.get_all_tasks()
+        modified = os.stat(self.snapshot_file).st_mtime_ns
+        update_data_file(self.snapshot_file, storage)
+        self.assertEqual(os.stat(self.snapshot_file).st_mtime_ns, modified)
+        storage.close()
+
+    def test_written_snapshot_is_attached(self) -> None:
+        storage = self.open_storage()
+        TaskManager(storage).add_task("Task 4", "Description 4")
+        with patch("os.fsync") as fsync:
+            update_data_file(self.snapshot_file, storage, fsync="none")
+        fsync.assert_not_called()
+        self.assertFalse(storage.changed)
+        self.assertEqual(storage.get_report_stats()[0], 4)
+        self.assertEqual(storage.get_task("Task 4").description, "Description 4")
+
+        # Nothing left to write until the next change
+        modified = os.stat(self.snapshot_file).st_mtime_ns
+        update_data_file(self.snapshot_file, storage)
+        self.assertEqual(os.stat(self.snapshot_file).st_mtime_ns, modified)
+
+        TaskManager(storage).complete_task("Task 4")
+        with patch("os.fsync") as fsync:
+            update_data_file(self.snapshot_file, storage, fsync="file")
+        fsync.assert_called_once()
+        self.assertFalse(os.path.exists(self.snapshot_file + ".tmp"))
+        storage.close()
+
+    def test_plain_storage_loads_snapshot(self) -> None:
+        storage = Storage()
+        create_data_file(self.snapshot_file, storage)
+        self.assertEqual(list(storage.tasks), ["Ünïcode Task", "Task 2", "Task 1"])
+
+    def test_missing_snapshot_is_created(self) -> None:
+        os.remove(self.snapshot_file)
+        storage = self.open_storage()
+        self.assertEqual(storage.get_report_stats(), (0, 0, None))
+        storage.close()
+
+    def test_not_a_snapshot(self) -> None:
+        with open(self.snapshot_file, "wb") as f:
+            f.write(b"[]")
+        with self.assertRaises(ValueError):
+            Snapshot(self.snapshot_file)
+
+    def test_truncated_snapshot(self) -> None:
+        with open(self.snapshot_file, "rb") as f:
+            data = f.read()
+        for size in (0, 10, 60, 100, len(data) - 1):
+            with self.subTest(size=size):
+                with open(self.snapshot_file, "wb") as f:
+                    f.write(data[:size])
+                with self.assertRaises(ValueError):
+                    snapshot = Snapshot(self.snapshot_file)
+                    try:
+                        [snapshot.task(row) for row in range(len(snapshot))]
+                    finally:
+                        snapshot.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from sqlite_storage import SqliteStorage, migrate_json_to_sqlite
+from task import Task
+from task_manager import TaskManager
+from utils import create_data_file, update_data_file
+
+
+class TestSqliteStorage(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.temp_dir.name, "tasks.sqlite3")
+        self.storage = SqliteStorage()
+        create_data_file(self.db_file, self.storage)
+        self.test_date = datetime.fromisoformat("2024-09-16T17:19:22.056316")
+
+    def tearDown(self) -> None:
+        self.storage.close()
+        self.temp_dir.cleanup()
+
+    def test_save_and_get_task(self) -> None:
+        task = Task("Task 1", "Description 1", False, self.test_date, None)
+        self.assertTrue(self.storage.save_task(task))
+        self.assertFalse(self.storage.save_task(Task("Task 1", "Other Description")))
+
+        fetched_task = self.storage.get_task("Task 1")
+        self.assertEqual(fetched_task.description, "Description 1")
+        self.assertEqual(fetched_task.created_at, self.test_date)
+        self.assertFalse(fetched_task.completed)
+        self.assertIsNone(fetched_task.completion_time)
+        self.assertIsNone(self.storage.get_task("Ghost Task"))
+
+    def test_tasks_keep_insertion_order(self) -> None:
+        for title in ("b", "a", "c"):
+            self.storage.save_task(
+                Task(title, "Description", created_at=self.test_date)
+            )
+        self.assertEqual(
+            [t.title for t in self.storage.get_all_tasks()], ["b", "a", "c"]
+        )
+
+    def test_manager_complete_list_and_report(self) -> None:
+        manager = TaskManager(self.storage)
+        manager.add_task("Task 1", "Description 1")
+        manager.add_task("Task 2", "Description 2")
+        self.storage.save_task(
+            Task("Task 3", "Description 3", True, self.test_date, "1 day, 2:00:00")
+        )
+
+        self.assertEqual(manager.complete_task("Task 1"), (True, 1))
+        self.assertEqual(manager.complete_task("Task 1"), (False, 1))
+        self.assertEqual(manager.complete_task("Ghost Task"), (False, -1))
+
+        self.assertEqual([t.title for t in manager.list_tasks()], ["Task 2"])
+        self.assertEqual(len(manager.list_tasks(include_completed=True)), 3)
+
+        total, completed, average = self.storage.get_report_stats()
+        self.assertEqual((total, completed), (3, 2))
+        self.assertAlmostEqual(average, (26 * 3600) / 2, delta=60)
+
+    def test_report_stats_are_persisted(self) -> None:
+        task = Task("Task 1", "Description 1", False, self.test_date, None)
+        self.storage.save_task(task)
+        task.completed = True
+        task.completion_time = "0:10:00"
+        self.storage.update_task(task)
+        self.storage.save_task(
+            Task("Task 2", "Description 2", created_at=self.test_date)
+        )
+        self.storage.close()
+
+        self.storage = SqliteStorage(self.db_file)
+        self.assertEqual(self.storage.get_report_stats(), (2, 1, 600.0))
+        self.storage.check_report_stats()
+
+        # Editing the table behind the triggers' back is caught by the self-check
+        self.storage.connection.execute("UPDATE report_stats SET completed = 5")
+        with self.assertRaises(AssertionError):
+            self.storage.check_report_stats()
+
+    def test_time_columns_match_storage(self) -> None:
+        from storage import Storage
+
+        storage = Storage()
+        for task in (
+            Task("Task 1", "Description 1", True, self.test_date, "0:03:12.057624"),
+            Task(
+                "Task 2",
+                "Description 2",
+                False,
+                self.test_date + timedelta(days=3),
+                None,
+            ),
+        ):
+            storage.save_task(task)
+            self.storage.save_task(task)
+
+        created_at, completion, completed = self.storage.get_time_columns()
+        expected_created_at, expected_completion, expected_completed = (
+            storage.get_time_columns()
+        )
+        self.assertEqual(created_at, expected_created_at)
+        self.assertEqual(completion, expected_completion)
+        self.assertEqual(completed, expected_completed)
+
+    def test_changes_persist_after_update_data_file(self) -> None:
+        self.storage.save_task(
+            Task("Task 1", "Description 1", created_at=self.test_date)
+        )
+        update_data_file(self.db_file, self.storage)
+        self.storage.close()
+
+        self.storage = SqliteStorage(self.db_file)
+        self.assertIsNotNone(self.storage.get_task("Task 1"))
+
+    def test_migration_from_json(self) -> None:
+        tests_directory = os.path.dirname(os.path.abspath(__file__))
+        json_file = os.path.join(tests_directory, "load_test_2.json")
+        self.storage.close()
+
+        self.assertEqual(migrate_json_to_sqlite(json_file, self.db_file), 2)
+
+        self.storage = SqliteStorage(self.db_file)
+        task = self.storage.get_task("Load Test Task 2")
+        self.assertTrue(task.completed)
+        self.assertEqual(task.completion_time, "0:03:12.057624")
+        self.assertEqual(self.storage.get_report_stats(), (2, 1, 192.057624))
+
+    def test_dump_round_trips_through_json(self) -> None:
+        self.storage.save_task(
+            Task("Task 1", "Description 1", True, self.test_date, timedelta(seconds=75))
+        )
+        dump_file = os.path.join(self.temp_dir.name, "dump.json")
+        with open(dump_file, "w") as f:
+            self.storage.dump(f)
+
+        with open(dump_file, "r") as f:
+            records = json.load(f)
+        self.assertEqual(records[0]["completion_time"], "0:01:15")
+
+    def test_database_needs_sqlite_storage(self) -> None:
+        from storage import Storage
+
+        with self.assertRaises(ValueError):
+            create_data_file(self.db_file, Storage())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,15 @@
 import unittest
+from unittest.mock import patch
+from lazy_storage import LazyStorage
+from snapshot import SnapshotStorage
 from storage import Storage
+from task_table import TaskTable
 from task import Task
-from utils import create_data_file, update_data_file
+from utils import create_data_file, update_data_file, write_atomically
 import os
 from datetime import datetime
 import json
-
+import tempfile
 
 # Due to the symbiotic relationship between the persistent data and the storage class,
 # I decided to keep the tests in one test case.
@@ -291,6 +295,67 @@ class TestStorageDatabase(unittest.TestCase):
         with open(test_file_name_main, "w") as f_dumped:
             pass
 
+    def test_report_stats_follow_saves_and_updates(self) -> None:
+        task_1 = Task("Task 1", "Description 1", True, datetime.now(), "1:00:00")
+        task_2 = Task("Task 2", "Description 2")
+        self.storage.save_task(task_1)
+        self.storage.save_task(task_2)
+        self.assertEqual(self.storage.get_report_stats(), (2, 1, 3600.0))
+
+        task_2.completed = True
+        task_2.completion_time = "3:00:00"
+        self.storage.update_task(task_2)
+        self.assertEqual(self.storage.get_report_stats(), (2, 2, 7200.0))
+
+        # Updating a completed task again replaces its contribution instead of adding to
+        # it
+        task_2.completion_time = "1:00:00"
+        self.storage.update_task(task_2)
+        self.assertEqual(self.storage.get_report_stats(), (2, 2, 3600.0))
+        self.storage.check_report_stats()
+
+    def test_report_stats_rebuilt_on_assignment(self) -> None:
+        task_1 = Task("Task 1", "Description 1", True, datetime.now(), "0:30:00")
+        self.storage.tasks = {task_1.title: task_1}
+        self.assertEqual(self.storage.get_report_stats(), (1, 1, 1800.0))
+
+    def test_check_report_stats_detects_drift(self) -> None:
+        task_1 = Task("Task 1", "Description 1")
+        self.storage.save_task(task_1)
+        self.storage.check_report_stats()
+
+        # Completing a task without going through update_task leaves the aggregates
+        # behind
+        task_1.completed = True
+        task_1.completion_time = "0:30:00"
+        with self.assertRaises(AssertionError):
+            self.storage.check_report_stats()
+
+    def test_pending_index_keeps_insertion_order(self) -> None:
+        tasks = [Task(f"Task {i}", f"Description {i}") for i in range(5)]
+        for task in tasks:
+            self.storage.save_task(task)
+
+        tasks[1].completed = True
+        tasks[1].completion_time = "0:10:00"
+        self.storage.update_task(tasks[1])
+        # Updating a pending task leaves it where it was
+        tasks[3].description = "Changed"
+        self.storage.update_task(tasks[3])
+
+        pending = self.storage.get_pending_tasks()
+        self.assertEqual(
+            [task.title for task in pending], ["Task 0", "Task 2", "Task 3", "Task 4"]
+        )
+        self.assertEqual(pending[2].description, "Changed")
+        self.storage.check_report_stats()
+
+    def test_pending_index_rebuilt_on_assignment(self) -> None:
+        task_1 = Task("Task 1", "Description 1", True, datetime.now(), "0:30:00")
+        task_2 = Task("Task 2", "Description 2")
+        self.storage.tasks = {task_1.title: task_1, task_2.title: task_2}
+        self.assertEqual(self.storage.get_pending_tasks(), [task_2])
+
     def test_update_data_file(self) -> None:
         test_file_name_main = os.path.join(self.test_file_directory, "update_test_1.json")
         test_file_name_check = os.path.join(self.test_file_directory, "update_test_1_gold.json")
@@ -337,6 +402,84 @@ class TestStorageDatabase(unittest.TestCase):
         with open(test_file_name_main, "w") as f:
             self.storage.dump(f)
 
+    def test_unchanged_storage_is_not_written(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            data_file = os.path.join(directory, "tasks.json")
+            with open(data_file, "w") as f:
+                json.dump([], f)
+            create_data_file(data_file, self.storage)
+            self.storage.save_task(Task("Task 1", "Description 1"))
+            self.assertTrue(self.storage.changed)
+            update_data_file(data_file, self.storage)
+            self.assertFalse(self.storage.changed)
+
+            # A storage loaded from the file, and not changed since, leaves the file
+            # alone
+            loaded = Storage()
+            create_data_file(data_file, loaded)
+            self.assertFalse(loaded.changed)
+            with open(data_file, "w") as f:
+                f.write("sentinel")
+            update_data_file(data_file, loaded)
+            with open(data_file, "r") as f:
+                self.assertEqual(f.read(), "sentinel")
+
+            self.assertFalse(loaded.save_task(Task("Task 1", "Duplicate")))
+            self.assertFalse(loaded.changed)
+            loaded.update_task(loaded.get_task("Task 1"))
+            update_data_file(data_file, loaded, fsync="full")
+            with open(data_file, "r") as f:
+                self.assertEqual([task["title"] for task in json.load(f)], ["Task 1"])
+
+            with self.assertRaises(ValueError):
+                update_data_file(data_file, loaded, fsync="sometimes")
+
+    def test_interrupted_write_keeps_the_data_file(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            data_file = os.path.join(directory, "tasks.json")
+            with open(data_file, "w") as f:
+                f.write("[]")
+
+            def crash(f) -> None:
+                f.write('[{"title": ')
+                raise KeyboardInterrupt
+
+            with self.assertRaises(KeyboardInterrupt):
+                write_atomically(data_file, crash)
+            with open(data_file, "r") as f:
+                self.assertEqual(f.read(), "[]")
+            self.assertEqual(os.listdir(directory), ["tasks.json"])
+
+    def test_failed_dump_keeps_the_data_file(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            data_file = os.path.join(directory, "tasks.json")
+            with open(data_file, "w") as f:
+                f.write("[]")
+
+            # A task that can not be formatted, created_at is not a datetime
+            self.storage.save_task(
+                Task("Task 1", "Description", created_at="2024-09-16")
+            )
+            with self.assertRaises(AttributeError):
+                update_data_file(data_file, self.storage)
+
+            storages = (
+                (TaskTable, "task_table.write_records"),
+                (LazyStorage, "lazy_storage.write_records"),
+                (SnapshotStorage, "snapshot.write_json_array"),
+            )
+            for storage_class, writer in storages:
+                with (
+                    self.subTest(storage=storage_class.__name__),
+                    patch(writer, side_effect=TypeError("unexpected")),
+                    self.assertRaises(TypeError),
+                ):
+                    write_atomically(data_file, storage_class().dump)
+
+            with open(data_file, "r") as f:
+                self.assertEqual(f.read(), "[]")
+            self.assertEqual(os.listdir(directory), ["tasks.json"])
+
 
 if __name__ == "__main__":
     unittest.main()
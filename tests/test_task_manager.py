@@ -1,9 +1,13 @@
 import unittest
 from unittest.mock import MagicMock
-from task_manager import TaskManager
-from task import Task
+from task_manager import ALREADY_COMPLETED, EXISTS, NOT_FOUND, OK, TaskManager
+from storage import Storage
+from task import Task, completion_seconds, to_epoch_us
 from datetime import datetime, timedelta
-
+from lazy_storage import LazyStorage
+from snapshot import SnapshotStorage
+from sqlite_storage import SqliteStorage
+from task_table import TaskTable
 
 class TestTaskManager(unittest.TestCase):
     def setUp(self) -> None:
@@ -11,6 +15,13 @@ class TestTaskManager(unittest.TestCase):
         self.manager = TaskManager(self.storage)
         self.test_date = datetime.fromisoformat("2024-09-15 17:26:07.461444")
 
+    def use_tasks(self, tasks: list[Task]) -> None:
+        # Listing and reporting are answered by the storage itself, so these run against
+        # a real one
+        self.manager.storage = Storage()
+        for task in tasks:
+            self.manager.storage.save_task(task)
+
     def test_add_new_task_successfully(self) -> None:
         self.storage.save_task.return_value = True
         response = self.manager.add_task("Test Task", "Description")
@@ -28,18 +39,53 @@ class TestTaskManager(unittest.TestCase):
             Task("Task 3", "Description 3"),
         ]
         tasks[1].completed = True
-        self.storage.get_all_tasks.return_value = tasks
+        self.use_tasks(tasks)
         result = self.manager.list_tasks()
         self.assertEqual(len(result), 2)
         self.assertNotIn(tasks[1], result)
 
+    def test_iter_tasks_pages_with_a_cursor_on_every_storage(self) -> None:
+        # SnapshotStorage has no iter_tasks, the manager pages over its lists instead
+        for storage in (
+            Storage(),
+            TaskTable(),
+            SqliteStorage(":memory:"),
+            LazyStorage(),
+            SnapshotStorage(),
+        ):
+            manager = TaskManager(storage)
+            for i in range(6):
+                manager.add_task(f"Task {i}", "Description")
+            manager.complete_task("Task 1")
+            manager.complete_task("Task 4")
+
+            def titles(manager=manager, **kwargs) -> list[str]:
+                return [task.title for task in manager.iter_tasks(**kwargs)]
+
+            self.assertEqual(titles(), ["Task 0", "Task 2", "Task 3", "Task 5"])
+            self.assertEqual(titles(limit=2, offset=1), ["Task 2", "Task 3"])
+            self.assertEqual(
+                titles(include_completed=True, after="Task 2", limit=2),
+                ["Task 3", "Task 4"],
+            )
+            # The cursor can point at a completed task, and stays valid as tasks are
+            # completed and added
+            self.assertEqual(titles(after="Task 1"), ["Task 2", "Task 3", "Task 5"])
+            manager.complete_task("Task 2")
+            manager.add_task("Task 6", "Description")
+            self.assertEqual(titles(after="Task 2"), ["Task 3", "Task 5", "Task 6"])
+            self.assertEqual(titles(after="Task 6"), [])
+
+            with self.assertRaises(ValueError):
+                titles(after="Ghost")
+
     def test_generate_report_no_completed_tasks(self) -> None:
         tasks = [
             Task("Task 1", "Description 1"),
             Task("Task 2", "Description 2"),
             Task("Task 3", "Description 3"),
         ]
-        self.storage.get_all_tasks.return_value = tasks
+        self.use_tasks(tasks)
         report = self.manager.generate_report()
         self.assertEqual(report["total"], 3)
         self.assertEqual(report["completed"], 0)
@@ -52,7 +98,7 @@ class TestTaskManager(unittest.TestCase):
             Task("Task 3", "Description 3"),
         ]
         expected_act = "02 hours - 03 minutes - 12 seconds"
-        self.storage.get_all_tasks.return_value = tasks
+        self.use_tasks(tasks)
         report = self.manager.generate_report()
         self.assertEqual(report["total"], 3)
         self.assertEqual(report["completed"], 1)
@@ -65,7 +111,7 @@ class TestTaskManager(unittest.TestCase):
             Task("Task 2", "Description 2", True, self.test_date, "2:12:15.1"),
             Task("Task 3", "Description 3"),
         ]
-        self.storage.get_all_tasks.return_value = tasks
+        self.use_tasks(tasks)
 
         h1, m1, s1 = map(float, tasks[0].completion_time.split(":"))
         h2, m2, s2 = map(float, tasks[1].completion_time.split(":"))
@@ -90,6 +136,22 @@ class TestTaskManager(unittest.TestCase):
         self.assertEqual(report["pending"], 1)
         self.assertEqual(report["average completion time"], expected_act)
 
+    def test_generate_report_completion_time_over_a_day(self) -> None:
+        tasks = [
+            Task("Task 1", "Description 1", True, self.test_date, "1 day, 2:00:00"),
+            Task("Task 2", "Description 2", True, self.test_date, timedelta(hours=4)),
+        ]
+        self.use_tasks(tasks)
+        report = self.manager.generate_report()
+        self.assertEqual(
+            report["average completion time"], "15 hours - 00 minutes - 00 seconds"
+        )
+
+    def test_generate_report_self_check(self) -> None:
+        self.storage.get_report_stats.return_value = (1, 0, None)
+        self.manager.generate_report(self_check=True)
+        self.storage.check_report_stats.assert_called_once()
+
     def test_complete_task(self) -> None:
         self.storage.get_task.return_value = Task(
             "Task 1", "Description 1", created_at=self.test_date
@@ -110,6 +172,77 @@ class TestTaskManager(unittest.TestCase):
         result = self.manager.complete_task("Completed Task")
         self.assertEqual(result, (False, 1))
 
+    def test_add_tasks(self) -> None:
+        for storage in (
+            Storage(),
+            TaskTable(),
+            SqliteStorage(":memory:"),
+            LazyStorage(),
+        ):
+            with self.subTest(storage=type(storage).__name__):
+                manager = TaskManager(storage)
+                manager.add_task("Existing", "Description")
+                persisted = []
+                statuses = manager.add_tasks(
+                    [
+                        ("Task 1", "First"),
+                        ("Existing", "Other"),
+                        ("Task 2", "Second"),
+                        ("Task 1", "Duplicate"),
+                    ],
+                    persist=lambda persisted=persisted: persisted.append(True),
+                )
+                self.assertEqual(statuses, bytes([OK, EXISTS, OK, EXISTS]))
+                self.assertEqual(storage.get_task("Task 1").description, "First")
+                self.assertEqual(storage.get_report_stats()[0], 3)
+                self.assertEqual(persisted, [True])
+
+                # Nothing added, nothing to persist
+                statuses = manager.add_tasks(
+                    [("Task 2", "Again")],
+                    persist=lambda persisted=persisted: persisted.append(True),
+                )
+                self.assertEqual(statuses, bytes([EXISTS]))
+                self.assertEqual(persisted, [True])
+
+    def test_complete_tasks(self) -> None:
+        for storage in (
+            Storage(),
+            TaskTable(),
+            SqliteStorage(":memory:"),
+            LazyStorage(),
+        ):
+            with self.subTest(storage=type(storage).__name__):
+                manager = TaskManager(storage)
+                manager.add_tasks((f"Task {i}", "Description") for i in range(4))
+                manager.complete_task("Task 3")
+                persisted = []
+                statuses = manager.complete_tasks(
+                    ["Task 0", "Task 3", "Missing", "Task 1", "Task 0"],
+                    persist=lambda persisted=persisted: persisted.append(True),
+                )
+                self.assertEqual(
+                    statuses,
+                    bytes([OK, ALREADY_COMPLETED, NOT_FOUND, OK, ALREADY_COMPLETED]),
+                )
+                self.assertEqual(persisted, [True])
+                self.assertEqual(storage.get_report_stats()[1], 3)
+                self.assertEqual(
+                    [task.title for task in storage.get_pending_tasks()], ["Task 2"]
+                )
+
+                # Completed at the same moment, so the completion times only differ by
+                # the creation times
+                completed_at = [
+                    to_epoch_us(task.created_at) / 1e6
+                    + completion_seconds(task.completion_time)
+                    for task in (storage.get_task("Task 0"), storage.get_task("Task 1"))
+                ]
+                self.assertAlmostEqual(completed_at[0], completed_at[1], places=5)
+        self.storage.get_task.return_value = None
+        self.assertEqual(self.manager.complete_tasks(["Missing"]), bytes([NOT_FOUND]))
+        self.storage.update_task.assert_not_called()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,83 @@
+import io
+import json
+import os
+import unittest
+from datetime import datetime, timedelta
+
+from storage import Storage
+from task import Task
+from task_manager import TaskManager
+from task_table import TaskTable
+
+
+class TestTaskTable(unittest.TestCase):
+    def setUp(self) -> None:
+        self.table = TaskTable()
+        self.test_date = datetime.fromisoformat("2024-09-16T17:19:22.056316")
+
+    def test_save_and_view_task(self) -> None:
+        task = Task("Task 1", "Description 1", True, self.test_date, "0:03:12.057624")
+        self.assertTrue(self.table.save_task(task))
+        self.assertFalse(self.table.save_task(Task("Task 1", "Other Description")))
+
+        view = self.table.get_task("Task 1")
+        self.assertIsNot(view, task)
+        self.assertEqual(view.title, "Task 1")
+        self.assertEqual(view.description, "Description 1")
+        self.assertTrue(view.completed)
+        self.assertEqual(view.created_at, self.test_date)
+        self.assertEqual(view.completion_time, "0:03:12.057624")
+        self.assertIsNone(self.table.get_task("Ghost Task"))
+
+    def test_descriptions_are_interned(self) -> None:
+        for i in range(10):
+            self.table.save_task(
+                Task(f"Task {i}", "Same Description", created_at=self.test_date)
+            )
+        self.assertEqual(len(self.table), 10)
+        self.assertEqual(len(self.table._descriptions), 1)
+
+    def test_view_changes_only_apply_through_update_task(self) -> None:
+        self.table.save_task(Task("Task 1", "Description 1", created_at=self.test_date))
+        view = self.table.get_task("Task 1")
+        view.completed = True
+        view.completion_time = timedelta(minutes=5)
+        self.assertFalse(self.table.get_task("Task 1").completed)
+
+        self.table.update_task(view)
+        self.assertEqual(self.table.get_task("Task 1").completion_time, "0:05:00")
+        self.assertEqual(self.table.get_report_stats(), (1, 1, 300.0))
+        self.table.check_report_stats()
+
+    def test_manager_on_table(self) -> None:
+        manager = TaskManager(self.table)
+        for i in range(20):
+            manager.add_task(f"Task {i}", "Description")
+        for i in range(0, 20, 2):
+            self.assertEqual(manager.complete_task(f"Task {i}"), (True, 1))
+
+        pending = [task.title for task in manager.list_tasks()]
+        self.assertEqual(pending, [f"Task {i}" for i in range(1, 20, 2)])
+        report = manager.generate_report(self_check=True)
+        self.assertEqual(
+            (report["total"], report["completed"], report["pending"]), (20, 10, 10)
+        )
+
+    def test_load_and_dump_match_storage(self) -> None:
+        tests_directory = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(tests_directory, "load_test_2.json"), "r") as f:
+            self.table.load_tasks(f)
+            storage = Storage()
+            storage.load_tasks(f)
+
+        table_dump, storage_dump = io.StringIO(), io.StringIO()
+        self.table.dump(table_dump)
+        storage.dump(storage_dump)
+        self.assertEqual(
+            json.loads(table_dump.getvalue()), json.loads(storage_dump.getvalue())
+        )
+        self.assertEqual(self.table.get_report_stats(), storage.get_report_stats())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,258 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from batch import apply_operation
+from storage import Storage
+from task import Task, parse_timestamp, to_epoch_us
+from task_manager import TaskManager
+from task_table import TaskTable
+from time_index import TimeIndex
+
+START = datetime(2024, 1, 1)
+
+
+def make_tasks(count: int, seed: int = 7) -> list[Task]:
+    """
+    Tasks created over about a year, in no particular order, a third of them completed.
+    """
+    rng = random.Random(seed)
+    tasks = []
+    for i in range(count):
+        task = Task(
+            f"Task {i}",
+            "Description",
+            created_at=START + timedelta(minutes=rng.randrange(500_000)),
+        )
+        if i % 3 == 0:
+            task.completed = True
+            task.completion_time = timedelta(seconds=rng.randrange(1, 10 * 86400))
+        tasks.append(task)
+    return tasks
+
+
+def scan(
+    tasks: list[Task], since: datetime | None, until: datetime | None
+) -> list[Task]:
+    return [
+        task
+        for task in tasks
+        if (since is None or task.created_at >= since)
+        and (until is None or task.created_at < until)
+    ]
+
+
+class TestTimeIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tasks = make_tasks(600)
+        self.storage = Storage()
+        for task in self.tasks:
+            self.storage.save_task(task)
+        self.manager = TaskManager(self.storage)
+
+    def test_range_stats_match_a_scan(self) -> None:
+        index = TimeIndex.build(self.tasks)
+        ranges = [
+            (None, None),
+            (START + timedelta(days=30), START + timedelta(days=44)),
+            (START, None),
+        ]
+        for since, until in ranges:
+            with self.subTest(since=since, until=until):
+                expected = scan(self.tasks, since, until)
+                completions = [
+                    task.completion_time.total_seconds()
+                    for task in expected
+                    if task.completed
+                ]
+                start = None if since is None else to_epoch_us(since)
+                end = None if until is None else to_epoch_us(until)
+                total, completed, average = index.range_stats(start, end)
+                self.assertEqual((total, completed), (len(expected), len(completions)))
+                self.assertAlmostEqual(
+                    average, sum(completions) / len(completions), places=6
+                )
+                self.assertEqual(
+                    sorted(index.iter_created(start, end)),
+                    sorted(task.title for task in expected),
+                )
+
+    def test_storage_keeps_an_attached_index_up_to_date(self) -> None:
+        index = self.storage.attach_time_index()
+        late = Task("Late", "Description", created_at=START + timedelta(days=400))
+        self.storage.save_task(late)
+        self.manager.complete_task("Task 1")
+        self.manager.complete_tasks(["Task 2", "Late"])
+
+        rebuilt = TimeIndex.build(self.storage.get_all_tasks())
+        for start, end in (
+            (None, None),
+            (to_epoch_us(START + timedelta(days=100)), None),
+        ):
+            self.assertEqual(
+                index.range_stats(start, end), rebuilt.range_stats(start, end)
+            )
+            self.assertEqual(
+                index.count_completed(start, end), rebuilt.count_completed(start, end)
+            )
+        self.assertEqual(
+            list(index.iter_created(to_epoch_us(START + timedelta(days=399)))), ["Late"]
+        )
+
+        # Replacing the tasks rebuilds it
+        self.storage.tasks = {}
+        self.assertEqual(len(self.storage.time_index), 0)
+
+    def test_ranged_report(self) -> None:
+        since, until = datetime(2024, 3, 4), datetime(2024, 3, 18)
+        report = self.manager.generate_report(since=since, until=until)
+        expected = scan(self.tasks, since, until)
+        self.assertEqual(report["total"], len(expected))
+        self.assertEqual(report["completed"], sum(task.completed for task in expected))
+        self.assertEqual(report["pending"], report["total"] - report["completed"])
+        completed_in_range = [
+            task
+            for task in self.tasks
+            if task.completed
+            and since <= task.created_at + task.completion_time < until
+        ]
+        self.assertEqual(report["completed in range"], len(completed_in_range))
+
+        # The whole history is the plain report, plus the completions
+        everything = self.manager.generate_report(since=datetime(2000, 1, 1))
+        self.assertEqual(
+            {**self.manager.generate_report(), "completed in range": 200}, everything
+        )
+        with self.assertRaises(ValueError):
+            self.manager.generate_report(since=until, until=since)
+
+    def test_ranged_listing(self) -> None:
+        after, before = datetime(2024, 5, 1), datetime(2024, 6, 1)
+        tasks = list(
+            self.manager.iter_tasks(
+                include_completed=True, created_after=after, created_before=before
+            )
+        )
+        expected = sorted(
+            scan(self.tasks, after, before), key=lambda task: task.created_at
+        )
+        self.assertEqual(
+            [task.title for task in tasks], [task.title for task in expected]
+        )
+
+        pending = list(
+            self.manager.iter_tasks(created_after=after, created_before=before)
+        )
+        self.assertEqual(pending, [task for task in tasks if not task.completed])
+
+        # Paging with the cursor walks the same tasks
+        pages, cursor = [], None
+        while True:
+            page = list(
+                self.manager.iter_tasks(
+                    True,
+                    limit=7,
+                    after=cursor,
+                    created_after=after,
+                    created_before=before,
+                )
+            )
+            if not page:
+                break
+            pages.extend(page)
+            cursor = page[-1].title
+        self.assertEqual(pages, tasks)
+        with self.assertRaises(ValueError):
+            list(self.manager.iter_tasks(True, after="Missing", created_after=after))
+
+    def test_scans_unless_indexing_time_ranges(self) -> None:
+        indexed_storage = Storage()
+        for task in make_tasks(600):
+            indexed_storage.save_task(task)
+        indexed = TaskManager(indexed_storage, index_time_ranges=True)
+        indexed.complete_task("Task 1")
+        self.manager.complete_task("Task 1")
+
+        def titles(manager: TaskManager, since, until, **kwargs) -> list[str]:
+            return [
+                task.title
+                for task in manager.iter_tasks(
+                    created_after=since, created_before=until, **kwargs
+                )
+            ]
+
+        ranges = [
+            (datetime(2024, 3, 4), datetime(2024, 3, 18)),
+            (datetime(2024, 6, 1), None),
+            (None, datetime(2024, 2, 1)),
+        ]
+        for since, until in ranges:
+            with self.subTest(since=since, until=until):
+                self.assertEqual(
+                    self.manager.generate_report(since=since, until=until),
+                    indexed.generate_report(since=since, until=until),
+                )
+                everything = titles(self.manager, since, until, include_completed=True)
+                self.assertEqual(
+                    everything, titles(indexed, since, until, include_completed=True)
+                )
+                self.assertEqual(
+                    titles(self.manager, since, until), titles(indexed, since, until)
+                )
+                cursor = everything[len(everything) // 2]
+                self.assertEqual(
+                    titles(self.manager, since, until, after=cursor),
+                    titles(indexed, since, until, after=cursor),
+                )
+                with self.assertRaises(ValueError):
+                    titles(
+                        self.manager,
+                        since,
+                        until,
+                        after="Task 0" if since else "Missing",
+                    )
+
+        # Only the manager of a long-lived process builds the index
+        self.assertIsNone(self.storage.time_index)
+        self.assertIsNotNone(indexed_storage.time_index)
+
+    def test_other_storages_and_operations(self) -> None:
+        table = TaskTable()
+        for task in self.tasks:
+            table.save_task(task)
+        op = {"op": "report", "since": "2024-03-04", "until": "2024-03-18T00:00:00"}
+        self.assertEqual(
+            apply_operation(TaskManager(table), op)["report"],
+            apply_operation(self.manager, op)["report"],
+        )
+
+        listed = apply_operation(
+            TaskManager(table),
+            {
+                "op": "list",
+                "all": True,
+                "created_after": "2024-12-01",
+                "records": False,
+            },
+        )
+        self.assertEqual(
+            len(listed["tasks"]), len(scan(self.tasks, datetime(2024, 12, 1), None))
+        )
+        with self.assertRaises(ValueError):
+            apply_operation(self.manager, {"op": "report", "since": "last week"})
+        with self.assertRaises(ValueError):
+            apply_operation(
+                self.manager, {"op": "report", "since": "2024-03-04", "detailed": True}
+            )
+
+    def test_parse_timestamp(self) -> None:
+        self.assertIsNone(parse_timestamp(None))
+        self.assertEqual(parse_timestamp("2024-06-03"), datetime(2024, 6, 3))
+        self.assertEqual(
+            parse_timestamp("2024-06-03T09:30"), datetime(2024, 6, 3, 9, 30)
+        )
+        self.assertIsNone(parse_timestamp("2024-06-03T09:30+02:00").tzinfo)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,380 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from typing import Iterator
+
+from task import Task, completion_microseconds, from_epoch_us, to_epoch_us
+
+# The completion time kept for a pending task
+PENDING = -1
+
+
+class TimeIndex:
+    """
+    Sorted indexes of tasks by creation time and by completion time (created_at plus the
+    completion time), so the tasks of a time range are found by bisection instead of
+    looking at every task.
+
+    The creation index is made of parallel sequences sorted by creation time: the
+    timestamps, the titles and the completion times in microseconds (PENDING while a
+    task is pending). The tasks of a range are a contiguous slice of them, so counting
+    the tasks of a range takes O(log N), and the completed tasks and the mean completion
+    time take O(log N + k) for the k tasks of the range, without fetching a single task.
+    The completion index only holds the completed tasks, sorted by the time they were
+    completed. Tasks created or completed at the same time keep the order they were
+    added in.
+
+    Timestamps are microseconds since task.EPOCH, see task.to_epoch_us, and ranges are
+    half open: a range from start to end holds the tasks with start <= timestamp < end,
+    None leaving a side unbounded.
+    """
+
+    def __init__(self):
+        self._created = array("q")
+        self._created_titles: list[str] = []
+        self._completion = array("q")
+        self._completed_at = array("q")
+        self._completed_titles: list[str] = []
+
+    @classmethod
+    def build(
+        cls, tasks, completion_seconds: dict[str, float] | None = None
+    ) -> "TimeIndex":
+        """
+        Indexes every task of an iterable of tasks with distinct titles, sorting once
+        rather than inserting one task at a time. Tasks that are already in creation
+        order, as they usually are, are sorted in linear time.
+
+        Parameters:
+            - tasks: Iterable[Task]
+                the tasks to index
+            - completion_seconds: dict[str, float] | None
+                the completion time in seconds of every completed task, when the caller
+                has it already, so the completion times do not have to be parsed again
+                (see storage.Storage)
+
+        Returns:
+            - TimeIndex
+        """
+        titles = []
+        created = array("q")
+        completed_at = array("q")
+        for task in tasks:
+            titles.append(task.title)
+            if completion_seconds is None:
+                entry = _entry(task)
+                created.append(entry[0])
+                completed_at.append(entry[1])
+            else:
+                created_at = to_epoch_us(task.created_at)
+                seconds = completion_seconds.get(task.title)
+                created.append(created_at)
+                # Rounded the way task.completion_microseconds rounds
+                completed_at.append(
+                    PENDING
+                    if seconds is None
+                    else created_at + math.floor(seconds * 1e6 + 0.5)
+                )
+
+        index = cls()
+        order = sorted(range(len(titles)), key=created.__getitem__)
+        index._created = array("q", map(created.__getitem__, order))
+        index._created_titles = list(map(titles.__getitem__, order))
+        index._completion = array(
+            "q",
+            (
+                (
+                    PENDING
+                    if completed_at[row] == PENDING
+                    else completed_at[row] - created[row]
+                )
+                for row in order
+            ),
+        )
+        completed = sorted(
+            (row for row in range(len(titles)) if completed_at[row] != PENDING),
+            key=completed_at.__getitem__,
+        )
+        index._completed_at = array("q", map(completed_at.__getitem__, completed))
+        index._completed_titles = list(map(titles.__getitem__, completed))
+        return index
+
+    def __len__(self) -> int:
+        return len(self._created)
+
+    def add(self, task: Task) -> None:
+        """Indexes a new task."""
+        created_at, completed_at, completion = _entry(task)
+        self._insert_created(task.title, created_at, completion)
+        if completed_at != PENDING:
+            self._insert_completed(task.title, completed_at)
+
+    def update(self, task: Task) -> None:
+        """
+        Indexes a task again after it changed, e.g. it was completed. A task that is not
+        indexed yet is added.
+        """
+        created_at, completed_at, completion = _entry(task)
+        row = self._row(task.title, created_at)
+        if row is None:
+            self.add(task)
+            return
+
+        old_created_at, old_completion = self._created[row], self._completion[row]
+        if (
+            old_completion != PENDING
+            and old_created_at + old_completion != completed_at
+        ):
+            old_row = self._find(
+                self._completed_at,
+                self._completed_titles,
+                old_created_at + old_completion,
+                task.title,
+            )
+            del self._completed_at[old_row]
+            del self._completed_titles[old_row]
+        if completed_at != PENDING and (
+            old_completion == PENDING or old_created_at + old_completion != completed_at
+        ):
+            self._insert_completed(task.title, completed_at)
+
+        if old_created_at == created_at:
+            self._completion[row] = completion
+        else:
+            del self._created[row]
+            del self._created_titles[row]
+            del self._completion[row]
+            self._insert_created(task.title, created_at, completion)
+
+    def created_rows(
+        self, start: int | None = None, end: int | None = None
+    ) -> tuple[int, int]:
+        """
+        The slice of the creation index holding the tasks created from start up to end.
+        """
+        low = 0 if start is None else bisect_left(self._created, start)
+        high = len(self._created) if end is None else bisect_left(self._created, end)
+        return low, max(low, high)
+
+    def iter_created(
+        self,
+        start: int | None = None,
+        end: int | None = None,
+        after: Task | None = None,
+    ) -> Iterator[str]:
+        """
+        Yields the titles of the tasks created from start up to end, by creation time.
+
+        Parameters:
+            - start: int | None
+                the first timestamp of the range, unbounded when None
+            - end: int | None
+                the timestamp the range stops before, unbounded when None
+            - after: Task | None
+                a task of the range to start after
+
+        Returns:
+            - Iterator[str]
+
+        Raises:
+            - ValueError
+                if there is no task titled after in the range
+        """
+        low, high = self.created_rows(start, end)
+        if after is not None:
+            row = self._row(after.title, to_epoch_us(after.created_at))
+            if row is None or not low <= row < high:
+                raise ValueError(
+                    f"*** There is no task titled '{after.title}' in the range to "
+                    "continue after. ***"
+                )
+            low = row + 1
+        titles = self._created_titles
+        for row in range(low, high):
+            yield titles[row]
+
+    def range_stats(
+        self, start: int | None = None, end: int | None = None
+    ) -> tuple[int, int, float | None]:
+        """
+        The aggregates of the report over the tasks created from start up to end, from
+        their slice only.
+
+        Returns:
+            - tuple[int, int, float | None]
+                the number of tasks, the number of completed tasks and their average
+                completion time in seconds (None if none of them has been completed)
+        """
+        low, high = self.created_rows(start, end)
+        completions = [
+            completion
+            for completion in self._completion[low:high]
+            if completion != PENDING
+        ]
+        average = sum(completions) / len(completions) / 1e6 if completions else None
+        return high - low, len(completions), average
+
+    def count_completed(self, start: int | None = None, end: int | None = None) -> int:
+        """The number of tasks completed from start up to end, in O(log N)."""
+        low = 0 if start is None else bisect_left(self._completed_at, start)
+        high = (
+            len(self._completed_at)
+            if end is None
+            else bisect_left(self._completed_at, end)
+        )
+        return max(0, high - low)
+
+    def _insert_created(self, title: str, created_at: int, completion: int) -> None:
+        row = bisect_right(self._created, created_at)
+        self._created.insert(row, created_at)
+        self._created_titles.insert(row, title)
+        self._completion.insert(row, completion)
+
+    def _insert_completed(self, title: str, completed_at: int) -> None:
+        row = bisect_right(self._completed_at, completed_at)
+        self._completed_at.insert(row, completed_at)
+        self._completed_titles.insert(row, title)
+
+    def _row(self, title: str, created_at: int) -> int | None:
+        """
+        The row of a task in the creation index, None if it is not indexed. It is looked
+        for at its creation time first, and everywhere only if it is not there, i.e.
+        when its creation time was changed.
+        """
+        row = self._find(self._created, self._created_titles, created_at, title)
+        if row is not None:
+            return row
+        try:
+            return self._created_titles.index(title)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _find(keys: array, titles: list[str], key: int, title: str) -> int | None:
+        """
+        The row of a title among the entries sharing its key, None if it is not among
+        them.
+        """
+        row = bisect_left(keys, key)
+        while row < len(keys) and keys[row] == key:
+            if titles[row] == title:
+                return row
+            row += 1
+        return None
+
+
+def scan_range(
+    tasks,
+    start: int | None = None,
+    end: int | None = None,
+    completion_seconds: dict[str, float] | None = None,
+) -> tuple[int, int, float | None, int]:
+    """
+    The aggregates of TimeIndex.range_stats and TimeIndex.count_completed, by looking at
+    every task once instead of building an index. Building one costs much more than a
+    scan, it only pays off in a process answering many range queries (see TaskManager).
+
+    Parameters:
+        - tasks: Iterable[Task]
+            the tasks
+        - start: int | None
+            the first timestamp of the range, unbounded when None
+        - end: int | None
+            the timestamp the range stops before, unbounded when None
+        - completion_seconds: dict[str, float] | None
+            the completion time in seconds of every completed task, see TimeIndex.build
+
+    Returns:
+        - tuple[int, int, float | None, int]
+            the number of tasks created in the range, how many of them are completed,
+            their average completion time in seconds (None if none of them has been
+            completed), and the number of tasks completed in the range
+    """
+    low = None if start is None else from_epoch_us(start)
+    high = None if end is None else from_epoch_us(end)
+    total = completed = completed_in_range = 0
+    completions = 0
+    for task in tasks:
+        created_at = task.created_at
+        # A task created after the range was also completed after it
+        if high is not None and created_at >= high:
+            continue
+        created = low is None or created_at >= low
+        if not task.completed:
+            total += created
+            continue
+
+        if completion_seconds is None:
+            completion = completion_microseconds(task.completion_time)
+        else:
+            # Rounded the way task.completion_microseconds rounds
+            completion = math.floor(completion_seconds[task.title] * 1e6 + 0.5)
+        if created:
+            total += 1
+            completed += 1
+            completions += completion
+        elif completion < _microseconds(low - created_at):
+            # Completed before the range started
+            continue
+        if high is None or completion < _microseconds(high - created_at):
+            completed_in_range += 1
+    return (
+        total,
+        completed,
+        completions / completed / 1e6 if completed else None,
+        completed_in_range,
+    )
+
+
+def scan_created(
+    tasks, start: int | None = None, end: int | None = None, after: Task | None = None
+) -> list[Task]:
+    """
+    The tasks created from start up to end by creation time, like TimeIndex.iter_created
+    but by looking at every task once. Tasks created at the same time keep their order.
+
+    Raises:
+        - ValueError
+            if there is no task titled after in the range
+    """
+    low = None if start is None else from_epoch_us(start)
+    high = None if end is None else from_epoch_us(end)
+    created = sorted(
+        (
+            task
+            for task in tasks
+            if (low is None or task.created_at >= low)
+            and (high is None or task.created_at < high)
+        ),
+        key=lambda task: task.created_at,
+    )
+    if after is None:
+        return created
+    for row, task in enumerate(created):
+        if task.title == after.title:
+            return created[row + 1 :]
+    raise ValueError(
+        f"*** There is no task titled '{after.title}' in the range to continue after. "
+        "***"
+    )
+
+
+def _microseconds(delta: timedelta) -> int:
+    """
+    A timedelta in whole microseconds, like to_epoch_us without the floor division of
+    timedeltas.
+    """
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _entry(task: Task) -> tuple[int, int, int]:
+    """
+    The creation timestamp, the completion timestamp and the completion time of a task,
+    in microseconds.
+    """
+    created_at = to_epoch_us(task.created_at)
+    if not task.completed:
+        return created_at, PENDING, PENDING
+    completion = completion_microseconds(task.completion_time)
+    return created_at, created_at + completion, completion
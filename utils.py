@@ -1,9 +1,50 @@
-from storage import Storage
+import os
 
+from data_codecs import CODEC_ERRORS, codec_of, open_text, open_writer
+from journal_storage import JournalStorage
+from lazy_storage import LazyStorage
+from parallel_load import PARALLEL_MIN_BYTES, load_tasks_parallel
+from parse_cache import load_cached_tasks, save_cached_tasks
+from sharded_storage import ShardedStorage
+from snapshot import Snapshot, SnapshotStorage, dump_snapshot, write_snapshot
+from sqlite_storage import SqliteStorage
+from storage import (
+    LATEST_SCHEMA,
+    SCHEMA_VERSIONS,
+    Storage,
+    detect_schema,
+    iter_file_tasks,
+    record_writer,
+    write_records,
+)
+from task_table import TaskTable
 
-def create_data_file(data_file: str, store: Storage) -> None:
+SQLITE_EXTENSIONS = ("sqlite3", "db")
+SNAPSHOT_EXTENSION = "snap"
+SHARDS_EXTENSION = "shards"
+
+# How hard update_data_file makes sure a write reached the disk, see update_data_file
+FSYNC_POLICIES = ("none", "file", "full")
+DEFAULT_FSYNC = "file"
+
+
+def create_data_file(
+    data_file: str, store: Storage, cache: bool = False, workers: int | None = 1
+) -> None:
     """
-    Accesses the JSON file and loads the data into the Storage object. If the file doesn't exist, it creates it.
+    Accesses the JSON file and loads the data into the Storage object. If the file
+    doesn't exist, it creates it. A SQLite database (.sqlite3 or .db) is opened by a
+    SqliteStorage instead, nothing gets loaded into memory. A binary snapshot (.snap) is
+    memory-mapped: a SnapshotStorage only maps it, other storages load every task from
+    it. A directory of shards (.shards) is loaded by a ShardedStorage, which creates it
+    if it does not exist. With cache, the validated tasks are loaded from the sidecar
+    cache of the JSON file when it still matches the file (see parse_cache), and the
+    cache is refreshed when it does not. A JSON file of PARALLEL_MIN_BYTES or more is
+    parsed and validated by worker processes when workers allows it, for a Storage or a
+    TaskTable (see parallel_load). A compressed JSON file (.json.gz, .json.xz or
+    .json.bz2) is decompressed as it is parsed, see data_codecs. The schema version of a
+    JSON file is detected, and the storage writes the file back in that version (see
+    storage.SCHEMA_VERSIONS and migrate_data_file).
 
     Assumptions:
         - There are no Task objects to be loaded to the Storage object if the JSON Dataset does not exist in the first place.
@@ -13,53 +54,358 @@ def create_data_file(data_file: str, store: Storage) -> None:
             file path
         - store: Storage
             storage object
+        - cache: bool
+            whether to use the sidecar cache of a JSON file
+        - workers: int | None
+            the number of processes loading a large JSON file, None for one per CPU, 1
+            loads it in this process
 
     Returns:
         - None
+
+    Raises:
+        - ValueError
+            if the extension is not supported, or the file is malformed or a task has
+            logical issues
     """
 
     file_name_tokenized = data_file.split(".")
     length_of_tokens = len(file_name_tokenized)
     extension = file_name_tokenized[length_of_tokens - 1]
 
-    if extension != "json":
-        raise ValueError(f"*** The file needs to have .json extension. ***"
-                         f"\n Currently you are using a .{extension} extension, which is not supported. "
-                         f"\n Please rename it to {'.'.join(file_name_tokenized[0:length_of_tokens-1])}.json")
+    if extension in SQLITE_EXTENSIONS:
+        if not isinstance(store, SqliteStorage):
+            raise ValueError(
+                f"*** A .{extension} database can only be opened with a SqliteStorage. "
+                "***"
+            )
+        store.connect(data_file)
+        return
+
+    if extension == SHARDS_EXTENSION:
+        if not isinstance(store, ShardedStorage):
+            raise ValueError(
+                f"*** A .{extension} directory can only be opened with a "
+                "ShardedStorage. ***"
+            )
+        store.open(data_file)
+        return
+
+    if extension == SNAPSHOT_EXTENSION:
+        if not os.path.exists(data_file) or os.path.getsize(data_file) == 0:
+            write_snapshot(data_file, [])
+
+        snapshot = Snapshot(data_file)
+        if isinstance(store, SnapshotStorage):
+            store.attach(snapshot)
+        else:
+            for row in range(len(snapshot)):
+                store.save_task(snapshot.task(row))
+            snapshot.close()
+            store.changed = False
+        return
+
+    codec = codec_of(data_file)
+    if extension != "json" and codec is None:
+        raise ValueError(
+            f"*** The file needs to have .json or .{SNAPSHOT_EXTENSION} extension. ***"
+            f"\n Currently you are using a .{extension} extension, which is not "
+            "supported. "
+            "\n Please rename it to "
+            f"{'.'.join(file_name_tokenized[0:length_of_tokens-1])}.json"
+        )
+
+    cache = cache and _can_cache(store)
+    if cache and os.path.exists(data_file):
+        tasks = load_cached_tasks(data_file)
+        if tasks is not None:
+            # The cache holds tasks, the schema version of the file is what the next
+            # write keeps
+            if hasattr(store, "schema_version"):
+                with open_text(data_file, "r") as f:
+                    store.schema_version = detect_schema(f)
+            for task in tasks:
+                store.save_task(task)
+            store.changed = False
+            return
 
     try:
-        with open(data_file, "r") as f:
-            # Case where the file exists but there is no data.
-            # Just going to treat as if it doesn't exist
+        # Case where the file exists but there is no data. Just going to treat as if it
+        # doesn't exist (an empty compressed file has no valid stream either)
+        if os.path.exists(data_file) and os.path.getsize(data_file) == 0:
+            raise FileNotFoundError
+        with open_text(data_file, "r") as f:
             if f.read(1) == '':
                 raise FileNotFoundError
+            elif (
+                _can_load_in_parallel(data_file, store, workers)
+                and detect_schema(f) == 1
+            ):
+                load_tasks_parallel(store, data_file, workers)
             else:
                 try:
                     store.load_tasks(f)
                 except ValueError as e:
                     raise e
+        if cache:
+            save_cached_tasks(data_file, store.get_all_tasks())
     except FileNotFoundError:
-        with open(data_file, "w") as f:
+        with open_text(data_file, "w") as f:
             f.write("[]")
 
+        # There can still be journaled mutations on top of an empty snapshot
+        if isinstance(store, JournalStorage):
+            store.replay_journal()
+    except CODEC_ERRORS as e:
+        if codec is None:
+            raise
+        raise ValueError(
+            f"*** {data_file} is not a valid .{codec} file: {e} ***"
+        ) from None
 
-def update_data_file(data_file: str, store: Storage) -> None:
+
+def update_data_file(
+    data_file: str,
+    store: Storage,
+    cache: bool = False,
+    fsync: str = DEFAULT_FSYNC,
+    compact: bool = False,
+) -> None:
     """
-    Updates the specified data file with the tasks in storage's task dict
+    Updates the specified data file with the tasks in storage's task dict. A
+    JournalStorage has already appended its mutations to the journal, so only the
+    journal is synced. A SqliteStorage only has to commit, and a ShardedStorage only
+    rewrites its dirty shards.
+
+    Otherwise nothing is written when the storage has not changed since it was loaded or
+    last written. The tasks are written to a temporary file that then replaces the data
+    file, so a crash in the middle of a write leaves the previous data file intact. A
+    SnapshotStorage is then attached to the snapshot it just wrote. With cache, the
+    sidecar cache is refreshed along with the JSON file so the next command can skip
+    parsing it. A compressed JSON file is compressed as it is written, see data_codecs.
 
     Parameters:
         - data_file: str
             file path
         - store: Storage
             the storage object
+        - cache: bool
+            whether to refresh the sidecar cache of a JSON file
+        - fsync: str
+            one of FSYNC_POLICIES: "none" leaves flushing to the OS, "file" syncs the
+            temporary file before it replaces the data file, "full" also syncs the
+            directory so the replacement itself is durable
+        - compact: bool
+            whether to write a JSON file without indentation or line breaks, smaller and
+            faster to write and read
 
     Returns:
         None
+
+    Raises:
+        - ValueError
+            if the fsync policy is unknown
+    """
+    if fsync not in FSYNC_POLICIES:
+        raise ValueError(
+            f"*** Unknown fsync policy '{fsync}', it should be one of "
+            f"{', '.join(FSYNC_POLICIES)}. ***"
+        )
+
+    if isinstance(store, JournalStorage):
+        store.sync()
+        return
+
+    if isinstance(store, SqliteStorage):
+        store.commit()
+        return
+
+    if isinstance(store, ShardedStorage):
+        _write_shards(store, fsync)
+        return
+
+    # Nothing to write if the data file still holds exactly the tasks of the storage
+    if not getattr(store, "changed", True):
+        return
+
+    if data_file.split(".")[-1] == SNAPSHOT_EXTENSION:
+        write_atomically(
+            data_file,
+            lambda f: dump_snapshot(store.get_all_tasks(), f),
+            fsync,
+            binary=True,
+        )
+        # The mapped snapshot is replaced by the one holding its changes, which leaves
+        # none to write
+        if isinstance(store, SnapshotStorage):
+            store.attach(Snapshot(data_file))
+            return
+    else:
+        try:
+            indent = None if compact else 4
+            write_atomically(data_file, lambda f: store.dump(f, indent), fsync)
+        except FileNotFoundError:
+            return
+        if cache and _can_cache(store):
+            save_cached_tasks(data_file, store.get_all_tasks())
+
+    store.changed = False
+
+
+def migrate_data_file(
+    data_file: str, version: int = LATEST_SCHEMA, fsync: str = DEFAULT_FSYNC
+) -> int | None:
+    """
+    Rewrites a JSON data file in another schema version (see storage.SCHEMA_VERSIONS),
+    in place. The tasks are streamed from the file to a temporary file one at a time,
+    validated on the way, so the file is never loaded into memory and a malformed file
+    is left as it is. The temporary file then replaces the data file.
+
+    Parameters:
+        - data_file: str
+            file path, a JSON file, compressed or not
+        - version: int
+            the schema version to write
+        - fsync: str
+            the fsync policy of the write, see update_data_file
+
+    Returns:
+        - int | None
+            the number of tasks migrated, None if the file already had that version
+
+    Raises:
+        - ValueError
+            if the file is not a JSON data file or does not exist, the version is
+            unknown, or the file is malformed
     """
+    if not is_json_file(data_file):
+        raise ValueError(
+            "*** Only JSON data files have schema versions to migrate. ***"
+        )
+    if version not in SCHEMA_VERSIONS:
+        raise ValueError(
+            f"*** Unknown schema version {version}, it should be one of "
+            f"{', '.join(map(str, SCHEMA_VERSIONS))}. ***"
+        )
+
+    if not os.path.exists(data_file):
+        raise ValueError(f"*** There is no data file at {data_file} to migrate. ***")
+
+    migrated = 0
+    with open_text(data_file, "r") as source:
+        current = detect_schema(source)
+        if current == version:
+            return None
+
+        def records():
+            nonlocal migrated
+            to_record = record_writer(version)
+            for task in iter_file_tasks(source, current):
+                migrated += 1
+                yield to_record(task)
+
+        write_atomically(
+            data_file, lambda f: write_records(records(), f, version), fsync
+        )
+    return migrated
+
+
+def _write_shards(store: ShardedStorage, fsync: str) -> None:
+    """
+    Writes the dirty shards, then the manifest if it changed (a new directory or a
+    reshard), and only then removes the shards of the previous generation, so the
+    manifest always points to complete shards.
+    """
+    if not store.dirty_shards and not store.manifest_changed:
+        return
+    os.makedirs(store.directory, exist_ok=True)
+    for shard in sorted(store.dirty_shards):
+        write_atomically(
+            store.shard_file(shard),
+            lambda f, shard=shard: store.dump_shard(shard, f),
+            fsync,
+        )
+    if store.manifest_changed:
+        write_atomically(store.manifest_file(), store.dump_manifest, fsync)
+    for path in store.stale_files:
+        if os.path.exists(path):
+            os.remove(path)
+    store.mark_written()
+
+
+def write_atomically(
+    path: str, write, fsync: str = DEFAULT_FSYNC, binary: bool = False
+) -> None:
+    """
+    Writes a file through a temporary file next to it, which replaces the file once it
+    is complete. A compressed JSON file is compressed on the way, see data_codecs.
+
+    Parameters:
+        - path: str
+            file path
+        - write: Callable[[file object], None]
+            writes the content to the file object it is given
+        - fsync: str
+            the fsync policy, see update_data_file
+        - binary: bool
+            whether write is given a binary file object instead of a text one, e.g. for
+            a snapshot
+
+    Returns:
+        - None
+    """
+    temp_file = path + ".tmp"
+    codec = codec_of(path)
     try:
-        with open(data_file, "w") as f:
-            store.dump(f)
-    except FileNotFoundError:
-        pass
+        with open(temp_file, "wb" if codec or binary else "w") as f:
+            if codec:
+                # Closing the writer ends the compressed stream, so it is complete
+                # before the file is synced
+                with open_writer(f, codec) as text:
+                    write(text)
+            else:
+                write(f)
+            if fsync != "none":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_file, path)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+    if fsync == "full":
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
 
 
+def is_json_file(data_file: str) -> bool:
+    """Whether a data file is a JSON file, compressed or not."""
+    return data_file.split(".")[-1] == "json" or codec_of(data_file) is not None
+
+
+def _can_load_in_parallel(data_file: str, store: Storage, workers: int | None) -> bool:
+    """Subclasses of Storage load more than the data file, small files are faster to
+    load here, and a compressed file can only be decompressed from its start.
+    """
+    if (
+        codec_of(data_file) is not None
+        or workers == 1
+        or (workers is None and (os.cpu_count() or 1) == 1)
+    ):
+        return False
+    return (
+        type(store) in (Storage, TaskTable)
+        and os.path.getsize(data_file) >= PARALLEL_MIN_BYTES
+    )
+
+
+def _can_cache(store: Storage) -> bool:
+    """
+    A journal has to be replayed on every load, and a LazyStorage gains nothing from
+    building every task.
+    """
+    return not isinstance(store, (JournalStorage, LazyStorage))